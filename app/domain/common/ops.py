@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Iterable, Tuple
+from typing import Any, Dict, Iterable, List, Tuple
+
+from app.domain.common.stroke_codec import decode_points
 
 
 def _op_field(op_data: Dict[str, Any], key: str) -> Any:
@@ -12,6 +14,19 @@ def _op_field(op_data: Dict[str, Any], key: str) -> Any:
     return None
 
 
+def line_points(op_data: Dict[str, Any]) -> List[List[Any]]:
+    """
+    A line op's points as [[x, y], ...], from "pts" or the packed "pz" form.
+    Raises ValueError for a malformed "pz".
+    """
+    pz = _op_field(op_data, "pz")
+    if pz is not None:
+        q = _op_field(op_data, "q")
+        return decode_points(pz, 1 if q is None else q)
+    pts = _op_field(op_data, "pts")
+    return pts if isinstance(pts, list) else []
+
+
 def validate_draw_op(
     op_data: Dict[str, Any],
     *,
@@ -29,7 +44,13 @@ def validate_draw_op(
         return False, op_type, "INVALID_OP", f"Invalid operation type: {op_type}. Only 'line' and 'circle' are allowed."
 
     if op_type == "line":
-        pts = _op_field(op_data, "pts")
+        if _op_field(op_data, "pz") is not None:
+            try:
+                pts = line_points(op_data)
+            except ValueError as e:
+                return False, op_type, "INVALID_LINE", f"Invalid packed points: {e}"
+        else:
+            pts = _op_field(op_data, "pts")
         if not isinstance(pts, list) or len(pts) < 2:
             return False, op_type, "INVALID_LINE", "Line operation requires at least 2 points"
 
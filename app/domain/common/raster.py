@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.domain.common.ops import line_points
+
+try:  # optional: server-side canvas rendering
+    from PIL import Image, ImageDraw
+except ImportError:  # pragma: no cover - depends on environment
+    Image = ImageDraw = None
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPES = {"png": "image/png", "webp": "image/webp"}
+
+
+def raster_available() -> bool:
+    return Image is not None
+
+
+def fold_ops(ops: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Ops still showing, in order: a "clear" drops everything before it, an
+    "undo" drops the latest remaining op of its author (as the ops checkpoint).
+    """
+    kept: List[Dict[str, Any]] = []
+    for op in ops:
+        t = op.get("t")
+        if t == "clear":
+            kept = []
+        elif t == "undo":
+            for i in range(len(kept) - 1, -1, -1):
+                if kept[i].get("by") == op.get("by"):
+                    del kept[i]
+                    break
+        else:
+            kept.append(op)
+    return kept
+
+
+def _style(body: Dict[str, Any], *keys: str) -> Any:
+    for src in (body, body.get("p")):
+        if isinstance(src, dict):
+            for k in keys:
+                if src.get(k) is not None:
+                    return src[k]
+    return None
+
+
+def _paint_op(draw: Any, op: Dict[str, Any]) -> None:
+    body = op.get("p") if isinstance(op.get("p"), dict) else {}
+    color = _style(body, "color", "c") or "#000000"
+    width = max(1, min(200, int(_style(body, "size", "w", "width") or 2)))
+    t = op.get("t")
+    if t == "line":
+        pts = [(float(x), float(y)) for x, y in line_points(body)]
+        if len(pts) < 2:
+            return
+        draw.line(pts, fill=color, width=width, joint="curve")
+        r = width / 2
+        for x, y in (pts[0], pts[-1]):  # round caps
+            draw.ellipse([x - r, y - r, x + r, y + r], fill=color)
+    elif t == "circle":
+        cx, cy, r = (float(_style(body, k)) for k in ("cx", "cy", "r"))
+        fill = color if _style(body, "fill") else None
+        draw.ellipse([cx - r, cy - r, cx + r, cy + r], outline=color, width=width, fill=fill)
+
+
+@dataclass
+class _Canvas:
+    image: Any = None
+    seq: int = 0
+    encoded: Optional[Tuple[int, bytes]] = None  # (seq, image bytes) of the last encode
+    used_at: float = field(default_factory=time.monotonic)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class CanvasRasterizer:
+    """
+    Per-process bitmaps of room canvases (app.state.rasterizer; needs Pillow).
+    - update() brings a canvas up to date from the ops log: only the ops after
+      its seq are drawn; a clear, an undo or a full resync repaints from the
+      canvas' whole history (checkpoint + tail)
+    - canvases served in the last idle_sec are refreshed every refresh_sec by
+      the background task, so a late joiner gets a ready image
+    - painting and encoding run in a thread, off the event loop
+    Snapshots opt in with "raster": the client draws the image, then the ops
+    after its seq (ops_mode "raster").
+    """
+
+    def __init__(
+        self,
+        repo,
+        *,
+        width: int = 800,
+        height: int = 600,
+        background: str = "#ffffff",
+        fmt: str = "png",
+        refresh_sec: float = 1.0,
+        idle_sec: float = 300.0,
+        max_canvases: int = 256,
+    ) -> None:
+        if Image is None:
+            raise RuntimeError("CanvasRasterizer needs Pillow")
+        self.repo = repo
+        self.size = (width, height)
+        self.background = background
+        self.fmt = fmt if fmt in MEDIA_TYPES else "png"
+        self.refresh_sec = refresh_sec
+        self.idle_sec = idle_sec
+        self.max_canvases = max_canvases
+        self._canvases: Dict[Tuple[str, str], _Canvas] = {}
+        self._runner: Optional[asyncio.Task] = None
+        self.ops_drawn = 0
+        self.repaints = 0
+        self.encodes = 0
+
+    @property
+    def media_type(self) -> str:
+        return MEDIA_TYPES[self.fmt]
+
+    def url(self, room_code: str, canvas: str, seq: int) -> str:
+        return f"/rooms/{room_code}/canvas/{canvas}?seq={seq}"
+
+    def _canvas(self, room_code: str, canvas: str) -> _Canvas:
+        key = (room_code, canvas)
+        c = self._canvases.get(key)
+        if c is None:
+            c = self._canvases[key] = _Canvas()
+            if len(self._canvases) > self.max_canvases:
+                oldest = min(self._canvases, key=lambda k: self._canvases[k].used_at)
+                del self._canvases[oldest]
+        c.used_at = time.monotonic()
+        return c
+
+    def _paint(self, c: _Canvas, ops: List[Dict[str, Any]], repaint: bool) -> None:
+        if repaint or c.image is None:
+            c.image = Image.new("RGB", self.size, self.background)
+        draw = ImageDraw.Draw(c.image)
+        for op in ops:
+            try:
+                _paint_op(draw, op)
+            except (ValueError, TypeError):
+                continue  # malformed op: the clients skip it as well
+        c.encoded = None
+
+    async def update(self, room_code: str, canvas: str) -> int:
+        """Draw what was appended since the last update; returns the seq the image includes."""
+        c = self._canvas(room_code, canvas)
+        async with c.lock:
+            since = c.seq if c.image is not None else None
+            tail = await self.repo.get_ops_tail(room_code, canvas, since, raw=True)
+            ops = [json.loads(x) for x in tail.ops]
+            repaint = tail.mode == "full"
+            if not repaint and any(op.get("t") in ("clear", "undo") for op in ops):
+                # an undo may remove pixels already drawn: repaint from the history
+                tail = await self.repo.get_ops_tail(room_code, canvas, None, raw=True)
+                ops = [json.loads(x) for x in tail.ops]
+                repaint = True
+            if repaint:
+                ops = fold_ops(ops)
+                self.repaints += 1
+            if repaint or ops:
+                await asyncio.to_thread(self._paint, c, ops, repaint)
+                self.ops_drawn += len(ops)
+            c.seq = tail.seq
+            return c.seq
+
+    def _encode(self, c: _Canvas) -> bytes:
+        buf = io.BytesIO()
+        c.image.save(buf, format=self.fmt.upper())
+        return buf.getvalue()
+
+    async def render(self, room_code: str, canvas: str) -> Tuple[int, bytes]:
+        """Up-to-date (seq, image bytes); re-encoded only when something was drawn."""
+        await self.update(room_code, canvas)
+        c = self._canvas(room_code, canvas)
+        async with c.lock:
+            if c.encoded is None or c.encoded[0] != c.seq:
+                c.encoded = (c.seq, await asyncio.to_thread(self._encode, c))
+                self.encodes += 1
+            return c.encoded
+
+    def cached(self, room_code: str, canvas: str, seq: int) -> Optional[bytes]:
+        """The image offered in a snapshot, if it is still the last one encoded."""
+        c = self._canvases.get((room_code, canvas))
+        if c is None or c.encoded is None or c.encoded[0] != seq:
+            return None
+        c.used_at = time.monotonic()
+        return c.encoded[1]
+
+    def invalidate(self, room_code: str) -> None:
+        for key in [k for k in self._canvases if k[0] == room_code]:
+            del self._canvases[key]
+
+    # ---- background refresh ----
+
+    def start(self) -> None:
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        runner, self._runner = self._runner, None
+        if runner is not None:
+            runner.cancel()
+            try:
+                await runner
+            except asyncio.CancelledError:
+                pass
+
+    async def refresh_once(self, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        for key, c in list(self._canvases.items()):
+            if now - c.used_at > self.idle_sec:
+                self._canvases.pop(key, None)
+                continue
+            used_at = c.used_at
+            try:
+                await self.update(*key)
+            except Exception:
+                logger.exception("[RASTER] refresh failed room=%s canvas=%s", *key)
+            c.used_at = used_at  # a refresh is not a use
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_sec)
+            await self.refresh_once()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "canvases": len(self._canvases),
+            "format": self.fmt,
+            "ops_drawn": self.ops_drawn,
+            "repaints": self.repaints,
+            "encodes": self.encodes,
+        }
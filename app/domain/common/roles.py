@@ -9,8 +9,7 @@ async def clear_all_roles(repo: Any, room_code: str) -> None:
     """
     await repo.set_roles(room_code, {})
     players = await repo.list_players(room_code)
-    for p in players:
-        await repo.update_player_fields(room_code, p.pid, role=None)
+    await repo.update_players_bulk(room_code, {p.pid: {"role": None} for p in players})
 
 
 async def strip_identity(repo: Any, room_code: str) -> None:
@@ -21,7 +20,6 @@ async def strip_identity(repo: Any, room_code: str) -> None:
     await clear_all_roles(repo, room_code)
 
     players = await repo.list_players(room_code)
-    for p in players:
-        await repo.clear_team(room_code, p.pid)
+    await repo.clear_team_bulk(room_code, [p.pid for p in players])
 
     await repo.clear_room_field(room_code, "gm_pid")
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.domain.common.stroke_codec import decode_points, encode_points
+
+try:  # optional vectorized path
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on environment
+    np = None
+
+
+def _is_point(p: Any) -> bool:
+    return (
+        isinstance(p, (list, tuple))
+        and len(p) == 2
+        and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in p)
+    )
+
+
+def _rdp_keep_py(pts: Sequence[Sequence[float]], epsilon: float) -> List[bool]:
+    n = len(pts)
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        ax, ay = pts[start]
+        dx, dy = pts[end][0] - ax, pts[end][1] - ay
+        norm = math.hypot(dx, dy)
+        best, best_i = -1.0, start
+        for i in range(start + 1, end):
+            px, py = pts[i][0] - ax, pts[i][1] - ay
+            d = abs(dx * py - dy * px) / norm if norm else math.hypot(px, py)
+            if d > best:
+                best, best_i = d, i
+        if best > epsilon:
+            keep[best_i] = True
+            stack.append((start, best_i))
+            stack.append((best_i, end))
+    return keep
+
+
+def _rdp_keep_np(pts: Sequence[Sequence[float]], epsilon: float) -> List[bool]:
+    arr = np.asarray(pts, dtype=np.float64)
+    n = len(arr)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        rel = arr[start + 1:end] - arr[start]
+        dx, dy = arr[end] - arr[start]
+        norm = math.hypot(dx, dy)
+        if norm:
+            dist = np.abs(dx * rel[:, 1] - dy * rel[:, 0]) / norm
+        else:
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        i = int(np.argmax(dist))
+        if dist[i] > epsilon:
+            mid = start + 1 + i
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+    return keep.tolist()
+
+
+def rdp(pts: Sequence[Sequence[Any]], epsilon: float) -> List[Sequence[Any]]:
+    """
+    Ramer-Douglas-Peucker: drop points closer than epsilon to the simplified
+    polyline. Endpoints are always kept. Vectorized with numpy when installed.
+    """
+    if len(pts) < 3 or epsilon <= 0:
+        return list(pts)
+    keep = (_rdp_keep_np if np is not None else _rdp_keep_py)(pts, epsilon)
+    return [p for p, k in zip(pts, keep) if k]
+
+
+class StrokeSimplifier:
+    """
+    RDP stage for line ops, run by the draw handlers before an op is stored
+    and broadcast (app.state.stroke_simplifier; absent = off).
+    Works on "pts" and packed "pz" ops and keeps the op's form.
+    Counts points in/out for GET /admin/strokes.
+    """
+
+    def __init__(self, epsilon: float = 0.75, *, min_points: int = 8) -> None:
+        self.epsilon = epsilon
+        self.min_points = min_points
+        self.strokes = 0
+        self.points_in = 0
+        self.points_out = 0
+
+    def simplify_op(self, op_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy of a line op with simplified points; other ops come back unchanged."""
+        body = op_data.get("p") if isinstance(op_data.get("p"), dict) else op_data
+        packed = "pz" in body
+        try:
+            if packed:
+                q = body.get("q") or 1
+                pts: List[Any] = decode_points(body["pz"], q)
+            else:
+                pts = body.get("pts")
+                if not isinstance(pts, list) or not all(_is_point(p) for p in pts):
+                    return op_data
+        except (ValueError, TypeError):
+            return op_data  # left for validation / stored as sent
+        if len(pts) < self.min_points:
+            return op_data
+
+        out = rdp(pts, self.epsilon)
+        self.strokes += 1
+        self.points_in += len(pts)
+        self.points_out += len(out)
+
+        new_body = dict(body)
+        if packed:
+            new_body["pz"] = encode_points(out, q)
+        else:
+            new_body["pts"] = out
+        if body is op_data:
+            return new_body
+        return {**op_data, "p": new_body}
+
+    def metrics(self) -> Dict[str, Any]:
+        ratio: Optional[float] = None
+        if self.points_in:
+            ratio = round(1 - self.points_out / self.points_in, 4)
+        return {
+            "epsilon": self.epsilon,
+            "strokes": self.strokes,
+            "points_in": self.points_in,
+            "points_out": self.points_out,
+            "reduction": ratio,
+        }
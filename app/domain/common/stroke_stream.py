@@ -0,0 +1,330 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.domain.common.ops import validate_draw_op
+from app.domain.common.stroke_codec import MAX_Q, decode_points, encode_points
+from app.domain.common.validation import is_drawer
+from app.domain.lifecycle.handlers import _auto_expire_single_game
+from app.domain.vs.handlers_common import auto_advance_vs_phase
+from app.domain.vs.rules import MAX_STROKE_DURATION_SEC, MAX_STROKE_POINTS, should_auto_split_stroke
+from app.store.models import DrawOp, StrokeCommit
+from app.transport.protocols import (
+    InStrokeBegin,
+    InStrokeEnd,
+    InStrokePoints,
+    OutBudgetUpdate,
+    OutError,
+    OutOpBroadcast,
+    OutStrokeDelta,
+    OutStrokeEnd,
+    OutStrokeStart,
+)
+from app.util.timeutil import now_ts
+
+logger = logging.getLogger(__name__)
+
+Outgoing = List[object]
+Result = Tuple[Outgoing, Outgoing]
+# emit(room_code, events, exclude_pid)
+Emit = Callable[[str, List[Any], Optional[str]], Awaitable[None]]
+
+
+@dataclass
+class StrokeBuffer:
+    """One player's open streamed stroke."""
+    room_code: str
+    pid: str
+    sid: str
+    mode: str
+    canvas: Optional[str]
+    meta: Dict[str, Any]  # style fields from stroke_begin
+    q: int = 1
+    packed: bool = False  # first chunk was pz: deltas and the stored op use pz too
+    started_at: float = field(default_factory=time.monotonic)
+    started_ts: int = field(default_factory=now_ts)
+    last_ts: int = 0  # when the last accepted chunk arrived
+    pts: List[List[Any]] = field(default_factory=list)
+    flushed: int = 0  # points already sent as deltas
+    last_flush: float = 0.0
+
+
+class StrokeStreams:
+    """
+    Open streamed strokes of this process (app.state.stroke_streams), keyed
+    by (room, pid): a player draws one stroke at a time.
+    - stroke_points only buffers; deltas go out at most every
+      flush_interval_sec per stroke, from the handler when one is due or from
+      the flusher task for the tail of a burst
+    - strokes open longer than max_duration_sec (e.g. the drawer vanished)
+      are finished by the flusher with what was drawn
+    With room affinity every message of a room runs on its owner, so the
+    buffer always lives where its stroke_* messages execute.
+    """
+
+    def __init__(
+        self,
+        app,
+        *,
+        emit: Optional[Emit] = None,
+        flush_interval_sec: float = 0.05,
+        max_duration_sec: float = MAX_STROKE_DURATION_SEC,
+        max_points: int = MAX_STROKE_POINTS,
+    ) -> None:
+        self.app = app
+        self._emit = emit
+        self.flush_interval_sec = flush_interval_sec
+        self.max_duration_sec = max_duration_sec
+        self.max_points = max_points
+        self._buffers: Dict[Tuple[str, str], StrokeBuffer] = {}
+        self._wake = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._buffers)
+
+    def open(self, buf: StrokeBuffer) -> None:
+        self._buffers[(buf.room_code, buf.pid)] = buf
+        self._wake.set()
+
+    def get(self, room_code: str, pid: str) -> Optional[StrokeBuffer]:
+        return self._buffers.get((room_code, pid))
+
+    def pop(self, room_code: str, pid: str) -> Optional[StrokeBuffer]:
+        return self._buffers.pop((room_code, pid), None)
+
+    def overdue(self, buf: StrokeBuffer, now: float) -> bool:
+        return len(buf.pts) > self.max_points or now - buf.started_at > self.max_duration_sec
+
+    def delta(self, buf: StrokeBuffer, now: float, *, force: bool = False) -> Optional[OutStrokeDelta]:
+        """Points not yet broadcast, if any and the rate cap allows."""
+        if buf.flushed >= len(buf.pts):
+            return None
+        if not force and now - buf.last_flush < self.flush_interval_sec:
+            return None
+        chunk = buf.pts[buf.flushed:]
+        buf.flushed = len(buf.pts)
+        buf.last_flush = now
+        if buf.packed:
+            return OutStrokeDelta(sid=buf.sid, by=buf.pid, canvas=buf.canvas, pz=encode_points(chunk, buf.q))
+        return OutStrokeDelta(sid=buf.sid, by=buf.pid, canvas=buf.canvas, pts=chunk)
+
+    # ---- flusher ----
+
+    def start(self) -> None:
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        runner, self._runner = self._runner, None
+        if runner is not None:
+            runner.cancel()
+            try:
+                await runner
+            except asyncio.CancelledError:
+                pass
+
+    async def flush_once(self, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        for key, buf in list(self._buffers.items()):
+            try:
+                if self.overdue(buf, now):
+                    if self._buffers.get(key) is not buf:
+                        continue
+                    del self._buffers[key]
+                    del buf.pts[self.max_points:]
+                    _, to_room = await finish_stroke(app=self.app, buf=buf, ts=now_ts())
+                    if to_room and self._emit is not None:
+                        await self._emit(buf.room_code, to_room, None)
+                    continue
+                ev = self.delta(buf, now)
+                if ev is not None and self._emit is not None:
+                    await self._emit(buf.room_code, [ev], buf.pid)
+            except Exception:
+                logger.exception("[STROKES] flush failed room=%s pid=%s", buf.room_code, buf.pid)
+
+    async def _run(self) -> None:
+        while True:
+            if not self._buffers:
+                self._wake.clear()
+                await self._wake.wait()
+            await asyncio.sleep(self.flush_interval_sec)
+            await self.flush_once()
+
+
+# ----------------------------
+# Handlers
+# ----------------------------
+
+def _stroke_error(mode: str, code: str) -> OutError:
+    """commit_stroke failure -> the error the draw_op handlers send."""
+    if code == "NO_BUDGET":
+        if mode == "VS":
+            return OutError(code="NO_BUDGET", message="No strokes remaining for this phase")
+        return OutError(code="STROKE_LIMIT", message="No strokes left")
+    if code == "NOT_DRAWER":
+        return OutError(code="NOT_DRAWER", message="Only drawer can draw")
+    if code == "BAD_STATE":
+        return OutError(code="BAD_STATE", message="Cannot draw in current state")
+    if code == "EXPIRED":
+        return OutError(code="DRAW_EXPIRED", message="Draw window ended")
+    if mode == "VS":
+        return OutError(code="BAD_PHASE", message="Not in DRAW phase")
+    return OutError(code="BAD_PHASE", message="Not in active round")
+
+
+def _budget_event(mode: str, canvas: Optional[str], commit: StrokeCommit) -> OutBudgetUpdate:
+    if mode == "VS":
+        return OutBudgetUpdate(budget={**commit.budget, canvas: commit.remaining})
+    return OutBudgetUpdate(budget={"stroke_remaining": commit.remaining})
+
+
+def _no_stroke() -> Result:
+    return [OutError(code="STROKE_NOT_FOUND", message="No open stroke with this sid")], []
+
+
+async def handle_stroke_begin(*, app, room_code: str, pid: Optional[str], msg: InStrokeBegin) -> Result:
+    """Open a streamed line; the stroke is charged now (like one draw_op)."""
+    if not pid:
+        return [OutError(code="NO_PID", message="Missing pid")], []
+    streams: Optional[StrokeStreams] = getattr(app.state, "stroke_streams", None)
+    if streams is None:
+        return [OutError(code="NOT_IMPLEMENTED", message="Streamed strokes are disabled")], []
+    if streams.get(room_code, pid) is not None:
+        return [OutError(code="STROKE_OPEN", message="Finish the current stroke first")], []
+
+    repo = app.state.repo
+    ts = now_ts()
+    loaded = await repo.load_room_context(room_code, pid, parts=("header", "player"))
+    header = loaded.header
+    if header is None:
+        return [OutError(code="ROOM_NOT_FOUND", message="Room not found")], []
+    if header.state != "IN_GAME":
+        return [OutError(code="BAD_STATE", message=f"Cannot draw in state {header.state}")], []
+
+    canvas = None
+    if header.mode == "VS":
+        player = loaded.player
+        if player is None:
+            return [OutError(code="PLAYER_NOT_FOUND", message="Player not found")], []
+        canvas = msg.canvas or player.team
+        if canvas is None:
+            return [OutError(code="NO_TEAM", message="Player has no team")], []
+        if not is_drawer(player, canvas):
+            return [OutError(code="NOT_DRAWER", message="Only drawer can draw")], []
+    else:
+        tick_events = await _auto_expire_single_game(repo=repo, room_code=room_code, header=header, ts=ts)
+        if tick_events:
+            return list(tick_events), tick_events
+
+    meta = {k: v for k, v in msg.op.items() if k not in ("t", "p", "pts", "pz")}
+    q = meta.get("q", 1)
+    if not isinstance(q, int) or isinstance(q, bool) or not 1 <= q <= MAX_Q:
+        return [OutError(code="INVALID_LINE", message=f"q must be an integer between 1 and {MAX_Q}")], []
+
+    commit = await repo.commit_stroke(room_code, header.mode, pid=pid, ts=ts, op=None, team=canvas, cost=1)
+    if not commit.ok:
+        events = []
+        if commit.code == "EXPIRED" and header.mode == "VS":
+            events = await auto_advance_vs_phase(repo=repo, room_code=room_code, header=header, ts=ts)
+        return [_stroke_error(header.mode, commit.code)], events
+    # a budget that just ran out advances the phase at stroke_end, once the line is stored
+
+    streams.open(StrokeBuffer(
+        room_code=room_code, pid=pid, sid=msg.sid, mode=header.mode, canvas=canvas, meta=meta, q=q,
+    ))
+    budget_ev = _budget_event(header.mode, canvas, commit)
+    start_ev = OutStrokeStart(sid=msg.sid, by=pid, canvas=canvas, op=meta)
+    return [budget_ev], [start_ev, budget_ev]
+
+
+async def handle_stroke_points(*, app, room_code: str, pid: Optional[str], msg: InStrokePoints) -> Result:
+    """Buffer a chunk; broadcast what is pending when the rate cap allows."""
+    streams: Optional[StrokeStreams] = getattr(app.state, "stroke_streams", None)
+    buf = streams.get(room_code, pid or "") if streams is not None else None
+    if buf is None or buf.sid != msg.sid:
+        return _no_stroke()
+
+    try:
+        chunk = decode_points(msg.pz, buf.q) if msg.pz is not None else [list(p) for p in msg.pts or []]
+    except ValueError as e:
+        return [OutError(code="INVALID_LINE", message=f"Invalid packed points: {e}")], []
+    now = time.monotonic()
+    # a chunk arriving after the duration limit is not part of the stroke
+    if now - buf.started_at <= streams.max_duration_sec:
+        if not buf.pts:
+            buf.packed = msg.pz is not None
+        buf.pts.extend(chunk)
+        buf.last_ts = now_ts()
+
+    if streams.overdue(buf, now):
+        streams.pop(room_code, buf.pid)
+        del buf.pts[streams.max_points:]
+        to_sender, to_room = await finish_stroke(app=app, buf=buf, ts=now_ts())
+        err = OutError(
+            code="STROKE_TOO_LONG",
+            message="Stroke too long (exceeds duration or point limit). Stroke ended.",
+        )
+        return [err, *to_sender], to_room
+
+    ev = streams.delta(buf, now)
+    return [], [ev] if ev is not None else []
+
+
+async def handle_stroke_end(*, app, room_code: str, pid: Optional[str], msg: InStrokeEnd) -> Result:
+    streams: Optional[StrokeStreams] = getattr(app.state, "stroke_streams", None)
+    buf = streams.get(room_code, pid or "") if streams is not None else None
+    if buf is None or buf.sid != msg.sid:
+        return _no_stroke()
+    streams.pop(room_code, buf.pid)
+    return await finish_stroke(app=app, buf=buf, ts=now_ts())
+
+
+async def finish_stroke(*, app, buf: StrokeBuffer, ts: int) -> Result:
+    """
+    Store the buffered stroke as one line op (already charged at stroke_begin),
+    after the draw_op checks and the stroke simplifier. Clients drop the live
+    preview on stroke_end.
+    """
+    repo = app.state.repo
+    dropped = OutStrokeEnd(sid=buf.sid, by=buf.pid, canvas=buf.canvas)
+    if len(buf.pts) < 2:
+        return [dropped], [dropped]
+
+    body: Dict[str, Any] = dict(buf.meta)
+    if buf.packed:
+        body["pz"] = encode_points(buf.pts, buf.q)
+    else:
+        body["pts"] = buf.pts
+    if buf.mode == "VS":
+        body["pid"] = buf.pid
+        body.setdefault("tool", "line")
+        body.setdefault("sab", 0)
+    ok, _, _, err_msg = validate_draw_op({"t": "line", "p": body})
+    if ok and should_auto_split_stroke(buf.pts, buf.started_ts, buf.last_ts or buf.started_ts):
+        ok, err_msg = False, "Stroke too long (exceeds duration or point limit)"
+    if not ok:
+        return [OutError(code="STROKE_DROPPED", message=f"Stroke not saved: {err_msg}"), dropped], [dropped]
+    simplifier = getattr(app.state, "stroke_simplifier", None)
+    if simplifier is not None:
+        body = simplifier.simplify_op(body)
+
+    op = DrawOp(t="line", p=body, ts=ts, by=buf.pid)
+    commit = await repo.commit_stroke(
+        buf.room_code, buf.mode, pid=buf.pid, ts=ts, op=op, team=buf.canvas, cost=0  # type: ignore[arg-type]
+    )
+    if not commit.ok:
+        err = _stroke_error(buf.mode, commit.code)
+        return [OutError(code="STROKE_DROPPED", message=f"Stroke not saved: {err.message}"), dropped], [dropped]
+
+    end = OutStrokeEnd(sid=buf.sid, by=buf.pid, canvas=buf.canvas, seq=commit.seq)
+    to_room: Outgoing = [OutOpBroadcast(op=op.model_dump(), canvas=buf.canvas, by=buf.pid), end]
+    if buf.mode == "VS" and commit.transition:
+        header = await repo.get_room_header(buf.room_code)
+        events = await auto_advance_vs_phase(repo=repo, room_code=buf.room_code, header=header, ts=ts)
+        return [end, *events], [*to_room, *events]
+    return [end], to_room
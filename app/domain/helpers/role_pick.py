@@ -52,12 +52,14 @@ async def assign_single_roles(
     await repo.set_roles(room_code, {"gm": gm_pid, "drawer": drawer_pid})
 
     # Persist per-player role (gm/drawer/guesser)
+    updates = {}
     for p in connected_list:
         if p.pid == gm_pid:
-            await repo.update_player_fields(room_code, p.pid, role="gm")
+            updates[p.pid] = {"role": "gm"}
         elif p.pid == drawer_pid:
-            await repo.update_player_fields(room_code, p.pid, role="drawer")
+            updates[p.pid] = {"role": "drawer"}
         else:
-            await repo.update_player_fields(room_code, p.pid, role="guesser")
+            updates[p.pid] = {"role": "guesser"}
+    await repo.update_players_bulk(room_code, updates)
 
     return gm_pid, drawer_pid, guesser_pids
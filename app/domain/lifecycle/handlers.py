@@ -1,14 +1,15 @@
 # app/domain/lifecycle/handlers.py
 from __future__ import annotations
 
-import asyncio
+import json
 import logging
 import random
 import string
 from typing import List, Tuple, Optional, Literal, Dict, Any
 
+from app.util.jsonx import RawJSON
 from app.util.timeutil import now_ts
-from app.store.models import RoomHeaderStore, PlayerStore, DrawOp
+from app.store.models import RoomHeaderStore, PlayerStore, DrawOp, SINGLE_CANVAS
 from app.transport.protocols import (
     Mode,
     OutgoingEvent,
@@ -35,7 +36,6 @@ from app.transport.protocols import (
 # Returns: (to_sender, to_room)
 Result = Tuple[List[OutgoingEvent], List[OutgoingEvent]]
 logger = logging.getLogger(__name__)
-_ROOM_SINGLE_TIMEOUT_LOCKS: dict[str, asyncio.Lock] = {}
 SINGLE_TRANSITION_SEC = 5
 
 
@@ -68,8 +68,7 @@ async def _auto_expire_single_game(
     if header.state != "IN_GAME":
         return []
 
-    lock = _ROOM_SINGLE_TIMEOUT_LOCKS.setdefault(room_code, asyncio.Lock())
-    async with lock:
+    async with repo.room_lock(room_code, "single_timeout"):
         current_header = await repo.get_room_header(room_code)
         if current_header is None:
             return []
@@ -93,25 +92,16 @@ async def _auto_expire_single_game(
                 end_word = str(cfg.get("secret_word", "") or "")
 
             if reason_norm == "CORRECT" and winner_pid_norm:
-                winner_player = await repo.get_player(room_code, winner_pid_norm)
-                if winner_player is not None:
-                    guesser_points = int(getattr(winner_player, "points", 0) or 0)
-                    await repo.update_player_fields(room_code, winner_pid_norm, points=guesser_points + 1)
+                await repo.incr_player_points(room_code, winner_pid_norm, 1)
 
                 game_now = await repo.get_game(room_code)
                 drawer_pid = str(game_now.get("drawer_pid", "") or "")
                 if drawer_pid:
-                    drawer_player = await repo.get_player(room_code, drawer_pid)
-                    if drawer_player is not None:
-                        drawer_points = int(getattr(drawer_player, "points", 0) or 0)
-                        await repo.update_player_fields(room_code, drawer_pid, points=drawer_points + 1)
+                    await repo.incr_player_points(room_code, drawer_pid, 1)
             elif reason_norm in ("TIMEOUT", "NO_WINNER"):
                 gm_pid = str(getattr(current_header, "gm_pid", "") or "")
                 if gm_pid:
-                    gm = await repo.get_player(room_code, gm_pid)
-                    if gm is not None:
-                        gm_points = int(getattr(gm, "points", 0) or 0)
-                        await repo.update_player_fields(room_code, gm_pid, points=gm_points + 1)
+                    await repo.incr_player_points(room_code, gm_pid, 1)
 
             from app.domain.common.roles import clear_all_roles
 
@@ -517,8 +507,7 @@ async def _auto_reset_single_to_waiting_after_vote_yes(
     )
 
     players = await repo.list_players(room_code)
-    for p in players:
-        await repo.update_player_fields(room_code, p.pid, role=None)
+    await repo.update_players_bulk(room_code, {p.pid: {"role": None} for p in players})
 
     await repo.set_roles(room_code, {})
     await repo.vote_next_clear(room_code)
@@ -592,6 +581,71 @@ async def _auto_start_from_countdown(
     return []
 
 
+async def _run_room_timers(
+    *,
+    app,
+    room_code: str,
+    header: RoomHeaderStore,
+    ts: int,
+    include_phase: bool = True,
+) -> Tuple[list[OutgoingEvent], RoomHeaderStore]:
+    """
+    Run every time-driven auto step in order (vote windows, resets, countdown,
+    then phase expiry + ops clearing). Returns (events, freshest header).
+    """
+    repo = app.state.repo
+    events: list[OutgoingEvent] = []
+
+    for step in (
+        _auto_resolve_vs_vote_window,
+        _auto_reset_vs_to_waiting_after_vote_yes,
+        _auto_resolve_single_vote_window,
+        _auto_reset_single_to_waiting_after_vote_yes,
+    ):
+        step_events = await step(repo=repo, room_code=room_code, header=header, ts=ts)
+        if step_events:
+            events.extend(step_events)
+            header = await repo.get_room_header(room_code) or header
+
+    auto_start_events = await _auto_start_from_countdown(app=app, room_code=room_code, header=header, ts=ts)
+    if auto_start_events:
+        events.extend(auto_start_events)
+        header = await repo.get_room_header(room_code) or header
+
+    if not include_phase:
+        return events, header
+
+    vs_phase_events = await _auto_expire_vs_phase(repo=repo, room_code=room_code, header=header, ts=ts)
+    single_events = await _auto_expire_single_game(repo=repo, room_code=room_code, header=header, ts=ts)
+    clear_events = await _auto_clear_ops_after_game(repo=repo, room_code=room_code, header=header, ts=ts)
+    phase_events = [*vs_phase_events, *single_events, *clear_events]
+    if phase_events:
+        events.extend(phase_events)
+        header = await repo.get_room_header(room_code) or header
+    return events, header
+
+
+async def tick_room(*, app, room_code: str) -> list[OutgoingEvent]:
+    """
+    Scheduler entry point: run due timers for a room without a client message.
+    Returns room events (to broadcast to everyone).
+    """
+    repo = app.state.repo
+    header = await repo.get_room_header(room_code)
+    if header is None:
+        return []
+
+    events, header = await _run_room_timers(app=app, room_code=room_code, header=header, ts=now_ts())
+    if events:
+      logger.info(
+          "[FLOW][BE][scheduler_tick] room=%s state=%s emitted=%s",
+          room_code,
+          getattr(header, "state", None),
+          [getattr(e, "type", type(e).__name__) for e in events],
+      )
+    return events
+
+
 def _gen_room_code(n: int = 6) -> str:
     alphabet = string.ascii_uppercase + string.digits
     return "".join(random.choice(alphabet) for _ in range(n))
@@ -616,10 +670,15 @@ async def _build_snapshot(
     *,
     viewer_pid: Optional[str] = None,
     redact_secret: bool = False,
+    since_seq: Optional[Dict[str, int]] = None,
+    raster: bool = False,
 ) -> OutRoomSnapshot:
     """
     Build a full snapshot from Redis.
     Keep it store-driven, not rule-driven.
+    since_seq: client's last op seq per canvas; ops then carry only the missing tail.
+    raster: canvases without a cursor come as an image + the ops after it, when
+    app.state.rasterizer is set.
     """
     repo = app.state.repo
 
@@ -659,19 +718,37 @@ async def _build_snapshot(
         if budget:
             game["budget"] = budget
 
-    # ops depend on mode
-    ops_out: List[Dict[str, Any]] = []
-    if header.mode == "VS":
-        opsA = await repo.get_ops_vs(room_code, "A")
-        opsB = await repo.get_ops_vs(room_code, "B")
-        # return as a combined list with canvas tag (client can split)
-        ops_out = (
-            [{"canvas": "A", **op.model_dump()} for op in opsA] +
-            [{"canvas": "B", **op.model_dump()} for op in opsB]
-        )
-    else:
-        ops = await repo.get_ops_single(room_code)
-        ops_out = [op.model_dump() for op in ops]
+    # ops depend on mode; only the tail after the client's cursor when it has one,
+    # else the canvas checkpoint (clear/undo already applied) followed by the tail.
+    # Stored JSON goes out untouched (no DrawOp decode/dump per op).
+    ops_out: List[str] = []
+    ops_seq: Dict[str, int] = {}
+    ops_mode: Dict[str, str] = {}
+    rasters: Dict[str, Dict[str, Any]] = {}
+    since = since_seq or {}
+    rasterizer = getattr(app.state, "rasterizer", None) if raster else None
+    canvases = ("A", "B") if header.mode == "VS" else (SINGLE_CANVAS,)
+    for canvas in canvases:
+        tail = None
+        if rasterizer is not None and since.get(canvas) is None:
+            raster_seq, _ = await rasterizer.render(room_code, canvas)
+            if raster_seq:
+                tail = await repo.get_ops_tail(room_code, canvas, raster_seq, raw=True)
+                # an undo after the image would have to remove its pixels
+                if tail.mode == "delta" and not any(json.loads(op).get("t") == "undo" for op in tail.ops):
+                    rasters[canvas] = {"seq": raster_seq, "url": rasterizer.url(room_code, canvas, raster_seq)}
+                else:
+                    tail = None
+        if tail is None:
+            tail = await repo.get_ops_tail(room_code, canvas, since.get(canvas), raw=True)
+        ops_seq[canvas] = tail.seq
+        ops_mode[canvas] = "raster" if canvas in rasters else tail.mode
+        if header.mode == "VS":
+            # return as a combined list with canvas tag (client can split)
+            tag = '{"canvas":"%s",' % canvas
+            ops_out.extend(tag + op[1:] for op in tail.ops)
+        else:
+            ops_out.extend(tail.ops)
 
     modlog = await repo.get_modlog(room_code)
 
@@ -681,7 +758,10 @@ async def _build_snapshot(
         roles=roles,
         round_config=round_cfg,
         game=game,
-        ops=ops_out,
+        ops=RawJSON.array(ops_out),
+        ops_seq=ops_seq,
+        ops_mode=ops_mode,
+        raster=rasters,
         modlog=[m.model_dump() for m in modlog],
         server_ts=now_ts(),
     )
@@ -790,46 +870,11 @@ async def handle_snapshot(*, app, room_code: str, pid: Optional[str], msg: InSna
         return [OutError(code="ROOM_NOT_FOUND", message=f"Room {room_code} not found")], []
 
     ts = now_ts()
-    vote_events = await _auto_resolve_vs_vote_window(repo=repo, room_code=room_code, header=header, ts=ts)
-    if vote_events:
-        header = await repo.get_room_header(room_code) or header
-    reset_events = await _auto_reset_vs_to_waiting_after_vote_yes(repo=repo, room_code=room_code, header=header, ts=ts)
-    if reset_events:
-        header = await repo.get_room_header(room_code) or header
-    single_vote_events = await _auto_resolve_single_vote_window(repo=repo, room_code=room_code, header=header, ts=ts)
-    if single_vote_events:
-        header = await repo.get_room_header(room_code) or header
-    single_reset_events = await _auto_reset_single_to_waiting_after_vote_yes(repo=repo, room_code=room_code, header=header, ts=ts)
-    if single_reset_events:
-        header = await repo.get_room_header(room_code) or header
-    auto_start_events = await _auto_start_from_countdown(app=app, room_code=room_code, header=header, ts=ts)
-    if auto_start_events:
-        header = await repo.get_room_header(room_code) or header
-    vs_phase_events = await _auto_expire_vs_phase(repo=repo, room_code=room_code, header=header, ts=ts)
-    single_events = await _auto_expire_single_game(repo=repo, room_code=room_code, header=header, ts=ts)
-    clear_events = await _auto_clear_ops_after_game(repo=repo, room_code=room_code, header=header, ts=ts)
-    if (
-        vote_events
-        or reset_events
-        or single_vote_events
-        or single_reset_events
-        or auto_start_events
-        or vs_phase_events
-        or single_events
-        or clear_events
-    ):
-        header = await repo.get_room_header(room_code) or header
+    events, header = await _run_room_timers(app=app, room_code=room_code, header=header, ts=ts)
 
-    snap = await _build_snapshot(app, room_code, header.mode, viewer_pid=pid, redact_secret=True)
-    events = []
-    events.extend(vote_events)
-    events.extend(reset_events)
-    events.extend(single_vote_events)
-    events.extend(single_reset_events)
-    events.extend(auto_start_events)
-    events.extend(vs_phase_events)
-    events.extend(single_events)
-    events.extend(clear_events)
+    snap = await _build_snapshot(
+        app, room_code, header.mode, viewer_pid=pid, redact_secret=True, since_seq=msg.since_seq, raster=msg.raster
+    )
     if events:
       logger.info(
           "[FLOW][BE][snapshot_tick] room=%s pid=%s state=%s emitted=%s",
@@ -867,25 +912,23 @@ async def handle_reconnect(*, app, room_code: str, pid: Optional[str], msg: InRe
     await repo.update_room_fields(room_code, last_activity=ts)
     await repo.refresh_room_ttl(room_code, mode=header.mode)
 
-    vote_events = await _auto_resolve_vs_vote_window(repo=repo, room_code=room_code, header=header, ts=ts)
-    if vote_events:
-        header = await repo.get_room_header(room_code) or header
-    reset_events = await _auto_reset_vs_to_waiting_after_vote_yes(repo=repo, room_code=room_code, header=header, ts=ts)
-    if reset_events:
-        header = await repo.get_room_header(room_code) or header
-    single_vote_events = await _auto_resolve_single_vote_window(repo=repo, room_code=room_code, header=header, ts=ts)
-    if single_vote_events:
-        header = await repo.get_room_header(room_code) or header
-    single_reset_events = await _auto_reset_single_to_waiting_after_vote_yes(repo=repo, room_code=room_code, header=header, ts=ts)
-    if single_reset_events:
-        header = await repo.get_room_header(room_code) or header
-
-    auto_start_events = await _auto_start_from_countdown(app=app, room_code=room_code, header=header, ts=ts)
-    if auto_start_events:
-        header = await repo.get_room_header(room_code) or header
+    events, header = await _run_room_timers(
+        app=app,
+        room_code=room_code,
+        header=header,
+        ts=ts,
+        include_phase=False,
+    )
 
-    snap = await _build_snapshot(app, room_code, header.mode, viewer_pid=effective_pid, redact_secret=True)
-    events = [*vote_events, *reset_events, *single_vote_events, *single_reset_events, *auto_start_events]
+    snap = await _build_snapshot(
+        app,
+        room_code,
+        header.mode,
+        viewer_pid=effective_pid,
+        redact_secret=True,
+        since_seq=msg.since_seq,
+        raster=msg.raster,
+    )
     if events:
       logger.info(
           "[FLOW][BE][reconnect_tick] room=%s pid=%s state=%s emitted=%s",
@@ -911,39 +954,19 @@ async def handle_heartbeat(*, app, room_code: str, pid: Optional[str], msg: InHe
     if header is None:
         return [OutError(code="ROOM_NOT_FOUND", message=f"Room {room_code} not found")], []
 
-    vote_events = await _auto_resolve_vs_vote_window(repo=repo, room_code=room_code, header=header, ts=ts)
-    if vote_events:
-        header = await repo.get_room_header(room_code) or header
-    reset_events = await _auto_reset_vs_to_waiting_after_vote_yes(repo=repo, room_code=room_code, header=header, ts=ts)
-    if reset_events:
-        header = await repo.get_room_header(room_code) or header
-    single_vote_events = await _auto_resolve_single_vote_window(repo=repo, room_code=room_code, header=header, ts=ts)
-    if single_vote_events:
-        header = await repo.get_room_header(room_code) or header
-    single_reset_events = await _auto_reset_single_to_waiting_after_vote_yes(repo=repo, room_code=room_code, header=header, ts=ts)
-    if single_reset_events:
-        header = await repo.get_room_header(room_code) or header
-
-    auto_start_events = await _auto_start_from_countdown(app=app, room_code=room_code, header=header, ts=ts)
-    if auto_start_events:
-        header = await repo.get_room_header(room_code) or header
-    vs_phase_events = await _auto_expire_vs_phase(repo=repo, room_code=room_code, header=header, ts=ts)
-    single_events = await _auto_expire_single_game(repo=repo, room_code=room_code, header=header, ts=ts)
-    clear_events = await _auto_clear_ops_after_game(repo=repo, room_code=room_code, header=header, ts=ts)
+    # With the room scheduler running, timers fire server-side and heartbeat is
+    # a presence ping; it only makes sure the room is armed (e.g. after restart).
+    scheduler = getattr(app.state, "scheduler", None)
+    if scheduler is not None and scheduler.running:
+        scheduler.ensure(room_code)
+        events: list[OutgoingEvent] = []
+    else:
+        events, header = await _run_room_timers(app=app, room_code=room_code, header=header, ts=ts)
 
     await repo.set_player_connected(room_code, pid, True, ts)
     await repo.update_room_fields(room_code, last_activity=ts)
     await repo.refresh_room_ttl(room_code, mode=header.mode)
 
-    events = []
-    events.extend(vote_events)
-    events.extend(reset_events)
-    events.extend(single_vote_events)
-    events.extend(single_reset_events)
-    events.extend(auto_start_events)
-    events.extend(vs_phase_events)
-    events.extend(single_events)
-    events.extend(clear_events)
     if events:
       logger.info(
           "[FLOW][BE][heartbeat_tick] room=%s pid=%s state=%s emitted=%s",
@@ -0,0 +1,207 @@
+# app/domain/lifecycle/scheduler.py
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.store.models import RoomHeaderStore
+
+logger = logging.getLogger(__name__)
+
+Emit = Callable[[str, List[Any]], Awaitable[None]]
+Tick = Callable[..., Awaitable[List[Any]]]
+
+
+def _int(value, default: int = 0) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def next_room_deadline(header: RoomHeaderStore, game: Dict[str, Any]) -> int:
+    """
+    Earliest timer that can move this room forward (epoch seconds), 0 if none.
+    Only timers that the lifecycle auto-steps would act on in the current
+    state/phase are considered, so stale fields never re-arm the room.
+    """
+    phase = str(game.get("phase") or "").upper()
+    candidates: list[int] = [_int(game.get("clear_ops_at"), 0)]
+
+    if header.state == "CONFIG":
+        candidates.append(_int(getattr(header, "countdown_end_at", 0), 0))
+
+    elif header.state == "IN_GAME":
+        if phase == "TRANSITION":
+            candidates.append(_int(game.get("transition_until"), 0))
+        elif header.mode == "VS":
+            if phase == "DRAW":
+                candidates.append(_int(game.get("draw_end_at"), 0))
+            elif phase == "GUESS":
+                candidates.append(_int(game.get("guess_end_at"), 0))
+        else:
+            candidates.append(_int(game.get("game_end_at"), 0))
+
+    elif header.state == "GAME_END" and phase == "VOTING":
+        candidates.append(_int(game.get("vote_end_at"), 0))
+        candidates.append(_int(game.get("reset_to_waiting_at"), 0))
+
+    live = [c for c in candidates if c > 0]
+    return min(live) if live else 0
+
+
+class RoomTickScheduler:
+    """
+    Deadline-heap scheduler for room timers.
+    - keeps one pending deadline per room (the earliest live timer)
+    - fires the lifecycle tick once per deadline, then re-arms from fresh state
+    - rooms are (re)armed via touch() after messages that may move a timer
+    Runs inside the app lifespan; no rules here beyond deadline selection.
+    """
+
+    def __init__(self, app, *, emit: Emit, tick: Optional[Tick] = None) -> None:
+        self.app = app
+        self._emit = emit
+        self._tick = tick
+        self._heap: List[Tuple[int, str]] = []
+        self._deadlines: Dict[str, int] = {}
+        self._dirty: Set[str] = set()
+        self._firing: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._wake = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+
+    # ----------------------------
+    # Lifecycle
+    # ----------------------------
+    def start(self) -> None:
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        runner, self._runner = self._runner, None
+        if runner is not None:
+            runner.cancel()
+            try:
+                await runner
+            except asyncio.CancelledError:
+                pass
+        for t in list(self._tasks):
+            t.cancel()
+        self._tasks.clear()
+
+    @property
+    def running(self) -> bool:
+        return self._runner is not None
+
+    # ----------------------------
+    # Registration
+    # ----------------------------
+    def touch(self, room_code: str) -> None:
+        """Re-read this room's timers on the next loop pass (coalesced)."""
+        self._dirty.add(room_code)
+        self._wake.set()
+
+    def ensure(self, room_code: str) -> None:
+        """touch() only if the room is not tracked yet (cheap for presence pings)."""
+        if room_code in self._deadlines or room_code in self._firing:
+            return
+        self.touch(room_code)
+
+    def schedule(self, room_code: str, deadline: int) -> None:
+        if deadline <= 0:
+            self._deadlines.pop(room_code, None)
+            return
+        if self._deadlines.get(room_code) == deadline:
+            return
+        self._deadlines[room_code] = deadline
+        heapq.heappush(self._heap, (deadline, room_code))
+        self._wake.set()
+
+    def deadline_for(self, room_code: str) -> int:
+        return self._deadlines.get(room_code, 0)
+
+    # ----------------------------
+    # Internals
+    # ----------------------------
+    async def _deadline_from_store(self, room_code: str) -> int:
+        repo = self.app.state.repo
+        header = await repo.get_room_header(room_code)
+        if header is None:
+            return 0
+        game = await repo.get_game(room_code)
+        return next_room_deadline(header, game)
+
+    async def _rearm(self, room_code: str, *, fired_at: int = 0) -> None:
+        try:
+            deadline = await self._deadline_from_store(room_code)
+        except Exception:
+            logger.exception("[SCHED] rearm failed room=%s", room_code)
+            return
+        # A deadline that did not move after firing means nothing advanced;
+        # wait for the next touch() instead of spinning on it.
+        if fired_at and deadline and deadline <= fired_at:
+            deadline = 0
+        self.schedule(room_code, deadline)
+
+    async def _fire(self, room_code: str, deadline: int) -> None:
+        self._firing.add(room_code)
+        try:
+            tick = self._tick
+            if tick is None:
+                from app.domain.lifecycle.handlers import tick_room
+                tick = tick_room
+            events = await tick(app=self.app, room_code=room_code)
+            if events:
+                await self._emit(room_code, events)
+        except Exception:
+            logger.exception("[SCHED] tick failed room=%s deadline=%s", room_code, deadline)
+        finally:
+            self._firing.discard(room_code)
+        await self._rearm(room_code, fired_at=deadline)
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _drain_dirty(self) -> None:
+        rooms, self._dirty = self._dirty, set()
+        for room_code in rooms:
+            if room_code in self._firing:
+                continue
+            await self._rearm(room_code)
+
+    def _pop_due(self, now: float) -> List[Tuple[int, str]]:
+        due: List[Tuple[int, str]] = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, room_code = heapq.heappop(self._heap)
+            if self._deadlines.get(room_code) != deadline:
+                continue  # superseded by a newer schedule()
+            if room_code in self._firing:
+                continue
+            self._deadlines.pop(room_code, None)
+            due.append((deadline, room_code))
+        return due
+
+    def _next_delay(self) -> Optional[float]:
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.time())
+
+    async def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            await self._drain_dirty()
+            for deadline, room_code in self._pop_due(time.time()):
+                self._spawn(self._fire(room_code, deadline))
+            delay = self._next_delay()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
@@ -3,7 +3,7 @@ from __future__ import annotations
 from typing import List, Optional, Tuple
 
 from app.store.models import DrawOp
-from app.domain.common.ops import validate_draw_op
+from app.domain.common.ops import line_points, validate_draw_op
 from app.domain.lifecycle.handlers import _auto_expire_single_game
 from app.domain.vs.rules import should_auto_split_stroke
 from app.transport.protocols import (
@@ -25,7 +25,8 @@ async def handle_single_draw_op(*, app, room_code: str, pid: Optional[str], msg:
     repo = app.state.repo
     ts = now_ts()
 
-    header = await repo.get_room_header(room_code)
+    loaded = await repo.load_room_context(room_code, pid, parts=("header", "game"))
+    header = loaded.header
     if header is None:
         return [OutError(code="ROOM_NOT_FOUND", message="Room not found")], []
     if header.mode != "SINGLE":
@@ -37,7 +38,8 @@ async def handle_single_draw_op(*, app, room_code: str, pid: Optional[str], msg:
     if tick_events:
         return list(tick_events), tick_events
 
-    game = await repo.get_game(room_code)
+    # No tick events means the timeout step did not touch the game hash.
+    game = loaded.game or {}
     phase = str(game.get("phase") or "").upper()
     # Keep GUESS accepted as a temporary compatibility path for in-flight legacy rooms.
     if phase not in ("DRAW", "GUESS"):
@@ -57,12 +59,7 @@ async def handle_single_draw_op(*, app, room_code: str, pid: Optional[str], msg:
         return [OutError(code=err_code, message=err_msg)], []
 
     if op_type == "line":
-        pts = None
-        if isinstance(op_data.get("p"), dict):
-            pts = op_data["p"].get("pts")
-        if pts is None:
-            pts = op_data.get("pts")
-        pts = pts or []
+        pts = line_points(op_data)
         start_ts = op_data.get("start_ts", ts)
         points_for_check = [{"x": p[0], "y": p[1]} for p in pts if isinstance(p, (list, tuple)) and len(p) == 2]
         if should_auto_split_stroke(points_for_check, start_ts, ts):
@@ -72,9 +69,9 @@ async def handle_single_draw_op(*, app, room_code: str, pid: Optional[str], msg:
                     message="Stroke too long (exceeds duration or point limit).",
                 )
             ], []
-
-    strokes_left -= 1
-    await repo.set_game_fields(room_code, strokes_left=strokes_left)
+        simplifier = getattr(app.state, "stroke_simplifier", None)
+        if simplifier is not None:
+            op_data = simplifier.simplify_op(op_data)
 
     op = DrawOp(
         t=op_type,
@@ -83,9 +80,14 @@ async def handle_single_draw_op(*, app, room_code: str, pid: Optional[str], msg:
         by=pid,
     )
 
-    await repo.append_op_single(room_code, op)
-    await repo.update_room_fields(room_code, last_activity=ts)
-    await repo.refresh_room_ttl(room_code, mode=header.mode)
+    # one atomic round-trip: phase/drawer/strokes_left check + op append + activity + TTL
+    commit = await repo.commit_stroke(room_code, "SINGLE", pid=pid, ts=ts, op=op, cost=1)
+    if not commit.ok:
+        if commit.code == "NO_BUDGET":
+            return [OutError(code="STROKE_LIMIT", message="No strokes left")], []
+        if commit.code == "NOT_DRAWER":
+            return [OutError(code="NOT_DRAWER", message="Only drawer can draw")], []
+        return [OutError(code="BAD_PHASE", message="Not in active round")], []
 
-    budget_ev = OutBudgetUpdate(budget={"stroke_remaining": strokes_left})
+    budget_ev = OutBudgetUpdate(budget={"stroke_remaining": commit.remaining})
     return [budget_ev], [OutOpBroadcast(op=op.model_dump(), canvas=None, by=pid), budget_ev]
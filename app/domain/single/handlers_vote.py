@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import asyncio
 import logging
 from typing import List, Optional, Tuple
 
@@ -11,7 +10,6 @@ from app.util.timeutil import now_ts
 Outgoing = List[object]
 Result = Tuple[Outgoing, Outgoing]
 
-_ROOM_VOTE_LOCKS: dict[str, asyncio.Lock] = {}
 logger = logging.getLogger(__name__)
 
 
@@ -19,9 +17,8 @@ async def handle_single_vote_next(*, app, room_code: str, pid: Optional[str], ms
     if not pid:
         return [OutError(code="NO_PID", message="Missing pid")], []
 
-    lock = _ROOM_VOTE_LOCKS.setdefault(room_code, asyncio.Lock())
-    async with lock:
-        repo = app.state.repo
+    repo = app.state.repo
+    async with repo.room_lock(room_code, "vote"):
         ts = now_ts()
 
         header = await repo.get_room_header(room_code)
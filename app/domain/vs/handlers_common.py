@@ -1,7 +1,6 @@
 from __future__ import annotations
 
-import asyncio
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 from app.transport.protocols import (
     OutgoingEvent,
@@ -14,7 +13,6 @@ from app.transport.protocols import (
 
 Result = Tuple[List[OutgoingEvent], List[OutgoingEvent]]
 TRANSITION_SEC = 5
-_ROOM_VS_END_LOCKS: dict[str, asyncio.Lock] = {}
 
 
 def _int(value, default: int = 0) -> int:
@@ -118,8 +116,7 @@ async def end_vs_game(
     word: str,
     reason: str,
 ) -> List[OutgoingEvent]:
-    lock = _ROOM_VS_END_LOCKS.setdefault(room_code, asyncio.Lock())
-    async with lock:
+    async with repo.room_lock(room_code, "vs_end"):
         current_header = await repo.get_room_header(room_code)
         if current_header is None:
             return []
@@ -134,6 +131,7 @@ async def end_vs_game(
         # Identity is stripped only after vote-YES resolves.
         if winner_team in ("A", "B"):
             players = await repo.list_players(room_code)
+            winners = {}
             for p in players:
                 if not getattr(p, "connected", True):
                     continue
@@ -149,15 +147,12 @@ async def end_vs_game(
                 if effective_team != winner_team:
                     continue
 
-                pts = int(getattr(p, "points", 0) or 0)
-                await repo.update_player_fields(room_code, p.pid, points=pts + 1)
+                winners[p.pid] = 1
+            await repo.incr_players_points(room_code, winners)
         elif reason == "NO_WINNER":
             gm_pid = str(getattr(current_header, "gm_pid", "") or "")
             if gm_pid:
-                gm = await repo.get_player(room_code, gm_pid)
-                if gm is not None:
-                    gm_points = int(getattr(gm, "points", 0) or 0)
-                    await repo.update_player_fields(room_code, gm_pid, points=gm_points + 1)
+                await repo.incr_player_points(room_code, gm_pid, 1)
 
         await repo.vote_next_clear(room_code)
         await repo.set_game_fields(
@@ -238,13 +233,26 @@ async def advance_vs_round_or_end_game(
     )
 
 
-async def auto_advance_vs_phase(*, repo, room_code: str, header, ts: int) -> List[OutgoingEvent]:
+async def auto_advance_vs_phase(
+    *,
+    repo,
+    room_code: str,
+    header,
+    ts: int,
+    game: Optional[dict] = None,
+    budget: Optional[dict] = None,
+) -> List[OutgoingEvent]:
+    """
+    Advance DRAW/GUESS/TRANSITION when a window or budget runs out.
+    game/budget may be passed in when the caller already holds a fresh copy.
+    """
     if header.mode != "VS":
         return []
     if header.state != "IN_GAME":
         return []
 
-    game = await repo.get_game(room_code)
+    if game is None:
+        game = await repo.get_game(room_code)
     phase = game.get("phase") or "DRAW"
     if phase == "TRANSITION":
         transition_until = _int(game.get("transition_until"), 0)
@@ -291,7 +299,8 @@ async def auto_advance_vs_phase(*, repo, room_code: str, header, ts: int) -> Lis
         return []
 
     if phase == "DRAW":
-        budget = await repo.get_budget(room_code)
+        if budget is None:
+            budget = await repo.get_budget(room_code)
         has_budgets = "A" in budget and "B" in budget
         remaining_a = _int(budget.get("A"), 0)
         remaining_b = _int(budget.get("B"), 0)
@@ -3,7 +3,7 @@ from __future__ import annotations
 from typing import Any, Dict, Optional
 
 from app.domain.common.validation import is_drawer
-from app.domain.common.ops import validate_draw_op
+from app.domain.common.ops import line_points, validate_draw_op
 from .handlers_common import Result, auto_advance_vs_phase
 from app.domain.vs.rules import should_auto_split_stroke
 from app.store.models import DrawOp
@@ -22,7 +22,8 @@ async def handle_vs_draw_op(*, app, room_code: str, pid: Optional[str], msg: InD
     repo = app.state.repo
     ts = now_ts()
 
-    header = await repo.get_room_header(room_code)
+    loaded = await repo.load_room_context(room_code, pid, parts=("header", "game", "player", "budget"))
+    header = loaded.header
     if header is None:
         return [OutError(code="ROOM_NOT_FOUND", message="Room not found")], []
 
@@ -32,7 +33,8 @@ async def handle_vs_draw_op(*, app, room_code: str, pid: Optional[str], msg: InD
     if header.state != "IN_GAME":
         return [OutError(code="BAD_STATE", message=f"Cannot draw in state {header.state}")], []
 
-    game = await repo.get_game(room_code)
+    game = loaded.game or {}
+    budget = dict(loaded.budget or {})
     if game.get("phase") != "DRAW":
         return [OutError(code="BAD_PHASE", message="Not in DRAW phase")], []
 
@@ -42,10 +44,12 @@ async def handle_vs_draw_op(*, app, room_code: str, pid: Optional[str], msg: InD
     except (TypeError, ValueError):
         draw_end_at = 0
     if draw_end_at and ts >= draw_end_at:
-        events = await auto_advance_vs_phase(repo=repo, room_code=room_code, header=header, ts=ts)
+        events = await auto_advance_vs_phase(
+            repo=repo, room_code=room_code, header=header, ts=ts, game=game, budget=budget
+        )
         return [OutError(code="DRAW_EXPIRED", message="Draw window ended")], events
 
-    player = await repo.get_player(room_code, pid)
+    player = loaded.player
     if player is None:
         return [OutError(code="PLAYER_NOT_FOUND", message="Player not found")], []
 
@@ -73,35 +77,15 @@ async def handle_vs_draw_op(*, app, room_code: str, pid: Optional[str], msg: InD
     op_payload.setdefault("tool", op_type)
     op_payload.setdefault("sab", 0)
 
+    too_long = False
     if op_type == "line":
-        pts = op_payload.get("pts")
-        if pts is None and isinstance(op_payload.get("p"), dict):
-            pts = op_payload["p"].get("pts")
-            if pts is not None:
-                op_payload["pts"] = pts
-        pts = pts or []
-        ok, _remaining = await repo.consume_vs_stroke(room_code, canvas, cost=1)
-        if not ok:
-            return [OutError(code="NO_BUDGET", message="No strokes remaining for this phase")], []
+        pts = line_points(op_payload)
         start_ts = op_payload.get("start_ts", ts)
         points_for_check = [{"x": p[0], "y": p[1]} for p in pts if isinstance(p, (list, tuple)) and len(p) == 2]
-        if should_auto_split_stroke(points_for_check, start_ts, ts):
-            budget_after = await repo.get_budget(room_code)
-            budget_ev = OutBudgetUpdate(budget=budget_after)
-            transition_events = await auto_advance_vs_phase(repo=repo, room_code=room_code, header=header, ts=ts)
-            return [
-                OutError(
-                    code="STROKE_TOO_LONG",
-                    message="Stroke too long (exceeds duration or point limit). Budget consumed.",
-                ),
-                budget_ev,
-                *transition_events,
-            ], [budget_ev, *transition_events]
-
-    elif op_type == "circle":
-        ok, _remaining = await repo.consume_vs_stroke(room_code, canvas, cost=1)
-        if not ok:
-            return [OutError(code="NO_BUDGET", message="No strokes remaining for this phase")], []
+        too_long = should_auto_split_stroke(points_for_check, start_ts, ts)
+        simplifier = getattr(app.state, "stroke_simplifier", None)
+        if simplifier is not None and not too_long:
+            op_payload = simplifier.simplify_op(op_payload)
 
     draw_op = DrawOp(
         t=op_type,
@@ -110,18 +94,45 @@ async def handle_vs_draw_op(*, app, room_code: str, pid: Optional[str], msg: InD
         by=pid,
     )
 
-    await repo.append_op_vs(room_code, canvas, draw_op)
-    await repo.update_room_fields(room_code, last_activity=ts)
-    await repo.refresh_room_ttl(room_code, mode="VS")
+    # one atomic round-trip: phase/deadline/budget check + op append + activity + TTL
+    # (an over-long stroke is still charged but not stored)
+    commit = await repo.commit_stroke(
+        room_code, "VS", pid=pid, ts=ts, op=None if too_long else draw_op, team=canvas, cost=1
+    )
+    if not commit.ok:
+        if commit.code == "NO_BUDGET":
+            return [OutError(code="NO_BUDGET", message="No strokes remaining for this phase")], []
+        if commit.code == "EXPIRED":
+            # game/budget changed under us; let auto-advance re-read them
+            events = await auto_advance_vs_phase(repo=repo, room_code=room_code, header=header, ts=ts)
+            return [OutError(code="DRAW_EXPIRED", message="Draw window ended")], events
+        if commit.code == "BAD_STATE":
+            return [OutError(code="BAD_STATE", message="Cannot draw in current state")], []
+        return [OutError(code="BAD_PHASE", message="Not in DRAW phase")], []
+
+    budget.update(commit.budget)
+    budget[canvas] = commit.remaining
+
+    budget_ev = OutBudgetUpdate(budget=budget)
+    transition_events = []
+    if commit.transition:
+        transition_events = await auto_advance_vs_phase(
+            repo=repo, room_code=room_code, header=header, ts=ts, game=game, budget=budget
+        )
+
+    if too_long:
+        return [
+            OutError(
+                code="STROKE_TOO_LONG",
+                message="Stroke too long (exceeds duration or point limit). Budget consumed.",
+            ),
+            budget_ev,
+            *transition_events,
+        ], [budget_ev, *transition_events]
 
-    budget_after = await repo.get_budget(room_code)
-    budget_ev = OutBudgetUpdate(budget=budget_after)
     to_room = [
         OutOpBroadcast(op=draw_op.model_dump(), canvas=canvas, by=pid),
         budget_ev,
+        *transition_events,
     ]
-    transition_events = await auto_advance_vs_phase(repo=repo, room_code=room_code, header=header, ts=ts)
-    if transition_events:
-        to_room.extend(transition_events)
-
     return [budget_ev, *transition_events], to_room
@@ -92,6 +92,7 @@ async def handle_vs_role_pick(*, app, room_code: str, pid: Optional[str], msg: I
         await repo.update_player_fields(room_code, header.gm_pid, role="gm")
 
     # Assign guessers to all remaining players (excluding GM and drawers)
+    guesser_updates = {}
     for p in players:
         # Skip GM - GM has no team/role assignment
         if p.pid == header.gm_pid:
@@ -103,10 +104,11 @@ async def handle_vs_role_pick(*, app, room_code: str, pid: Optional[str], msg: I
 
         # Assign guesser role based on team
         if p.pid in teams["A"]:
-            await repo.update_player_fields(room_code, p.pid, role="guesserA")
+            guesser_updates[p.pid] = {"role": "guesserA"}
         elif p.pid in teams["B"]:
-            await repo.update_player_fields(room_code, p.pid, role="guesserB")
+            guesser_updates[p.pid] = {"role": "guesserB"}
         # If player has no team, they remain without role (shouldn't happen in VS mode)
+    await repo.update_players_bulk(room_code, guesser_updates)
 
     await repo.set_roles(room_code, roles)
     await repo.update_room_fields(room_code, state="CONFIG", last_activity=ts)
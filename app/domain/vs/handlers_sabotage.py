@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import asyncio
 from typing import Any, Dict, Optional, Tuple
 
 from app.domain.common.validation import is_drawer
@@ -18,7 +17,6 @@ from app.transport.protocols import (
 )
 from app.util.timeutil import now_ts
 
-_ROOM_SABOTAGE_LOCKS: dict[str, asyncio.Lock] = {}
 SABOTAGE_ARM_DURATION_SEC = 10
 
 
@@ -90,9 +88,8 @@ async def clear_vs_sabotage_if_armed_by(
     pid: str,
     reason: str = "CANCELLED",
 ) -> list[OutSabotageState]:
-    lock = _ROOM_SABOTAGE_LOCKS.setdefault(room_code, asyncio.Lock())
-    async with lock:
-        repo = app.state.repo
+    repo = app.state.repo
+    async with repo.room_lock(room_code, "sabotage"):
         header = await repo.get_room_header(room_code)
         if header is None or header.mode != "VS":
             return []
@@ -113,9 +110,8 @@ async def handle_vs_sabotage_arm(*, app, room_code: str, pid: Optional[str], msg
     if not pid:
         return [OutError(code="NO_PID", message="Missing pid")], []
 
-    lock = _ROOM_SABOTAGE_LOCKS.setdefault(room_code, asyncio.Lock())
-    async with lock:
-        repo = app.state.repo
+    repo = app.state.repo
+    async with repo.room_lock(room_code, "sabotage"):
         ts = now_ts()
 
         header = await repo.get_room_header(room_code)
@@ -209,9 +205,8 @@ async def handle_vs_sabotage_cancel(*, app, room_code: str, pid: Optional[str],
     if not pid:
         return [OutError(code="NO_PID", message="Missing pid")], []
 
-    lock = _ROOM_SABOTAGE_LOCKS.setdefault(room_code, asyncio.Lock())
-    async with lock:
-        repo = app.state.repo
+    repo = app.state.repo
+    async with repo.room_lock(room_code, "sabotage"):
         ts = now_ts()
 
         header = await repo.get_room_header(room_code)
@@ -250,9 +245,8 @@ async def handle_vs_sabotage(*, app, room_code: str, pid: Optional[str], msg: In
     if not pid:
         return [OutError(code="NO_PID", message="Missing pid")], []
 
-    lock = _ROOM_SABOTAGE_LOCKS.setdefault(room_code, asyncio.Lock())
-    async with lock:
-        repo = app.state.repo
+    repo = app.state.repo
+    async with repo.room_lock(room_code, "sabotage"):
         ts = now_ts()
 
         header = await repo.get_room_header(room_code)
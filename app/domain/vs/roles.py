@@ -38,21 +38,25 @@ async def auto_assign_vs_roles(repo, room_code: str, gm_pid: Optional[str]) -> T
     drawer_a_pid = _pick_drawer(team_a_members, prev_drawer_a)
     drawer_b_pid = _pick_drawer(team_b_members, prev_drawer_b)
 
-    await repo.update_player_fields(room_code, drawer_a_pid, role="drawerA")
-    await repo.update_player_fields(room_code, drawer_b_pid, role="drawerB")
+    updates = {
+        drawer_a_pid: {"role": "drawerA"},
+        drawer_b_pid: {"role": "drawerB"},
+    }
 
     for p in players:
         if p.pid == gm_pid:
-            await repo.update_player_fields(room_code, p.pid, role="gm")
+            updates[p.pid] = {"role": "gm"}
             continue
         if p.pid == drawer_a_pid or p.pid == drawer_b_pid:
             continue
         if p.pid in teams["A"]:
-            await repo.update_player_fields(room_code, p.pid, role="guesserA")
+            updates[p.pid] = {"role": "guesserA"}
         elif p.pid in teams["B"]:
-            await repo.update_player_fields(room_code, p.pid, role="guesserB")
+            updates[p.pid] = {"role": "guesserB"}
         else:
-            await repo.update_player_fields(room_code, p.pid, role=None)
+            updates[p.pid] = {"role": None}
+
+    await repo.update_players_bulk(room_code, updates)
 
     roles = {"drawerA": drawer_a_pid, "drawerB": drawer_b_pid}
     await repo.set_roles(room_code, roles)
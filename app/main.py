@@ -1,16 +1,31 @@
 # app/main.py
 from __future__ import annotations
 
+import logging
+import uuid
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from redis.asyncio import Redis
+from redis.asyncio.cluster import RedisCluster
 
+from app.domain.common.raster import CanvasRasterizer, raster_available
+from app.domain.common.simplify import StrokeSimplifier
+from app.domain.common.stroke_stream import StrokeStreams
+from app.domain.lifecycle.handlers import tick_room
+from app.domain.lifecycle.scheduler import RoomTickScheduler
 from app.settings import get_settings
 from app.store.redis_repo import RedisRepo
 from app.transport.admin import router as admin_router
+from app.transport.affinity import make_router
+from app.transport.canvas import router as canvas_router
+from app.transport.dispatcher import _dump
+from app.transport.fanout import make_fanout
 from app.transport.ws import router as ws_router
 from app.transport.ws_manager import WSManager
 
+logger = logging.getLogger(__name__)
+
 
 def create_app() -> FastAPI:
     settings = get_settings()
@@ -29,15 +44,106 @@ def create_app() -> FastAPI:
 
     @app.on_event("startup")
     async def _startup() -> None:
-        r = Redis.from_url(settings.REDIS_URL, decode_responses=False)
+        if settings.REDIS_CLUSTER:
+            r = RedisCluster.from_url(settings.REDIS_URL, decode_responses=False)
+        else:
+            r = Redis.from_url(settings.REDIS_URL, decode_responses=False)
         app.state.redis = r
-        app.state.repo = RedisRepo(r, room_ttl_sec=settings.ROOM_TTL_SEC)
-        app.state.wsman = WSManager()
+        app.state.repo = RedisRepo(
+            r,
+            room_ttl_sec=settings.ROOM_TTL_SEC,
+            ttl_refresh_fraction=settings.ROOM_TTL_REFRESH_FRACTION,
+            migrate_legacy_keys=not settings.REDIS_CLUSTER,
+            distributed_locks=settings.ROOM_DISTRIBUTED_LOCKS,
+            header_cache=settings.ROOM_HEADER_CACHE if settings.ROOM_HEADER_CACHE in ("trust", "off") else "validate",
+            ops_checkpoint_every=settings.OPS_CHECKPOINT_EVERY,
+            ops_checkpoint_max=settings.OPS_CHECKPOINT_MAX,
+        )
+        app.state.wsman = WSManager(
+            max_queue=settings.WS_SEND_QUEUE_MAX,
+            overflow="disconnect" if settings.WS_SEND_OVERFLOW == "disconnect" else "drop",
+        )
+        app.state.stroke_simplifier = (
+            StrokeSimplifier(settings.STROKE_SIMPLIFY_EPSILON) if settings.STROKE_SIMPLIFY_EPSILON > 0 else None
+        )
         await r.ping()
+        await app.state.repo.scripts.load_all()
+
+        app.state.node_id = settings.NODE_ID or uuid.uuid4().hex[:12]
+        # a room's owner may not hold all of its sockets: affinity needs cross-node fan-out
+        fanout_backend = "redis" if settings.ROOM_AFFINITY_ENABLED else settings.WS_FANOUT_BACKEND
+
+        # pub/sub gets its own client: PUBLISH reaches every cluster node from any node
+        app.state.pubsub_redis = None
+        if fanout_backend == "redis":
+            app.state.pubsub_redis = Redis.from_url(settings.REDIS_URL, decode_responses=False)
+        app.state.fanout = make_fanout(fanout_backend, app.state.wsman, app.state.pubsub_redis, app.state.node_id)
+        await app.state.fanout.start()
+        app.state.rooms = make_router(
+            app,
+            settings.ROOM_AFFINITY_ENABLED,
+            app.state.pubsub_redis,
+            node_id=app.state.node_id,
+            lease_ms=settings.ROOM_LEASE_MS,
+        )
+        await app.state.rooms.start()
+        app.state.repo.locks.is_local_owner = app.state.rooms.owns_locally
+        app.state.repo.header_cache.is_local_owner = app.state.rooms.owns_locally
+
+        async def _emit_strokes(room_code: str, events, exclude_pid) -> None:
+            await app.state.fanout.publish(room_code, _dump(events), exclude_pid=exclude_pid)
+
+        app.state.stroke_streams = StrokeStreams(
+            app, emit=_emit_strokes, flush_interval_sec=max(settings.STROKE_STREAM_FLUSH_MS, 1) / 1000
+        )
+        app.state.stroke_streams.start()
+
+        app.state.rasterizer = None
+        if settings.RASTER_ENABLED:
+            if raster_available():
+                app.state.rasterizer = CanvasRasterizer(
+                    app.state.repo,
+                    width=settings.RASTER_WIDTH,
+                    height=settings.RASTER_HEIGHT,
+                    fmt=settings.RASTER_FORMAT,
+                )
+                app.state.rasterizer.start()
+            else:
+                logger.warning("RASTER_ENABLED is set but Pillow is not installed; canvas rendering is off")
+
+        if settings.ROOM_SCHEDULER_ENABLED:
+            async def _emit(room_code: str, events) -> None:
+                await app.state.fanout.publish(room_code, _dump(events))
+
+            async def _tick(*, app, room_code: str):
+                # only the room's owner advances its timers
+                if not await app.state.rooms.owns(room_code):
+                    return []
+                return await tick_room(app=app, room_code=room_code)
 
+            app.state.scheduler = RoomTickScheduler(app, emit=_emit, tick=_tick)
+            app.state.scheduler.start()
 
     @app.on_event("shutdown")
     async def _shutdown() -> None:
+        scheduler = getattr(app.state, "scheduler", None)
+        if scheduler is not None:
+            await scheduler.stop()
+        streams = getattr(app.state, "stroke_streams", None)
+        if streams is not None:
+            await streams.stop()
+        rasterizer = getattr(app.state, "rasterizer", None)
+        if rasterizer is not None:
+            await rasterizer.stop()
+        rooms = getattr(app.state, "rooms", None)
+        if rooms is not None:
+            await rooms.stop()
+        fanout = getattr(app.state, "fanout", None)
+        if fanout is not None:
+            await fanout.stop()
+        pubsub_r = getattr(app.state, "pubsub_redis", None)
+        if pubsub_r is not None:
+            await pubsub_r.close()
         r: Redis = app.state.redis
         await r.close()
 
@@ -49,6 +155,7 @@ def create_app() -> FastAPI:
 
     app.include_router(ws_router)
     app.include_router(admin_router)
+    app.include_router(canvas_router)
     return app
 
 
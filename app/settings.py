@@ -10,7 +10,11 @@ class Settings(BaseModel):
 
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
+    # Connect with RedisCluster (REDIS_URL points at any cluster node)
+    REDIS_CLUSTER: bool = False
     ROOM_TTL_SEC: int = 1800
+    # Skip TTL refreshes for a room refreshed less than this fraction of ROOM_TTL_SEC ago
+    ROOM_TTL_REFRESH_FRACTION: float = 0.1
 
     # Server
     HOST: str = "0.0.0.0"
@@ -19,20 +23,58 @@ class Settings(BaseModel):
     # Dev
     LOG_LEVEL: str = "INFO"
 
+    # Room timers fire from a server-side scheduler (heartbeat becomes presence-only)
+    ROOM_SCHEDULER_ENABLED: bool = True
+
     # ✅ WebSocket origin policy (comma-separated)
     WS_ALLOWED_ORIGINS: str = "http://localhost:5173,http://127.0.0.1:5173,null"
     # ✅ Dev helper: allow any private LAN IP on port 5173
     WS_ALLOW_LAN_ORIGINS: bool = True
+    # Per-connection outbound queue (frames); on overflow "drop" sheds queued strokes,
+    # "disconnect" closes the slow socket
+    WS_SEND_QUEUE_MAX: int = 256
+    WS_SEND_OVERFLOW: str = "drop"
+    # Room event fan-out: "local" (single process) or "redis" (pub/sub across workers/hosts)
+    WS_FANOUT_BACKEND: str = "local"
+
+    # Multi-worker: each room runs on one owner worker (others forward); implies redis fan-out
+    ROOM_AFFINITY_ENABLED: bool = False
+    ROOM_LEASE_MS: int = 10000
+    # Worker id for fan-out/affinity; random per process when empty
+    NODE_ID: str = ""
+    # Room critical sections (phase ends, sabotage, votes) also lock in Redis,
+    # so several workers can share rooms; skipped for rooms this worker owns
+    ROOM_DISTRIBUTED_LOCKS: bool = True
+    # Every N ops a canvas' older ops are folded (clear/undo applied) into its checkpoint; 0 = off
+    OPS_CHECKPOINT_EVERY: int = 500
+    # Checkpoint length cap; past it the oldest ops drop out of full replays; 0 = no cap
+    OPS_CHECKPOINT_MAX: int = 20000
+    # Per-process room header cache: validate (version check per read) | trust (single worker) | off
+    ROOM_HEADER_CACHE: str = "validate"
+    # Line ops are simplified (Ramer-Douglas-Peucker) to this tolerance in canvas px; 0 = off
+    STROKE_SIMPLIFY_EPSILON: float = 0.75
+    # Streamed strokes (stroke_begin/points/end): at most one delta broadcast per stroke per interval
+    STROKE_STREAM_FLUSH_MS: int = 50
+    # Server-rendered canvases for late joiners (needs Pillow); size in canvas px, png | webp
+    RASTER_ENABLED: bool = False
+    RASTER_WIDTH: int = 800
+    RASTER_HEIGHT: int = 600
+    RASTER_FORMAT: str = "png"
 
 
 def get_settings() -> Settings:
     return Settings(
         APP_NAME=os.getenv("APP_NAME", "drawguess-server"),
         REDIS_URL=os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+        REDIS_CLUSTER=os.getenv("REDIS_CLUSTER", "false").lower()
+        in ("1", "true", "yes", "y", "on"),
         ROOM_TTL_SEC=int(os.getenv("ROOM_TTL_SEC", "1800")),
+        ROOM_TTL_REFRESH_FRACTION=float(os.getenv("ROOM_TTL_REFRESH_FRACTION", "0.1")),
         HOST=os.getenv("HOST", "0.0.0.0"),
         PORT=int(os.getenv("PORT", "8000")),
         LOG_LEVEL=os.getenv("LOG_LEVEL", "INFO"),
+        ROOM_SCHEDULER_ENABLED=os.getenv("ROOM_SCHEDULER_ENABLED", "true").lower()
+        in ("1", "true", "yes", "y", "on"),
 
         WS_ALLOWED_ORIGINS=os.getenv(
             "WS_ALLOWED_ORIGINS",
@@ -40,4 +82,22 @@ def get_settings() -> Settings:
         ),
         WS_ALLOW_LAN_ORIGINS=os.getenv("WS_ALLOW_LAN_ORIGINS", "true").lower()
         in ("1", "true", "yes", "y", "on"),
+        WS_SEND_QUEUE_MAX=int(os.getenv("WS_SEND_QUEUE_MAX", "256")),
+        WS_SEND_OVERFLOW=os.getenv("WS_SEND_OVERFLOW", "drop").lower(),
+        WS_FANOUT_BACKEND=os.getenv("WS_FANOUT_BACKEND", "local").lower(),
+        ROOM_AFFINITY_ENABLED=os.getenv("ROOM_AFFINITY_ENABLED", "false").lower()
+        in ("1", "true", "yes", "y", "on"),
+        ROOM_LEASE_MS=int(os.getenv("ROOM_LEASE_MS", "10000")),
+        NODE_ID=os.getenv("NODE_ID", ""),
+        ROOM_DISTRIBUTED_LOCKS=os.getenv("ROOM_DISTRIBUTED_LOCKS", "true").lower()
+        in ("1", "true", "yes", "y", "on"),
+        OPS_CHECKPOINT_EVERY=int(os.getenv("OPS_CHECKPOINT_EVERY", "500")),
+        ROOM_HEADER_CACHE=os.getenv("ROOM_HEADER_CACHE", "validate").lower(),
+        STROKE_SIMPLIFY_EPSILON=float(os.getenv("STROKE_SIMPLIFY_EPSILON", "0.75")),
+        STROKE_STREAM_FLUSH_MS=int(os.getenv("STROKE_STREAM_FLUSH_MS", "50")),
+        RASTER_ENABLED=os.getenv("RASTER_ENABLED", "false").lower()
+        in ("1", "true", "yes", "y", "on"),
+        RASTER_WIDTH=int(os.getenv("RASTER_WIDTH", "800")),
+        RASTER_HEIGHT=int(os.getenv("RASTER_HEIGHT", "600")),
+        RASTER_FORMAT=os.getenv("RASTER_FORMAT", "png").lower(),
     )
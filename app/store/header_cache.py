@@ -0,0 +1,122 @@
+# app/store/header_cache.py
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Literal, Optional, Tuple
+
+from app.store.models import RoomHeaderStore
+
+# Room hash field bumped (HINCRBY) on every header write.
+HEADER_VERSION_FIELD = "v"
+
+HeaderCacheMode = Literal["validate", "trust", "off"]
+
+
+class HeaderCache:
+    """
+    Per-process cache of parsed room headers (RedisRepo.get_room_header).
+    - "validate": a hit costs one HGET of the room's version stamp instead of
+      HGETALL + parsing; safe with any number of workers
+    - "trust": a hit is a dict lookup; only when this process is the room's
+      only writer (single worker). Rooms owned under affinity
+      (is_local_owner) are trusted in "validate" mode too.
+    - "off": every read goes to Redis
+    Local writes invalidate immediately. Trusted entries are also re-read after
+    max_age_sec, so a room that expired in Redis does not linger.
+    A read that was in flight while the room was invalidated is not cached
+    (per-room invalidation generation), and an entry is never replaced by an
+    older version. A room's mode never changes, so mode lookups are served
+    from any entry.
+    commit_stroke bumps last_activity without the version stamp (it would
+    invalidate on every stroke), so a cached last_activity may lag.
+    """
+
+    def __init__(
+        self,
+        mode: HeaderCacheMode = "validate",
+        *,
+        max_rooms: int = 10_000,
+        max_age_sec: float = 5.0,
+        is_local_owner: Optional[Callable[[str], bool]] = None,
+    ) -> None:
+        self.mode = mode
+        self.max_rooms = max_rooms
+        self.max_age_sec = max_age_sec
+        self.is_local_owner = is_local_owner
+        # room -> (version, header, cached_at)
+        self._entries: "OrderedDict[str, Tuple[int, RoomHeaderStore, float]]" = OrderedDict()
+        # room -> invalidations so far (bounded like the entries)
+        self._generations: "OrderedDict[str, int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def trusted(self, room_code: str) -> bool:
+        if self.mode == "trust":
+            return True
+        return self.is_local_owner is not None and self.is_local_owner(room_code)
+
+    def get(self, room_code: str) -> Optional[Tuple[int, RoomHeaderStore, float]]:
+        entry = self._entries.get(room_code)
+        if entry is not None:
+            self._entries.move_to_end(room_code)
+        return entry
+
+    def fresh(self, entry: Tuple[int, RoomHeaderStore, float]) -> bool:
+        return time.monotonic() - entry[2] < self.max_age_sec
+
+    def generation(self, room_code: str) -> int:
+        """Capture before reading the header from Redis; pass to put()."""
+        return self._generations.get(room_code, 0)
+
+    def put(
+        self,
+        room_code: str,
+        version: int,
+        header: Optional[RoomHeaderStore],
+        generation: Optional[int] = None,
+    ) -> None:
+        if not self.enabled:
+            return
+        if generation is not None and generation != self._generations.get(room_code, 0):
+            self.stale_puts += 1  # written (and invalidated) while the read was in flight
+            return
+        current = self._entries.get(room_code)
+        if current is not None and current[0] > version:
+            self.stale_puts += 1
+            return
+        if header is None:
+            self._entries.pop(room_code, None)
+            return
+        self._entries[room_code] = (version, header, time.monotonic())
+        self._entries.move_to_end(room_code)
+        while len(self._entries) > self.max_rooms:
+            self._entries.popitem(last=False)
+
+    def mode_of(self, room_code: str) -> Optional[str]:
+        entry = self._entries.get(room_code)
+        return entry[1].mode if entry is not None else None
+
+    def invalidate(self, room_code: str) -> None:
+        self._generations[room_code] = self._generations.get(room_code, 0) + 1
+        self._generations.move_to_end(room_code)
+        while len(self._generations) > self.max_rooms:
+            self._generations.popitem(last=False)
+        if self._entries.pop(room_code, None) is not None:
+            self.invalidations += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "rooms": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "stale_puts": self.stale_puts,
+        }
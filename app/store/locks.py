@@ -0,0 +1,184 @@
+# app/store/locks.py
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+
+from redis.asyncio import Redis
+
+from app.store.redis_keys import RK
+from app.store.scripts import ScriptRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class RoomLockTimeout(Exception):
+    """Another worker held the room lock for longer than acquire_timeout_sec."""
+
+
+class StaleLockError(Exception):
+    """A write under a room lock was fenced off: a newer holder of that lock already wrote to the room."""
+
+
+class _LockEntry:
+    __slots__ = ("lock", "refs")
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.refs = 0  # holders + waiters
+
+
+class RoomLockRegistry:
+    """
+    In-process asyncio.Locks keyed by (room, scope), shared by every subsystem.
+    Entries are refcounted: created on first use and dropped as soon as nobody
+    holds or waits for them, so rooms that are gone leave no Lock behind.
+    Scopes stay separate because critical sections nest (a sabotage can end
+    the game while holding "sabotage", which then takes "vs_end").
+    """
+
+    def __init__(self) -> None:
+        self._entries: Dict[Tuple[str, str], _LockEntry] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @asynccontextmanager
+    async def hold(self, room_code: str, scope: str) -> AsyncIterator[None]:
+        key = (room_code, scope)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _LockEntry()
+        entry.refs += 1
+        try:
+            async with entry.lock:
+                yield
+        finally:
+            entry.refs -= 1
+            if entry.refs == 0 and self._entries.get(key) is entry:
+                del self._entries[key]
+
+
+@dataclass(frozen=True)
+class RoomLockHandle:
+    room_code: str
+    scope: str
+    # fencing token, increasing per room; 0 on the local fast path (nothing to fence)
+    token: int
+    distributed: bool
+
+
+# (handle, holding task) of every room lock the current task is inside
+_held: ContextVar[Tuple[Tuple[RoomLockHandle, Optional[asyncio.Task]], ...]] = ContextVar("room_locks_held", default=())
+
+
+def current_fence(room_code: str) -> Optional[RoomLockHandle]:
+    """
+    Innermost distributed lock the current task holds on the room; RedisRepo
+    fences the room writes made under it. Tasks spawned inside the lock
+    inherit the ContextVar but not the fence (they may outlive the lock).
+    """
+    task = asyncio.current_task()
+    for handle, holder in reversed(_held.get()):
+        if holder is task and handle.room_code == room_code:
+            return handle
+    return None
+
+
+class RoomLocks:
+    """
+    Per-room mutex that also holds across workers.
+    - the in-process lock for (room, scope) from the RoomLockRegistry is taken
+      first, so tasks of this process queue locally instead of polling Redis
+    - then SET NX PX on RK.lock(scope); the value is a token from
+      RK.lock_counter(), and release only deletes the key if it still holds it
+    - while held, a watchdog renews the lease every lease_ms / 3, so a slow
+      critical section keeps the lock; a crashed holder stops renewing and
+      its lease (lease_ms) expires
+    - the token fences the holder's writes: phase, score and stroke writes
+      made under the lock (see current_fence) only apply if no newer token
+      of the scope was written to RK.lock_fence(), so a holder that stalled
+      past its lease gets StaleLockError instead of overwriting the next one
+    - fast path: when is_local_owner(room) says this worker owns the room
+      (room affinity), no other worker can mutate it and Redis is skipped
+    """
+
+    def __init__(
+        self,
+        r: Redis,
+        scripts: ScriptRegistry,
+        *,
+        enabled: bool = True,
+        lease_ms: int = 5000,
+        acquire_timeout_sec: float = 10.0,
+        is_local_owner: Optional[Callable[[str], bool]] = None,
+        registry: Optional[RoomLockRegistry] = None,
+    ) -> None:
+        self.r = r
+        self.scripts = scripts
+        self.enabled = enabled
+        self.lease_ms = lease_ms
+        self.acquire_timeout_sec = acquire_timeout_sec
+        self.is_local_owner = is_local_owner
+        self.registry = registry if registry is not None else RoomLockRegistry()
+        self.timeouts = 0
+
+    async def _acquire(self, room_code: str, scope: str) -> int:
+        rk = RK(room_code)
+        deadline = time.monotonic() + self.acquire_timeout_sec
+        delay = 0.005
+        while True:
+            token = int(await self.scripts.call("lock_acquire", keys=[rk.lock(scope), rk.lock_counter()], args=[str(self.lease_ms)]))
+            if token:
+                return token
+            if time.monotonic() >= deadline:
+                self.timeouts += 1
+                raise RoomLockTimeout(f"room lock busy: {room_code}/{scope}")
+            await asyncio.sleep(delay * (1 + random.random()))
+            delay = min(delay * 2, 0.1)
+
+    async def _renew(self, room_code: str, scope: str, token: int) -> None:
+        key = RK(room_code).lock(scope)
+        while True:
+            await asyncio.sleep(self.lease_ms / 3000.0)
+            try:
+                renewed = await self.scripts.call("lock_renew", keys=[key], args=[str(token), str(self.lease_ms)])
+            except Exception:
+                logger.exception("[LOCKS] renew failed room=%s scope=%s", room_code, scope)
+                continue
+            if not int(renewed):
+                logger.warning("[LOCKS] lease lost room=%s scope=%s", room_code, scope)
+                return
+
+    async def _release(self, room_code: str, scope: str, token: int) -> None:
+        await self.scripts.call("lock_release", keys=[RK(room_code).lock(scope)], args=[str(token)])
+
+    @asynccontextmanager
+    async def hold(self, room_code: str, scope: str) -> AsyncIterator[RoomLockHandle]:
+        async with self.registry.hold(room_code, scope):
+            if not self.enabled or (self.is_local_owner is not None and self.is_local_owner(room_code)):
+                yield RoomLockHandle(room_code=room_code, scope=scope, token=0, distributed=False)
+                return
+            token = await self._acquire(room_code, scope)
+            handle = RoomLockHandle(room_code=room_code, scope=scope, token=token, distributed=True)
+            held = _held.set(_held.get() + ((handle, asyncio.current_task()),))
+            watchdog = asyncio.create_task(self._renew(room_code, scope, token))
+            try:
+                yield handle
+            finally:
+                _held.reset(held)
+                watchdog.cancel()
+                try:
+                    await watchdog
+                except asyncio.CancelledError:
+                    pass
+                await self._release(room_code, scope, token)
+
+    def metrics(self) -> Dict[str, int]:
+        return {"live_locks": len(self.registry), "timeouts": self.timeouts}
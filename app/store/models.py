@@ -1,7 +1,8 @@
 # app/store/models.py
 from __future__ import annotations
 
-from typing import Literal, Optional, Any, Dict
+from dataclasses import dataclass, field
+from typing import Literal, Optional, Any, Dict, FrozenSet
 from pydantic import BaseModel, Field
 
 
@@ -9,6 +10,9 @@ Mode = Literal["SINGLE", "VS"]
 RoomState = Literal["WAITING", "ROLE_PICK", "CONFIG", "IN_GAME", "GAME_END"]
 Phase = Literal["", "FREE", "DRAW", "GUESS", "VOTING", "TRANSITION"]
 
+# Ops canvas name for SINGLE (VS canvases are the teams, "A" / "B").
+SINGLE_CANVAS = "main"
+
 
 class PlayerStore(BaseModel):
     pid: str
@@ -45,6 +49,7 @@ class DrawOp(BaseModel):
     p: Dict[str, Any] = Field(default_factory=dict)  # payload e.g. points, radius, color, size
     ts: int
     by: str  # pid
+    seq: int = 0  # per-canvas sequence, assigned by the store on append (0 = not stored yet)
 
 
 class ModLogEntry(BaseModel):
@@ -53,3 +58,48 @@ class ModLogEntry(BaseModel):
     by: str
     reason: str = ""
     ts: int
+
+
+@dataclass
+class LoadedRoom:
+    """
+    Result of RedisRepo.load_room_context(): room parts read in one round-trip.
+    Parts that were not requested stay None; `parts` lists what was loaded.
+    """
+    room_code: str
+    pid: Optional[str] = None
+    parts: FrozenSet[str] = frozenset()
+    header: Optional[RoomHeaderStore] = None
+    game: Optional[Dict[str, Any]] = None
+    player: Optional[PlayerStore] = None
+    budget: Optional[Dict[str, int]] = None
+    round_config: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class StrokeCommit:
+    """
+    Result of RedisRepo.commit_stroke().
+    code: "" on success, else BAD_STATE | BAD_PHASE | EXPIRED | NOT_DRAWER | NO_BUDGET.
+    budget: VS team budgets after the charge; transition: both teams are out of strokes.
+    """
+    ok: bool
+    code: str = ""
+    remaining: int = 0
+    budget: Dict[str, int] = field(default_factory=dict)
+    transition: bool = False
+    seq: int = 0  # seq assigned to the stored op (0 if charged only)
+
+
+@dataclass
+class OpsTail:
+    """
+    Result of RedisRepo.get_ops_tail() for one canvas.
+    mode: "delta" -> ops are everything after the client's since_seq;
+          "full"  -> client must reset the canvas and replay ops.
+    ops: DrawOp models, or stored JSON strings when read with raw=True.
+    """
+    canvas: str
+    mode: Literal["full", "delta"]
+    seq: int
+    ops: list = field(default_factory=list)
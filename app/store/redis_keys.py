@@ -4,70 +4,116 @@ from __future__ import annotations
 from dataclasses import dataclass
 
 
+# Key schema versions:
+#   1 (legacy): room:CODE, room:CODE:players, ...
+#   2: room:{CODE}, room:{CODE}:players, ... ({CODE} is a Redis Cluster hash tag,
+#      so every key of a room maps to the same slot and multi-key Lua/pipelines work)
+KEY_SCHEMA = 2
+
+# Process-wide keys (not room-scoped)
+WORKERS_KEY = "workers"  # ZSET node_id -> lease expiry (ms), room-affinity membership
+
+
+def worker_channel(node_id: str) -> str:
+    return f"worker:{node_id}:rpc"  # CHANNEL forwarded room calls + replies
+
+
 @dataclass(frozen=True)
 class RK:
     """
     Redis Key builder for room-scoped keys.
     Matches your blueprint.
+    schema=1 builds legacy (untagged) keys; used only to migrate old rooms.
     """
     room_code: str
+    schema: int = KEY_SCHEMA
+
+    @property
+    def _p(self) -> str:
+        if self.schema == 1:
+            return f"room:{self.room_code}"
+        return f"room:{{{self.room_code}}}"
 
     # ---- Core ----
     def room(self) -> str:
-        return f"room:{self.room_code}"  # HASH
+        return self._p  # HASH
 
     def players(self) -> str:
-        return f"room:{self.room_code}:players"  # HASH pid -> JSON
+        return f"{self._p}:players"  # HASH "<pid>:<field>" -> JSON value (legacy: pid -> JSON)
 
     def active(self) -> str:
-        return f"room:{self.room_code}:active"  # SET pid
+        return f"{self._p}:active"  # SET pid
 
     def connections(self) -> str:
-        return f"room:{self.room_code}:connections"  # SET conn_id or pid:conn
+        return f"{self._p}:connections"  # SET conn_id or pid:conn
 
     def roles(self) -> str:
-        return f"room:{self.room_code}:roles"  # HASH role -> pid
+        return f"{self._p}:roles"  # HASH role -> pid
 
     # ---- Teams (VS) ----
     def team(self, team: str) -> str:
         # team should be "A" or "B"
-        return f"room:{self.room_code}:team:{team}"  # SET pid
+        return f"{self._p}:team:{team}"  # SET pid
 
     def teams_meta(self) -> str:
         # optional, for storing team names/colors etc.
-        return f"room:{self.room_code}:teams"  # HASH optional
+        return f"{self._p}:teams"  # HASH optional
 
     # ---- Round + live game ----
     def round_config(self) -> str:
-        return f"room:{self.room_code}:round:config"  # HASH
+        return f"{self._p}:round:config"  # HASH
 
     def game(self) -> str:
-        return f"room:{self.room_code}:game"  # HASH live state
+        return f"{self._p}:game"  # HASH live state
 
     # ---- Budgets / cooldown / ratelimit ----
     def budget(self) -> str:
-        return f"room:{self.room_code}:budget"  # HASH (single: stroke_remaining, vs: team budgets)
+        return f"{self._p}:budget"  # HASH (single: stroke_remaining, vs: team budgets)
 
     def cooldown(self) -> str:
-        return f"room:{self.room_code}:cooldown"  # HASH e.g. sabotage_next_ts_A/B
+        return f"{self._p}:cooldown"  # HASH e.g. sabotage_next_ts_A/B
 
     def ratelimit(self) -> str:
-        return f"room:{self.room_code}:ratelimit"  # HASH or per pid keys
+        return f"{self._p}:ratelimit"  # HASH or per pid keys
 
     # ---- Drawing ops ----
     def ops(self) -> str:
-        return f"room:{self.room_code}:ops"  # LIST (single)
+        return f"{self._p}:ops"  # LIST (single)
 
     def ops_team(self, team: str) -> str:
-        return f"room:{self.room_code}:ops:{team}"  # LIST (vs A/B)
+        return f"{self._p}:ops:{team}"  # LIST (vs A/B)
+
+    def ops_seq(self) -> str:
+        return f"{self._p}:ops:seq"  # HASH canvas ("main" | "A" | "B") -> last op seq
+
+    def ops_checkpoint(self, canvas: str) -> str:
+        return f"{self._p}:ops:ckpt:{canvas}"  # LIST ops folded out of the canvas' ops list
 
     # ---- Voting ----
     def votes_next(self) -> str:
-        return f"room:{self.room_code}:votes:next"  # SET pid
+        return f"{self._p}:votes:next"  # SET pid
 
     # ---- Moderation ----
     def modlog(self) -> str:
-        return f"room:{self.room_code}:modlog"  # LIST entries JSON
+        return f"{self._p}:modlog"  # LIST entries JSON
+
+    # ---- Ownership (own PX lease, not part of the room TTL) ----
+    def owner(self) -> str:
+        return f"{self._p}:owner"  # STRING node_id of the worker running this room
+
+    # ---- Distributed locks (own PX lease) ----
+    def lock(self, scope: str) -> str:
+        return f"{self._p}:lock:{scope}"  # STRING token of the holder
+
+    def lock_counter(self) -> str:
+        return f"{self._p}:lock:counter"  # STRING counter, lock tokens
+
+    def lock_fence(self) -> str:
+        return f"{self._p}:lock:fence"  # HASH scope -> newest lock token that wrote
+
+    # ---- Pub/sub (channel, not a key: no TTL) ----
+    def fanout(self) -> str:
+        return f"{self._p}:fanout"  # CHANNEL cross-node room events
 
     # ---- Convenience: all keys to TTL-refresh ----
     def all_room_keys(self, mode: str | None = None) -> list[str]:
@@ -88,9 +134,27 @@ class RK:
             self.ratelimit(),
             self.votes_next(),
             self.modlog(),
+            self.ops_seq(),
+            self.lock_counter(),
+            self.lock_fence(),
         ]
         if mode == "VS":
             keys.extend([self.team("A"), self.team("B"), self.ops_team("A"), self.ops_team("B"), self.teams_meta()])
+            keys.extend([self.ops_checkpoint("A"), self.ops_checkpoint("B")])
         else:
-            keys.append(self.ops())
+            keys.extend([self.ops(), self.ops_checkpoint("main")])
         return keys
+
+
+def room_code_from_header_key(key: str) -> str | None:
+    """
+    room:{CODE} or legacy room:CODE -> CODE; None for any other room-scoped key.
+    """
+    if not key.startswith("room:"):
+        return None
+    rest = key[len("room:"):]
+    if rest.startswith("{") and rest.endswith("}") and rest.count("}") == 1:
+        return rest[1:-1] or None
+    if rest and ":" not in rest and "{" not in rest and "}" not in rest:
+        return rest
+    return None
@@ -2,40 +2,278 @@
 from __future__ import annotations
 
 import json
-from typing import Any, Optional, Iterable, Literal
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, ContextManager, Optional, Iterable, Literal
 
 from redis.asyncio import Redis
 
-from app.store.redis_keys import RK
-from app.store.models import PlayerStore, RoomHeaderStore, DrawOp, ModLogEntry
+from app.store.redis_keys import RK, WORKERS_KEY
+from app.store.header_cache import HEADER_VERSION_FIELD, HeaderCache, HeaderCacheMode
+from app.store.locks import RoomLockHandle, RoomLocks, StaleLockError, current_fence
+from app.store.room_context import MISSING, RoomContext, activate, current_room_context
+from app.store.scripts import ScriptRegistry
+from app.store.models import (
+    PlayerStore, RoomHeaderStore, DrawOp, ModLogEntry, LoadedRoom, OpsTail, StrokeCommit, SINGLE_CANVAS,
+)
 
 Mode = Literal["SINGLE", "VS"]
 
+# Parts load_room_context() can fetch in one pipeline.
+ROOM_PARTS = ("header", "game", "player", "budget", "round_config")
+
+
+# Players are packed into one hash as "<pid>:<field>" -> JSON value, so single
+# fields (connected, last_seen, points, ...) update without re-writing a blob.
+# Older rooms store "<pid>" -> PlayerStore JSON; readers accept both and the
+# player_update script unpacks a legacy blob on first write.
+PLAYER_FIELDS = tuple(PlayerStore.model_fields)
+
+
+def _player_mapping(player: PlayerStore) -> dict[str, str]:
+    return {f"{player.pid}:{k}": json.dumps(v) for k, v in player.model_dump().items()}
+
+
+def _player_args(fields: dict[str, Any]) -> list[str]:
+    args: list[str] = []
+    for k, v in fields.items():
+        if k not in PLAYER_FIELDS or k == "pid":
+            raise ValueError(f"Unknown player field: {k}")
+        args.extend((k, json.dumps(v)))
+    return args
+
+
+def _op_json(op: DrawOp) -> str:
+    """Stored form of an op; the append scripts splice the assigned "seq" in front."""
+    return op.model_dump_json(exclude={"seq"})
+
+
+def _hash_mapping(fields: dict[str, Any]) -> dict[str, str]:
+    """Encode values for game/round-config hashes (dict/list -> JSON, rest -> str)."""
+    return {k: json.dumps(v) if isinstance(v, (dict, list)) else str(v) for k, v in fields.items()}
+
+
+class RoomWriteBatch:
+    """
+    Collects room-scoped writes and flushes them in one round-trip.
+    Mirrors the RedisRepo write methods used on hot paths; nothing is sent until execute().
+    fence: a distributed RoomLockHandle; the writes then go out as one fenced_batch
+    script call instead of a pipeline and only apply if no newer holder of that
+    lock wrote to the room (else execute() raises StaleLockError).
+    """
+
+    def __init__(self, repo: "RedisRepo", room_code: str, fence: Optional[RoomLockHandle] = None):
+        self.repo = repo
+        self.room_code = room_code
+        self.rk = RK(room_code)
+        self.fence = fence if fence is not None and fence.distributed else None
+        self._pipe = repo.r.pipeline(transaction=False) if self.fence is None else None
+        self._cmds: list[str] = []  # fenced: name, argc, args... per command
+        self._keys: dict[str, None] = {}  # fenced: keys the commands touch, in order
+        self._count = 0
+        self._ttl_mode: Optional[Mode] = None
+        self._parts: set[str] = set()  # RoomContext parts written
+        self._appends: list[tuple[int, str]] = []  # (result index, canvas) of queued op appends
+        self._results: list[tuple[int, Callable[[Any], Any]]] = []  # (result index, decoder)
+
+    def _cmd(self, name: str, keys: list[str], *args: Any) -> None:
+        """Queue a command for fenced_batch (fenced batches only)."""
+        self._cmds.extend((name, str(len(args)), *(str(a) for a in args)))
+        self._keys.update(dict.fromkeys(keys))
+        self._count += 1
+
+    def _hset(self, key: str, mapping: dict[str, Any]) -> None:
+        if self.fence is not None:
+            self._cmd("HSET", [key], key, *(x for kv in mapping.items() for x in kv))
+        else:
+            self._pipe.hset(key, mapping=mapping)
+            self._count += 1
+
+    def update_room_fields(self, **fields: Any) -> "RoomWriteBatch":
+        if fields:
+            self._hset(self.rk.room(), fields)
+            if self.fence is not None:
+                self._cmd("HINCRBY", [self.rk.room()], self.rk.room(), HEADER_VERSION_FIELD, 1)
+            else:
+                self._pipe.hincrby(self.rk.room(), HEADER_VERSION_FIELD, 1)
+                self._count += 1
+            self._parts.add("header")
+        return self
+
+    def set_game_fields(self, **fields: Any) -> "RoomWriteBatch":
+        self.repo._ttl_dirty(self.room_code)
+        if fields:
+            self._hset(self.rk.game(), _hash_mapping(fields))
+            self._parts.add("game")
+        return self
+
+    def set_budget_fields(self, **fields: Any) -> "RoomWriteBatch":
+        self.repo._ttl_dirty(self.room_code)
+        if fields:
+            self._hset(self.rk.budget(), {k: str(v) for k, v in fields.items()})
+            self._parts.add("budget")
+        return self
+
+    def _append_op(self, ops_key: str, canvas: str, op: DrawOp, max_ops: int) -> "RoomWriteBatch":
+        self.repo._ttl_dirty(self.room_code)
+        self._appends.append((self._count, canvas))
+        keys = [ops_key, self.rk.ops_seq()]
+        if self.fence is not None:
+            self._cmd("APPEND_OP", keys, *keys, canvas, _op_json(op), max_ops)
+        else:
+            self.repo.scripts.queue(self._pipe, "append_op", keys=keys, args=[canvas, _op_json(op), str(max_ops)])
+            self._count += 1
+        return self
+
+    def append_op_single(self, op: DrawOp, max_ops: int = 5000) -> "RoomWriteBatch":
+        return self._append_op(self.rk.ops(), SINGLE_CANVAS, op, max_ops)
+
+    def append_op_vs(self, team: Literal["A", "B"], op: DrawOp, max_ops: int = 5000) -> "RoomWriteBatch":
+        return self._append_op(self.rk.ops_team(team), team, op, max_ops)
+
+    def incr_player_points(self, pid: str, delta: int = 1) -> "RoomWriteBatch":
+        """Result: the player's new total (None if no such player)."""
+        index = self._count
+        if self.fence is not None:
+            self._cmd("PLAYER_POINTS", [self.rk.players()], self.rk.players(), pid, int(delta))
+            self._results.append((index, lambda res: int(res) if res is not None else None))
+        else:
+            self.repo.scripts.queue(
+                self._pipe, "player_update", keys=[self.rk.players(), self.rk.active()],
+                args=[pid, "", "points", str(int(delta))],
+            )
+            self._count += 1
+            self._results.append((index, lambda res: int(res[1]) if int(res[0]) else None))
+        self._parts.add("player")
+        return self
+
+    def consume_vs_stroke(self, team: Literal["A", "B"], cost: int = 1) -> "RoomWriteBatch":
+        """Result: (ok, remaining), as RedisRepo.consume_vs_stroke()."""
+        index = self._count
+        if self.fence is not None:
+            self._cmd("CONSUME_STROKE", [self.rk.budget()], self.rk.budget(), team, cost)
+        else:
+            self.repo.scripts.queue(self._pipe, "consume_stroke", keys=[self.rk.budget()], args=[team, str(cost)])
+            self._count += 1
+        self._results.append((index, lambda res: (bool(int(res[0])), int(res[1]))))
+        self._parts.add("budget")
+        return self
+
+    def refresh_room_ttl(self, mode: Mode, *, force: bool = False) -> "RoomWriteBatch":
+        if not force and self.repo._ttl_fresh(self.room_code, mode):
+            return self
+        for k in self.rk.all_room_keys(mode=mode):
+            if self.fence is not None:
+                self._cmd("EXPIRE", [k], k, self.repo.room_ttl_sec)
+            else:
+                self._pipe.expire(k, self.repo.room_ttl_sec)
+                self._count += 1
+        self._ttl_mode = mode
+        return self
+
+    async def execute(self) -> list[Any]:
+        if not self._count:
+            return []
+        self._count = 0
+        if self.fence is not None:
+            res = await self.repo.scripts.call(
+                "fenced_batch",
+                keys=[self.rk.lock_fence(), *self._keys],
+                args=[self.fence.scope, str(self.fence.token), *self._cmds],
+            )
+            self._cmds, self._keys = [], {}
+            if not int(res[0]):
+                self._parts, self._appends, self._results, self._ttl_mode = set(), [], [], None
+                raise StaleLockError(
+                    f"room lock {self.room_code}/{self.fence.scope} token {self.fence.token} "
+                    f"is older than {int(res[1])}"
+                )
+            res = list(res[1:])
+            if self._ttl_mode is None:
+                self.repo._ttl_dirty(self.room_code)  # the fence hash may be new
+        else:
+            res = await self._pipe.execute()
+        if "header" in self._parts:
+            self.repo.header_cache.invalidate(self.room_code)
+        if self._parts:
+            self.repo._ctx_dirty(self.room_code, *self._parts)
+            self._parts = set()
+        if self._ttl_mode is not None:
+            self.repo._mark_ttl_refreshed(self.room_code, self._ttl_mode)
+            self._ttl_mode = None
+        results, self._results = self._results, []
+        for i, decode in results:
+            res[i] = decode(res[i])
+        appends, self._appends = self._appends, []
+        for i, canvas in appends:
+            await self.repo._maybe_checkpoint(self.room_code, canvas, int(res[i]))
+        return res
+
 
 class RedisRepo:
-    def __init__(self, r: Redis, room_ttl_sec: int = 1800):
+    def __init__(
+        self,
+        r: Redis,
+        room_ttl_sec: int = 1800,
+        ttl_refresh_fraction: float = 0.0,
+        migrate_legacy_keys: bool = True,
+        distributed_locks: bool = True,
+        header_cache: HeaderCacheMode = "validate",
+        ops_checkpoint_every: int = 500,
+        ops_checkpoint_keep: int = 200,
+        ops_checkpoint_max: int = 20_000,
+    ):
+        # r: Redis or RedisCluster (all keys of a room share the {CODE} hash tag)
         self.r = r
         self.room_ttl_sec = room_ttl_sec
+        # rename schema-1 (untagged) keys on first access; single node only,
+        # since legacy keys of one room may live in different cluster slots
+        self.migrate_legacy_keys = migrate_legacy_keys
+        self.scripts = ScriptRegistry(r)
+        # refresh_room_ttl() is skipped if this process refreshed the room
+        # less than ttl_refresh_fraction * room_ttl_sec ago (0 = never skip)
+        self.ttl_refresh_window = max(0.0, float(ttl_refresh_fraction)) * room_ttl_sec
+        self._ttl_refreshed: dict[str, tuple[str, float]] = {}
+        # per-room critical sections (phase ends, sabotage, votes); see RoomLocks
+        self.locks = RoomLocks(r, self.scripts, enabled=distributed_locks)
+        self.header_cache = HeaderCache(header_cache)
+        # every ops_checkpoint_every appends to a canvas, all but its newest
+        # ops_checkpoint_keep ops are folded into the checkpoint (0 = never)
+        self.ops_checkpoint_every = ops_checkpoint_every
+        self.ops_checkpoint_keep = ops_checkpoint_keep
+        # checkpoint length cap: past it the oldest ops are trimmed (lost for
+        # full replays); a round's clear_ops() resets it anyway (0 = no cap)
+        self.ops_checkpoint_max = ops_checkpoint_max
 
-    _LUA_CONSUME_STROKE = """
-local budget_key = KEYS[1]
-local team = ARGV[1]
-local cost = tonumber(ARGV[2]) or 1
+    @asynccontextmanager
+    async def room_lock(self, room_code: str, scope: str) -> AsyncIterator[RoomLockHandle]:
+        """async with repo.room_lock(code, "vs_end"): ... -- serialized across workers."""
+        async with self.locks.hold(room_code, scope) as handle:
+            # reads memoized before the lock may predate another holder's writes
+            self._ctx_dirty(room_code)
+            yield handle
 
-local cur = redis.call("HGET", budget_key, team)
-if not cur then
-  cur = 0
-else
-  cur = tonumber(cur) or 0
-end
+    # ----------------------------
+    # Request-scoped reads (RoomContext)
+    # ----------------------------
+    def room_context(self, room_code: str, pid: Optional[str] = None) -> ContextManager[RoomContext]:
+        """with repo.room_context(code, pid) as ctx: ... -- memoize room reads for one message."""
+        return activate(RoomContext(self, room_code, pid))
+
+    def _ctx(self, room_code: str) -> Optional[RoomContext]:
+        ctx = current_room_context()
+        return ctx if ctx is not None and ctx.active_for(self, room_code) else None
 
-if cur < cost then
-  return {0, cur}
-end
+    def _ctx_dirty(self, room_code: str, *parts: Any) -> None:
+        ctx = self._ctx(room_code)
+        if ctx is not None:
+            ctx.invalidate(*parts)
 
-local new_val = redis.call("HINCRBY", budget_key, team, -cost)
-return {1, new_val}
-"""
+    async def _memo(self, room_code: str, key: Any, load: Callable[[], Awaitable[Any]]) -> Any:
+        ctx = self._ctx(room_code)
+        if ctx is None:
+            return await load()
+        return await ctx.memo(key, load)
 
     def _dec(self, x):
             """Decode redis bytes -> str; pass through str/int/None safely."""
@@ -48,113 +286,407 @@ return {1, new_val}
     def _dec_map(self, d: dict) -> dict:
             return {self._dec(k): self._dec(v) for k, v in d.items()}
 
+    def _parse_header(self, data: dict) -> Optional[RoomHeaderStore]:
+        if not data:
+            return None
+        # redis returns bytes sometimes depending config; normalize
+        norm = self._dec_map(data)
+        norm.pop(HEADER_VERSION_FIELD, None)
+
+        # ints
+        for f in ["cap", "created_at", "last_activity", "game_no", "round_no", "countdown_end_at"]:
+            if f in norm and norm[f] != "":
+                norm[f] = int(norm[f])
+
+        # Back-compat: older data used round_no as game_no
+        if "game_no" not in norm and "round_no" in norm:
+            norm["game_no"] = int(norm.get("round_no") or 0)
+            norm["round_no"] = 0
+        return RoomHeaderStore(**norm)
+
+    def _header_version(self, data: dict) -> int:
+        raw = data.get(HEADER_VERSION_FIELD.encode("utf-8"), data.get(HEADER_VERSION_FIELD))
+        return int(self._dec(raw) or 0)
+
+    def _cache_header(self, room_code: str, data: dict, generation: int) -> Optional[RoomHeaderStore]:
+        """
+        Parse an HGETALL of the room hash and remember it in the header cache,
+        unless the room was invalidated since generation (captured before the read).
+        """
+        header = self._parse_header(data)
+        self.header_cache.put(room_code, self._header_version(data) if data else 0, header, generation)
+        return header.model_copy() if header is not None else None
+
+    def _parse_json_hash(self, data: dict) -> dict[str, Any]:
+        out: dict[str, Any] = {}
+        for k, v in data.items():
+            ks = self._dec(k)
+            vs = self._dec(v)
+            # best-effort json parse
+            try:
+                out[ks] = json.loads(vs)
+            except Exception:
+                out[ks] = vs
+        return out
+
+    def _parse_budget(self, data: dict) -> dict[str, int]:
+        return {self._dec(k): int(self._dec(v)) for k, v in data.items()}
+
+    def _parse_player(self, values: list[Any]) -> Optional[PlayerStore]:
+        """values: HMGET of PLAYER_FIELDS (packed) followed by the legacy blob field."""
+        packed = {
+            f: json.loads(self._dec(v)) for f, v in zip(PLAYER_FIELDS, values) if v is not None
+        }
+        if "pid" in packed:
+            return PlayerStore(**packed)
+        legacy = values[len(PLAYER_FIELDS)] if len(values) > len(PLAYER_FIELDS) else None
+        if legacy:
+            return PlayerStore.model_validate_json(self._dec(legacy))
+        return None
+
+    def _parse_players(self, data: dict) -> list[PlayerStore]:
+        packed: dict[str, dict[str, Any]] = {}
+        legacy: dict[str, dict[str, Any]] = {}
+        for k, v in data.items():
+            field = self._dec(k)
+            try:
+                value = json.loads(self._dec(v))
+            except Exception:
+                continue
+            if isinstance(value, dict):
+                legacy[field] = value  # "<pid>" -> blob
+                continue
+            pid, sep, name = field.rpartition(":")
+            if sep:
+                packed.setdefault(pid, {})[name] = value
+        players = [PlayerStore(**fields) for fields in packed.values() if "pid" in fields]
+        seen = {p.pid for p in players}
+        players.extend(PlayerStore(**blob) for pid, blob in legacy.items() if pid not in seen)
+        return players
+
+    def _player_fields(self, pid: str) -> list[str]:
+        return [f"{pid}:{f}" for f in PLAYER_FIELDS] + [pid]
+
 
     # ----------------------------
     # Helpers
     # ----------------------------
-    async def refresh_room_ttl(self, room_code: str, mode: Mode) -> None:
-        rk = RK(room_code)
-        keys = rk.all_room_keys(mode=mode)
+    async def refresh_room_ttl(self, room_code: str, mode: Mode, *, force: bool = False) -> None:
+        if not force and self._ttl_fresh(room_code, mode):
+            return
+        keys = RK(room_code).all_room_keys(mode=mode)
+        # one round-trip: expire everything
+        await self.scripts.call("expire_keys", keys=keys, args=[str(self.room_ttl_sec)])
+        self._mark_ttl_refreshed(room_code, mode)
 
-        # Pipeline: expire everything
-        pipe = self.r.pipeline()
-        for k in keys:
-            pipe.expire(k, self.room_ttl_sec)
-        await pipe.execute()
+    def _ttl_fresh(self, room_code: str, mode: Mode) -> bool:
+        if self.ttl_refresh_window <= 0:
+            return False
+        last = self._ttl_refreshed.get(room_code)
+        if last is None or last[0] != mode:
+            return False
+        return time.monotonic() - last[1] < self.ttl_refresh_window
+
+    def _mark_ttl_refreshed(self, room_code: str, mode: Mode) -> None:
+        if self.ttl_refresh_window > 0:
+            self._ttl_refreshed[room_code] = (mode, time.monotonic())
+
+    def _ttl_dirty(self, room_code: str) -> None:
+        """A key may have been created without a TTL; next refresh must run."""
+        self._ttl_refreshed.pop(room_code, None)
 
     async def room_exists(self, room_code: str) -> bool:
-        return bool(await self.r.exists(RK(room_code).room()))
+        if await self.r.exists(RK(room_code).room()):
+            return True
+        return await self._migrate_legacy_room(room_code)
+
+    async def _migrate_legacy_room(self, room_code: str) -> bool:
+        """
+        Move a live room written with key schema 1 (room:CODE:...) to the
+        hash-tagged schema (room:{CODE}:...). Returns True if the room was found.
+        Only called after a miss on the new header key.
+        """
+        if not self.migrate_legacy_keys:
+            return False
+        old, new = RK(room_code, schema=1), RK(room_code)
+        if not await self.r.exists(old.room()):
+            return False
+        pairs: list[str] = []
+        seen: set[str] = set()
+        for mode in ("SINGLE", "VS"):
+            for src, dst in zip(old.all_room_keys(mode=mode), new.all_room_keys(mode=mode)):
+                if src not in seen:
+                    seen.add(src)
+                    pairs.extend((src, dst))
+        await self.scripts.call("rename_keys", keys=pairs)
+        self._ttl_dirty(room_code)
+        self._ctx_dirty(room_code)
+        return True
+
+    # ----------------------------
+    # Batched room access
+    # ----------------------------
+    async def load_room_context(
+        self,
+        room_code: str,
+        pid: Optional[str] = None,
+        parts: Iterable[str] = ROOM_PARTS,
+    ) -> LoadedRoom:
+        """
+        Read several room parts in one pipelined round-trip.
+        parts: any of ROOM_PARTS; "player" is skipped when pid is None.
+        """
+        rk = RK(room_code)
+        wanted = set(parts)
+        order = [p for p in ROOM_PARTS if p in wanted and (p != "player" or pid)]
+        out = LoadedRoom(room_code=room_code, pid=pid, parts=frozenset(order))
+
+        # parts this message already read come from its RoomContext
+        ctx = self._ctx(room_code)
+        ctx_key = lambda part: ("player", pid) if part == "player" else part  # noqa: E731
+        fetch = []
+        for part in order:
+            value = ctx.peek(ctx_key(part)) if ctx is not None else MISSING
+            if value is MISSING:
+                fetch.append(part)
+            else:
+                setattr(out, part, value)
+
+        generation = self.header_cache.generation(room_code)
+        pipe = self.r.pipeline(transaction=False)
+        for part in fetch:
+            if part == "header":
+                pipe.hgetall(rk.room())
+            elif part == "game":
+                pipe.hgetall(rk.game())
+            elif part == "player":
+                pipe.hmget(rk.players(), self._player_fields(pid))
+            elif part == "budget":
+                pipe.hgetall(rk.budget())
+            elif part == "round_config":
+                pipe.hgetall(rk.round_config())
+        results = await pipe.execute() if fetch else []
+        if fetch and fetch[0] == "header" and not results[0] and await self._migrate_legacy_room(room_code):
+            return await self.load_room_context(room_code, pid, parts=order)
+
+        for part, res in zip(fetch, results):
+            if part == "header":
+                out.header = self._cache_header(room_code, res, generation)
+            elif part == "game":
+                out.game = self._parse_json_hash(res)
+            elif part == "player":
+                out.player = self._parse_player(res)
+            elif part == "budget":
+                out.budget = self._parse_budget(res)
+            elif part == "round_config":
+                out.round_config = self._parse_json_hash(res)
+            if ctx is not None:
+                ctx.put(ctx_key(part), getattr(out, part))
+        return out
+
+    def write_batch(self, room_code: str, fence: Optional[RoomLockHandle] = None) -> RoomWriteBatch:
+        """
+        Start a batched write for a room; flush with `await batch.execute()`.
+        fence defaults to the room lock this task holds on the room (current_fence).
+        """
+        return RoomWriteBatch(self, room_code, fence if fence is not None else current_fence(room_code))
+
+    def _fenced(self, room_code: str) -> Optional[RoomWriteBatch]:
+        """A fenced batch when the caller holds a distributed lock on the room, else None."""
+        fence = current_fence(room_code)
+        return RoomWriteBatch(self, room_code, fence) if fence is not None else None
 
     # ----------------------------
     # Room header
     # ----------------------------
     async def create_room(self, room_code: str, header: RoomHeaderStore) -> None:
+        self._ttl_dirty(room_code)
         rk = RK(room_code)
         # Store as Redis hash
         await self.r.hset(rk.room(), mapping=header.model_dump(exclude_none=True))
         # Ensure empty structures exist (optional but nice)
         pipe = self.r.pipeline()
+        pipe.hincrby(rk.room(), HEADER_VERSION_FIELD, 1)
         pipe.delete(rk.players(), rk.active(), rk.connections(), rk.roles(), rk.round_config(),
                     rk.game(), rk.budget(), rk.cooldown(), rk.ratelimit(), rk.votes_next(), rk.modlog(),
-                    rk.ops(), rk.ops_team("A"), rk.ops_team("B"), rk.team("A"), rk.team("B"), rk.teams_meta())
+                    rk.ops(), rk.ops_team("A"), rk.ops_team("B"), rk.ops_seq(), rk.team("A"), rk.team("B"),
+                    rk.teams_meta(), rk.ops_checkpoint(SINGLE_CANVAS), rk.ops_checkpoint("A"),
+                    rk.ops_checkpoint("B"))
         await pipe.execute()
+        self.header_cache.invalidate(room_code)
+        self._ctx_dirty(room_code)
 
     async def get_room_header(self, room_code: str) -> Optional[RoomHeaderStore]:
+        """
+        Room header, through the per-process HeaderCache: a hit is a dict
+        lookup (trusted) or one HGET of the version stamp, a miss is HGETALL.
+        Returns a copy, callers may modify it.
+        """
+        return await self._memo(room_code, "header", lambda: self._read_room_header(room_code))
+
+    async def _read_room_header(self, room_code: str) -> Optional[RoomHeaderStore]:
         rk = RK(room_code)
-        data = await self.r.hgetall(rk.room())
-        if not data:
-            return None
-        # redis returns bytes sometimes depending config; normalize
-        norm = self._dec_map(data)
+        cache = self.header_cache
+        entry = cache.get(room_code) if cache.enabled else None
+        if entry is not None:
+            version, header, _cached_at = entry
+            if cache.trusted(room_code):
+                if cache.fresh(entry):
+                    cache.hits += 1
+                    return header.model_copy()
+            else:
+                current = await self.r.hget(rk.room(), HEADER_VERSION_FIELD)
+                if current is not None and int(self._dec(current)) == version:
+                    cache.hits += 1
+                    return header.model_copy()
+        cache.misses += 1
 
-        # ints
-        for f in ["cap", "created_at", "last_activity", "game_no", "round_no", "countdown_end_at"]:
-            if f in norm and norm[f] != "":
-                norm[f] = int(norm[f])
+        generation = cache.generation(room_code)
+        data = await self.r.hgetall(rk.room())
+        if not data and await self._migrate_legacy_room(room_code):
+            data = await self.r.hgetall(rk.room())
+        return self._cache_header(room_code, data, generation)
 
-        # Back-compat: older data used round_no as game_no
-        if "game_no" not in norm and "round_no" in norm:
-            norm["game_no"] = int(norm.get("round_no") or 0)
-            norm["round_no"] = 0
-        return RoomHeaderStore(**norm)
+    async def get_room_mode(self, room_code: str) -> Optional[Mode]:
+        """A room's mode never changes: served from any cached header."""
+        mode = self.header_cache.mode_of(room_code)
+        if mode is not None:
+            return mode  # type: ignore[return-value]
+        header = await self.get_room_header(room_code)
+        return header.mode if header is not None else None
 
     async def update_room_fields(self, room_code: str, **fields: Any) -> None:
+        batch = self._fenced(room_code)
+        if batch is not None:
+            await batch.update_room_fields(**fields).execute()
+            return
         rk = RK(room_code)
-        await self.r.hset(rk.room(), mapping=fields)
+        pipe = self.r.pipeline()
+        pipe.hset(rk.room(), mapping=fields)
+        pipe.hincrby(rk.room(), HEADER_VERSION_FIELD, 1)
+        await pipe.execute()
+        self.header_cache.invalidate(room_code)
+        self._ctx_dirty(room_code, "header")
 
     async def clear_room_field(self, room_code: str, field: str) -> None:
         rk = RK(room_code)
-        await self.r.hdel(rk.room(), field)
+        pipe = self.r.pipeline()
+        pipe.hdel(rk.room(), field)
+        pipe.hincrby(rk.room(), HEADER_VERSION_FIELD, 1)
+        await pipe.execute()
+        self.header_cache.invalidate(room_code)
+        self._ctx_dirty(room_code, "header")
 
     async def clear_round_config(self, room_code: str) -> None:
         rk = RK(room_code)
         await self.r.delete(rk.round_config())
+        self._ctx_dirty(room_code, "round_config")
 
     # ----------------------------
     # Players
     # ----------------------------
     async def add_player(self, room_code: str, player: PlayerStore) -> None:
+        self._ttl_dirty(room_code)
         rk = RK(room_code)
-        await self.r.hset(rk.players(), player.pid, player.model_dump_json())
-        await self.r.sadd(rk.active(), player.pid)
+        pipe = self.r.pipeline()
+        pipe.hset(rk.players(), mapping=_player_mapping(player))
+        pipe.hdel(rk.players(), player.pid)  # drop a legacy blob, if any
+        pipe.sadd(rk.active(), player.pid)
+        await pipe.execute()
+        self._ctx_dirty(room_code, ("player", player.pid))
 
-    async def set_player_connected(self, room_code: str, pid: str, connected: bool, ts: int) -> None:
+    async def _player_update(
+        self,
+        room_code: str,
+        pid: str,
+        fields: dict[str, Any],
+        *,
+        active_op: str = "",
+        incr: Optional[tuple[str, int]] = None,
+    ) -> Optional[int]:
+        """Atomic per-field player write; returns None if the player is missing."""
         rk = RK(room_code)
-        raw = await self.r.hget(rk.players(), pid)
-        if not raw:
-            return
-        p = PlayerStore.model_validate_json(self._dec(raw))
-        p.connected = connected
-        p.last_seen = ts
-        await self.r.hset(rk.players(), pid, p.model_dump_json())
-        if connected:
-            await self.r.sadd(rk.active(), pid)
-        else:
-            await self.r.srem(rk.active(), pid)
+        incr_field, incr_by = incr if incr else ("", 0)
+        res = await self.scripts.call(
+            "player_update",
+            keys=[rk.players(), rk.active()],
+            args=[pid, active_op, incr_field, str(incr_by), *_player_args(fields)],
+        )
+        self._ctx_dirty(room_code, ("player", pid))
+        if not int(res[0]):
+            return None
+        return int(res[1])
+
+    async def set_player_connected(self, room_code: str, pid: str, connected: bool, ts: int) -> None:
+        await self._player_update(
+            room_code,
+            pid,
+            {"connected": connected, "last_seen": ts},
+            active_op="add" if connected else "rem",
+        )
 
     async def update_player_fields(self, room_code: str, pid: str, **fields: Any) -> None:
+        if fields:
+            await self._player_update(room_code, pid, fields)
+
+    async def incr_player_points(self, room_code: str, pid: str, delta: int = 1) -> Optional[int]:
+        """Atomically add to a player's points; returns the new total (None if no such player)."""
+        batch = self._fenced(room_code)
+        if batch is not None:
+            return (await batch.incr_player_points(pid, delta).execute())[0]
+        return await self._player_update(room_code, pid, {}, incr=("points", delta))
+
+    async def _players_bulk(
+        self,
+        room_code: str,
+        updates: dict[str, dict[str, Any]],
+        *,
+        points: Optional[dict[str, int]] = None,
+        remove_from: Iterable[str] = (),
+    ) -> dict[str, int]:
+        """One player_update-style Lua call for many players; returns {pid: points} for existing ones."""
+        points = points or {}
+        pids = list(dict.fromkeys([*updates, *points]))
+        if not pids:
+            return {}
+        args: list[str] = []
+        for pid in pids:
+            fields = _player_args(updates.get(pid) or {})
+            args.extend((pid, str(len(fields) // 2), str(int(points.get(pid, 0)))))
+            args.extend(fields)
         rk = RK(room_code)
-        raw = await self.r.hget(rk.players(), pid)
-        if not raw:
-            return
-        p = PlayerStore.model_validate_json(self._dec(raw))
-        for k, v in fields.items():
-            setattr(p, k, v)
-        await self.r.hset(rk.players(), pid, p.model_dump_json())
+        res = await self.scripts.call("players_update_bulk", keys=[rk.players(), *remove_from], args=args)
+        self._ctx_dirty(room_code, "player")
+        return {self._dec(res[i]): int(res[i + 1]) for i in range(0, len(res) - 1, 2)}
+
+    async def update_players_bulk(self, room_code: str, updates: dict[str, dict[str, Any]]) -> None:
+        """update_player_fields for many players ({pid: {field: value}}) in one round-trip."""
+        await self._players_bulk(room_code, updates)
+
+    async def incr_players_points(self, room_code: str, deltas: dict[str, int]) -> dict[str, int]:
+        """Atomically add points to many players; returns {pid: new total} for players that exist."""
+        batch = self._fenced(room_code)
+        if batch is not None:
+            pids = list(deltas)
+            if not pids:
+                return {}
+            for pid in pids:
+                batch.incr_player_points(pid, deltas[pid])
+            totals = await batch.execute()
+            return {pid: total for pid, total in zip(pids, totals) if total is not None}
+        return await self._players_bulk(room_code, {}, points=deltas)
 
     async def get_player(self, room_code: str, pid: str) -> Optional[PlayerStore]:
-        rk = RK(room_code)
-        raw = await self.r.hget(rk.players(), pid)
-        if not raw:
-            return None
-        return PlayerStore.model_validate_json(self._dec(raw))
+        async def load() -> Optional[PlayerStore]:
+            values = await self.r.hmget(RK(room_code).players(), self._player_fields(pid))
+            return self._parse_player(values)
+
+        return await self._memo(room_code, ("player", pid), load)
 
     async def list_players(self, room_code: str) -> list[PlayerStore]:
         rk = RK(room_code)
         data = await self.r.hgetall(rk.players())
-        players: list[PlayerStore] = []
-        for _, raw in data.items():
-            players.append(PlayerStore.model_validate_json(self._dec(raw)))
+        players = self._parse_players(data)
         # stable order: joined_at
         players.sort(key=lambda x: x.joined_at)
         return players
@@ -163,6 +695,7 @@ return {1, new_val}
     # Roles / teams
     # ----------------------------
     async def set_roles(self, room_code: str, roles: dict[str, str]) -> None:
+        self._ttl_dirty(room_code)
         # roles: {"gm": pid, "drawer": pid} OR {"drawerA": pidA, "drawerB": pidB}
         rk = RK(room_code)
         if not roles:
@@ -182,6 +715,7 @@ return {1, new_val}
         *,
         gm_pid: Optional[str] = None,
     ) -> None:
+        self._ttl_dirty(room_code)
         if gm_pid and pid == gm_pid:
             await self.clear_team(room_code, pid)
             return
@@ -205,6 +739,15 @@ return {1, new_val}
         await self.update_player_fields(room_code, pid, team=None)
 
 
+    async def clear_team_bulk(self, room_code: str, pids: Iterable[str]) -> None:
+        """clear_team for many players: team sets + player.team in one round-trip."""
+        rk = RK(room_code)
+        await self._players_bulk(
+            room_code,
+            {pid: {"team": None} for pid in pids},
+            remove_from=(rk.team("A"), rk.team("B")),
+        )
+
     async def get_team_members(self, room_code: str, team: Literal["A", "B"]) -> set[str]:
         members = await self.r.smembers(RK(room_code).team(team))
         return {self._dec(x) for x in members}
@@ -217,59 +760,116 @@ return {1, new_val}
     # Round config & live game
     # ----------------------------
     async def set_round_config(self, room_code: str, cfg: dict[str, Any]) -> None:
+        self._ttl_dirty(room_code)
         # store as hash strings
         rk = RK(room_code)
-        mapping = {k: json.dumps(v) if isinstance(v, (dict, list)) else str(v) for k, v in cfg.items()}
-        await self.r.hset(rk.round_config(), mapping=mapping)
+        await self.r.hset(rk.round_config(), mapping=_hash_mapping(cfg))
+        self._ctx_dirty(room_code, "round_config")
 
     async def get_round_config(self, room_code: str) -> dict[str, Any]:
-        rk = RK(room_code)
-        data = await self.r.hgetall(rk.round_config())
-        out: dict[str, Any] = {}
-        for k, v in data.items():
-            ks = self._dec(k)
-            vs = self._dec(v)
-            # best-effort json parse
-            try:
-                out[ks] = json.loads(vs)
-            except Exception:
-                out[ks] = vs
-        return out
+        async def load() -> dict[str, Any]:
+            return self._parse_json_hash(await self.r.hgetall(RK(room_code).round_config()))
+
+        return await self._memo(room_code, "round_config", load)
 
     async def set_game_fields(self, room_code: str, **fields: Any) -> None:
+        batch = self._fenced(room_code)
+        if batch is not None:
+            await batch.set_game_fields(**fields).execute()
+            return
+        self._ttl_dirty(room_code)
         rk = RK(room_code)
-        mapping = {k: json.dumps(v) if isinstance(v, (dict, list)) else str(v) for k, v in fields.items()}
-        await self.r.hset(rk.game(), mapping=mapping)
+        await self.r.hset(rk.game(), mapping=_hash_mapping(fields))
+        self._ctx_dirty(room_code, "game")
 
     async def get_game(self, room_code: str) -> dict[str, Any]:
-        rk = RK(room_code)
-        data = await self.r.hgetall(rk.game())
-        out: dict[str, Any] = {}
-        for k, v in data.items():
-            ks = self._dec(k)
-            vs = self._dec(v)
-            try:
-                out[ks] = json.loads(vs)
-            except Exception:
-                out[ks] = vs
-        return out
+        async def load() -> dict[str, Any]:
+            return self._parse_json_hash(await self.r.hgetall(RK(room_code).game()))
+
+        return await self._memo(room_code, "game", load)
 
     # ----------------------------
     # Ops log (replay) Stroke
     # ----------------------------
-    async def append_op_single(self, room_code: str, op: DrawOp, max_ops: int = 5000) -> None:
+    async def append_op_single(self, room_code: str, op: DrawOp, max_ops: int = 5000) -> int:
+        """Append an op; returns its seq (also set on op.seq)."""
+        batch = self._fenced(room_code)
+        if batch is not None:
+            op.seq = int((await batch.append_op_single(op, max_ops).execute())[0])
+            return op.seq
+        self._ttl_dirty(room_code)
         rk = RK(room_code)
-        pipe = self.r.pipeline()
-        pipe.rpush(rk.ops(), op.model_dump_json())
-        pipe.ltrim(rk.ops(), -max_ops, -1)
-        await pipe.execute()
+        seq = await self.scripts.call(
+            "append_op", keys=[rk.ops(), rk.ops_seq()], args=[SINGLE_CANVAS, _op_json(op), str(max_ops)]
+        )
+        op.seq = int(seq)
+        await self._maybe_checkpoint(room_code, SINGLE_CANVAS, op.seq)
+        return op.seq
 
-    async def append_op_vs(self, room_code: str, team: Literal["A", "B"], op: DrawOp, max_ops: int = 5000) -> None:
+    async def append_op_vs(self, room_code: str, team: Literal["A", "B"], op: DrawOp, max_ops: int = 5000) -> int:
+        """Append an op to a team canvas; returns its seq (also set on op.seq)."""
+        batch = self._fenced(room_code)
+        if batch is not None:
+            op.seq = int((await batch.append_op_vs(team, op, max_ops).execute())[0])
+            return op.seq
+        self._ttl_dirty(room_code)
         rk = RK(room_code)
-        pipe = self.r.pipeline()
-        pipe.rpush(rk.ops_team(team), op.model_dump_json())
-        pipe.ltrim(rk.ops_team(team), -max_ops, -1)
-        await pipe.execute()
+        seq = await self.scripts.call(
+            "append_op", keys=[rk.ops_team(team), rk.ops_seq()], args=[team, _op_json(op), str(max_ops)]
+        )
+        op.seq = int(seq)
+        await self._maybe_checkpoint(room_code, team, op.seq)
+        return op.seq
+
+    async def checkpoint_ops(self, room_code: str, canvas: str, keep: Optional[int] = None) -> tuple[int, int]:
+        """
+        Fold all but the newest `keep` ops of a canvas into its checkpoint, with
+        clear/undo applied, so a full replay is bounded by what is on the
+        canvas, not by game length. Only the folded ops are read (plus the
+        checkpoint tail an undo reaches back into), and the checkpoint keeps
+        at most ops_checkpoint_max ops. Returns (ops folded, checkpoint length).
+        """
+        rk = RK(room_code)
+        ops_key = rk.ops() if canvas == SINGLE_CANVAS else rk.ops_team(canvas)
+        keep = self.ops_checkpoint_keep if keep is None else keep
+        res = await self.scripts.call(
+            "ops_checkpoint",
+            keys=[ops_key, rk.ops_checkpoint(canvas)],
+            args=[str(max(0, int(keep))), str(max(0, int(self.ops_checkpoint_max)))],
+        )
+        return int(res[0]), int(res[1])
+
+    async def _maybe_checkpoint(self, room_code: str, canvas: str, seq: int) -> None:
+        every = self.ops_checkpoint_every
+        if every > 0 and seq > 0 and seq % every == 0:
+            await self.checkpoint_ops(room_code, canvas)
+
+    async def get_ops_tail(
+        self,
+        room_code: str,
+        canvas: str,
+        since_seq: Optional[int] = None,
+        *,
+        raw: bool = False,
+    ) -> OpsTail:
+        """
+        Ops for one canvas ("main" for SINGLE, "A"/"B" for VS) after since_seq.
+        Falls back to the whole canvas (mode="full": checkpoint + list) when
+        since_seq is None or the tail was checkpointed/trimmed/cleared; one
+        atomic round-trip either way.
+        raw=True: ops are the stored JSON strings, not decoded into DrawOp.
+        """
+        rk = RK(room_code)
+        ops_key = rk.ops() if canvas == SINGLE_CANVAS else rk.ops_team(canvas)
+        since = -1 if since_seq is None else int(since_seq)
+        res = await self.scripts.call(
+            "ops_tail", keys=[ops_key, rk.ops_seq(), rk.ops_checkpoint(canvas)], args=[canvas, str(since)]
+        )
+        if raw:
+            ops = [self._dec(x) for x in res[2:]]
+        else:
+            ops = [DrawOp.model_validate_json(self._dec(x)) for x in res[2:]]
+        return OpsTail(canvas=canvas, mode=self._dec(res[0]), seq=int(res[1]), ops=ops)
 
     async def get_ops_single(self, room_code: str, start: int = 0, end: int = -1) -> list[DrawOp]:
         raw = await self.r.lrange(RK(room_code).ops(), start, end)
@@ -281,15 +881,23 @@ return {1, new_val}
 
     async def clear_ops(self, room_code: str, mode: Mode) -> None:
         rk = RK(room_code)
+        # Skip one seq per cleared canvas so every older cursor gets a full resync.
+        pipe = self.r.pipeline()
         if mode == "VS":
-            await self.r.delete(rk.ops_team("A"), rk.ops_team("B"))
+            pipe.delete(rk.ops_team("A"), rk.ops_team("B"), rk.ops_checkpoint("A"), rk.ops_checkpoint("B"))
+            pipe.hincrby(rk.ops_seq(), "A", 1)
+            pipe.hincrby(rk.ops_seq(), "B", 1)
         else:
-            await self.r.delete(rk.ops())
+            pipe.delete(rk.ops(), rk.ops_checkpoint(SINGLE_CANVAS))
+            pipe.hincrby(rk.ops_seq(), SINGLE_CANVAS, 1)
+        await pipe.execute()
+        self._ttl_dirty(room_code)
 
     # ----------------------------
     # Moderation log
     # ----------------------------
     async def append_modlog(self, room_code: str, entry: ModLogEntry, max_entries: int = 50) -> None:
+        self._ttl_dirty(room_code)
         rk = RK(room_code)
         pipe = self.r.pipeline()
         pipe.rpush(rk.modlog(), entry.model_dump_json())
@@ -304,29 +912,119 @@ return {1, new_val}
     # Budget helpers
     # ----------------------------
     async def set_budget_fields(self, room_code: str, **fields: Any) -> None:
+        batch = self._fenced(room_code)
+        if batch is not None:
+            await batch.set_budget_fields(**fields).execute()
+            return
+        self._ttl_dirty(room_code)
         rk = RK(room_code)
         mapping = {k: str(v) for k, v in fields.items()}
         await self.r.hset(rk.budget(), mapping=mapping)
+        self._ctx_dirty(room_code, "budget")
 
     async def get_budget(self, room_code: str) -> dict[str, int]:
-        rk = RK(room_code)
-        data = await self.r.hgetall(rk.budget())
-        out: dict[str, int] = {}
-        for k, v in data.items():
-            out[self._dec(k)] = int(self._dec(v))
-        return out
+        async def load() -> dict[str, int]:
+            return self._parse_budget(await self.r.hgetall(RK(room_code).budget()))
+
+        return await self._memo(room_code, "budget", load)
 
     async def consume_vs_stroke(self, room_code: str, team: Literal["A", "B"], cost: int = 1) -> tuple[bool, int]:
+        batch = self._fenced(room_code)
+        if batch is not None:
+            return (await batch.consume_vs_stroke(team, cost).execute())[0]
         rk = RK(room_code)
-        res = await self.r.eval(self._LUA_CONSUME_STROKE, 1, rk.budget(), team, str(cost))
+        res = await self.scripts.call("consume_stroke", keys=[rk.budget()], args=[team, str(cost)])
+        self._ctx_dirty(room_code, "budget")
         ok = bool(int(res[0]))
         remaining = int(res[1])
         return ok, remaining
 
+    async def commit_stroke(
+        self,
+        room_code: str,
+        mode: Mode,
+        *,
+        pid: str,
+        ts: int,
+        op: Optional[DrawOp],
+        team: Optional[Literal["A", "B"]] = None,
+        cost: int = 1,
+        max_ops: int = 5000,
+        fence: Optional[RoomLockHandle] = None,
+    ) -> StrokeCommit:
+        """
+        Validate and persist one stroke in a single atomic round-trip:
+        state/phase/deadline (+ drawer for SINGLE) check, budget charge,
+        op append + trim, last_activity bump and TTL refresh.
+        op=None only charges the budget (e.g. an auto-split stroke).
+        VS charges the team budget hash; SINGLE charges game.strokes_left.
+        fence (default: the room lock this task holds) raises StaleLockError
+        instead of writing when a newer holder of that lock already wrote.
+        """
+        rk = RK(room_code)
+        fence = fence if fence is not None else current_fence(room_code)
+        if fence is not None and not fence.distributed:
+            fence = None
+        if mode == "VS":
+            if team is None:
+                raise ValueError("team is required for VS strokes")
+            counter_key, counter_field = rk.budget(), team
+            ops_key = rk.ops_team(team)
+            phases, deadline_field, drawer_field, report = "DRAW", "draw_end_at", "", "A B"
+        else:
+            counter_key, counter_field = rk.game(), "strokes_left"
+            ops_key = rk.ops()
+            # GUESS kept for in-flight legacy rooms (see handle_single_draw_op)
+            phases, deadline_field, drawer_field, report = "DRAW GUESS", "game_end_at", "drawer_pid", ""
+
+        head = [rk.room(), rk.game(), counter_key, ops_key, rk.ops_seq(), rk.lock_fence()]
+        keys = head + [k for k in rk.all_room_keys(mode=mode) if k not in head]
+        args = [
+            phases,
+            deadline_field,
+            str(ts),
+            counter_field,
+            str(cost),
+            drawer_field,
+            pid,
+            _op_json(op) if op is not None else "",
+            str(max_ops),
+            str(self.room_ttl_sec),
+            report,
+            team if mode == "VS" else SINGLE_CANVAS,
+            fence.scope if fence is not None else "",
+            str(fence.token) if fence is not None else "0",
+        ]
+        res = await self.scripts.call("commit_stroke", keys=keys, args=args)
+        self._ctx_dirty(room_code, "header", "game", "budget")
+        code = self._dec(res[0])
+        if code == "STALE_LOCK":
+            raise StaleLockError(f"room lock {room_code}/{fence.scope} token {fence.token} is older than {int(res[1])}")
+        if code == "OK":
+            self._mark_ttl_refreshed(room_code, mode)
+
+        if code != "OK":
+            return StrokeCommit(ok=False, code=code, remaining=int(res[1]))
+
+        reported = [self._dec(x) for x in res[4:]]
+        budget = {reported[i]: int(reported[i + 1]) for i in range(0, len(reported) - 1, 2)}
+        seq = int(res[3])
+        if op is not None:
+            op.seq = seq
+            await self._maybe_checkpoint(room_code, counter_field if mode == "VS" else SINGLE_CANVAS, seq)
+        return StrokeCommit(
+            ok=True,
+            remaining=int(res[1]),
+            budget=budget,
+            transition=bool(int(res[2])),
+            seq=seq,
+        )
+
     # ----------------------------
     # Voting
     # ----------------------------
     async def vote_next_add(self, room_code: str, pid: str) -> int:
+        self._ttl_dirty(room_code)
         # returns current vote count
         rk = RK(room_code)
         await self.r.sadd(rk.votes_next(), pid)
@@ -340,3 +1038,25 @@ return {1, new_val}
 
     async def vote_next_clear(self, room_code: str) -> None:
         await self.r.delete(RK(room_code).votes_next())
+
+    # ----------------------------
+    # Room ownership (affinity)
+    # ----------------------------
+    async def heartbeat_worker(self, node_id: str, ttl_ms: int) -> list[str]:
+        """Mark node_id alive for ttl_ms; returns all live node ids."""
+        now_ms = int(time.time() * 1000)
+        res = await self.scripts.call("worker_heartbeat", keys=[WORKERS_KEY], args=[node_id, str(now_ms), str(int(ttl_ms))])
+        return sorted(self._dec(x) for x in res or [])
+
+    async def get_room_owner(self, room_code: str) -> Optional[str]:
+        raw = await self.r.get(RK(room_code).owner())
+        return self._dec(raw) if raw is not None else None
+
+    async def acquire_room_lease(self, room_code: str, node_id: str, ttl_ms: int) -> str:
+        """Take (if free) or renew the room's ownership lease; returns the holder (node_id on success)."""
+        res = await self.scripts.call(
+            "lease_acquire",
+            keys=[RK(room_code).owner()],
+            args=[node_id, str(int(ttl_ms))],
+        )
+        return self._dec(res)
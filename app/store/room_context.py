@@ -0,0 +1,113 @@
+# app/store/room_context.py
+from __future__ import annotations
+
+import asyncio
+import copy
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterator, Optional
+
+# Sentinel for "not memoized" (None is a valid value: missing player, room, ...)
+MISSING: Any = object()
+
+_current: ContextVar[Optional["RoomContext"]] = ContextVar("room_context", default=None)
+
+
+def _copy(value: Any) -> Any:
+    if value is None:
+        return None
+    if hasattr(value, "model_copy"):
+        return value.model_copy(deep=True)
+    return copy.deepcopy(value)
+
+
+class RoomContext:
+    """
+    Room state read while handling one client message (RedisRepo.room_context()).
+    - header / player(pid) / game / budget / round_config load on first use
+      and are memoized; the RedisRepo getters go through the active context,
+      so handlers share the reads without any signature change
+    - every repo write to the room drops the parts it touched; taking a room
+      lock drops everything (state read before the lock may be stale in it)
+    - only the task that opened it reads from it: tasks a handler spawns
+      (timers) inherit the ContextVar but go to Redis
+    Callers always get copies, so mutating a result never leaks into the memo.
+    """
+
+    def __init__(self, repo: Any, room_code: str, pid: Optional[str] = None) -> None:
+        self.repo = repo
+        self.room_code = room_code
+        self.pid = pid
+        self._task = asyncio.current_task()
+        # "header" | "game" | "budget" | "round_config" | ("player", pid) -> value
+        self._values: Dict[Hashable, Any] = {}
+        self.hits = 0
+        self.loads = 0
+
+    def active_for(self, repo: Any, room_code: str) -> bool:
+        return repo is self.repo and room_code == self.room_code and asyncio.current_task() is self._task
+
+    def peek(self, key: Hashable) -> Any:
+        value = self._values.get(key, MISSING)
+        if value is MISSING:
+            return MISSING
+        self.hits += 1
+        return _copy(value)
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._values[key] = _copy(value)
+
+    async def memo(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        value = self.peek(key)
+        if value is not MISSING:
+            return value
+        value = await load()
+        self.loads += 1
+        self.put(key, value)
+        return value
+
+    def invalidate(self, *parts: Hashable) -> None:
+        """Drop the given parts ("player" drops every player); no parts drops all."""
+        if not parts:
+            self._values.clear()
+            return
+        for part in parts:
+            if part == "player":
+                for key in [k for k in self._values if isinstance(k, tuple) and k[0] == "player"]:
+                    del self._values[key]
+            else:
+                self._values.pop(part, None)
+
+    # ---- lazy accessors ----
+
+    async def header(self):
+        return await self.repo.get_room_header(self.room_code)
+
+    async def player(self, pid: Optional[str] = None):
+        pid = pid or self.pid
+        if not pid:
+            return None
+        return await self.repo.get_player(self.room_code, pid)
+
+    async def game(self) -> Dict[str, Any]:
+        return await self.repo.get_game(self.room_code)
+
+    async def budget(self) -> Dict[str, int]:
+        return await self.repo.get_budget(self.room_code)
+
+    async def round_config(self) -> Dict[str, Any]:
+        return await self.repo.get_round_config(self.room_code)
+
+
+def current_room_context() -> Optional[RoomContext]:
+    """The RoomContext of the message being handled, if any."""
+    return _current.get()
+
+
+@contextmanager
+def activate(ctx: RoomContext) -> Iterator[RoomContext]:
+    token = _current.set(ctx)
+    try:
+        yield ctx
+    finally:
+        _current.reset(token)
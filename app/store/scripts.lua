@@ -0,0 +1,484 @@
+-- app/store/scripts.lua
+-- Lua scripts used by RedisRepo, loaded by app/store/scripts.py.
+-- Each script starts with a "-- @script <name>" line and runs until the next one.
+
+-- @script consume_stroke
+-- KEYS: budget hash
+-- ARGV: team, cost
+-- Returns {ok(0|1), remaining}
+local budget_key = KEYS[1]
+local team = ARGV[1]
+local cost = tonumber(ARGV[2]) or 1
+
+local cur = redis.call("HGET", budget_key, team)
+if not cur then
+  cur = 0
+else
+  cur = tonumber(cur) or 0
+end
+
+if cur < cost then
+  return {0, cur}
+end
+
+local new_val = redis.call("HINCRBY", budget_key, team, -cost)
+return {1, new_val}
+
+-- @script commit_stroke
+-- One stroke, validated and written atomically.
+-- KEYS: room, game, counter hash, ops list, ops seq hash, lock fence hash,
+--       then any other keys sharing the room TTL
+-- ARGV: phases, deadline_field, now, counter_field, cost, drawer_field, pid,
+--       op_json ("" = charge only; stored with "seq" spliced in), max_ops, ttl,
+--       report_fields, canvas, fence_scope ("" = not under a room lock), fence_token
+-- Returns {code, remaining, exhausted, seq, field1, val1, ...}
+-- ("STALE_LOCK" when a newer holder of the fence_scope lock already wrote)
+local room_key = KEYS[1]
+local game_key = KEYS[2]
+local counter_key = KEYS[3]
+local ops_key = KEYS[4]
+local seq_key = KEYS[5]
+local phases = ARGV[1]
+local deadline_field = ARGV[2]
+local now = tonumber(ARGV[3]) or 0
+local counter_field = ARGV[4]
+local cost = tonumber(ARGV[5]) or 1
+local drawer_field = ARGV[6]
+local pid = ARGV[7]
+local op_json = ARGV[8]
+local max_ops = tonumber(ARGV[9]) or 5000
+local ttl = tonumber(ARGV[10]) or 0
+local report = ARGV[11]
+local canvas = ARGV[12]
+local fence_scope = ARGV[13] or ""
+local fence_token = tonumber(ARGV[14]) or 0
+
+if fence_scope ~= "" then
+  local newest = tonumber(redis.call("HGET", KEYS[6], fence_scope) or "0") or 0
+  if fence_token < newest then
+    return {"STALE_LOCK", newest, 0}
+  end
+  redis.call("HSET", KEYS[6], fence_scope, fence_token)
+end
+
+if redis.call("HGET", room_key, "state") ~= "IN_GAME" then
+  return {"BAD_STATE", 0, 0}
+end
+
+local phase = redis.call("HGET", game_key, "phase") or ""
+if not string.find(" " .. phases .. " ", " " .. phase .. " ", 1, true) then
+  return {"BAD_PHASE", 0, 0}
+end
+
+if deadline_field ~= "" then
+  local deadline = tonumber(redis.call("HGET", game_key, deadline_field) or "0") or 0
+  if deadline > 0 and now >= deadline then
+    return {"EXPIRED", 0, 0}
+  end
+end
+
+if drawer_field ~= "" and (redis.call("HGET", game_key, drawer_field) or "") ~= pid then
+  return {"NOT_DRAWER", 0, 0}
+end
+
+local cur = tonumber(redis.call("HGET", counter_key, counter_field) or "0") or 0
+if cur < cost then
+  return {"NO_BUDGET", cur, 0}
+end
+
+local remaining = cur
+if cost > 0 then
+  remaining = redis.call("HINCRBY", counter_key, counter_field, -cost)
+end
+
+local seq = 0
+if op_json ~= "" then
+  seq = redis.call("HINCRBY", seq_key, canvas, 1)
+  redis.call("RPUSH", ops_key, '{"seq":' .. seq .. ',' .. string.sub(op_json, 2))
+  redis.call("LTRIM", ops_key, -max_ops, -1)
+end
+
+redis.call("HSET", room_key, "last_activity", ARGV[3])
+if ttl > 0 then
+  for i = 1, #KEYS do
+    redis.call("EXPIRE", KEYS[i], ttl)
+  end
+end
+
+local out = {"OK", remaining, 0, seq}
+local exhausted = report ~= ""
+for f in string.gmatch(report, "%S+") do
+  local v = redis.call("HGET", counter_key, f)
+  if v then
+    v = tonumber(v) or 0
+    table.insert(out, f)
+    table.insert(out, v)
+    if v > 0 then
+      exhausted = false
+    end
+  else
+    exhausted = false
+  end
+end
+if exhausted then
+  out[3] = 1
+end
+return out
+
+-- @script fenced_batch
+-- Room writes made under a room lock, applied only while the lock's token is
+-- the newest one of its scope that wrote (fencing: a holder whose lease ran
+-- out cannot overwrite what the next holder wrote).
+-- KEYS: lock fence hash, then every key the commands touch
+-- ARGV: scope, token, then per command: name, argc, arg1 .. argN
+--   name is a Redis command, or
+--   APPEND_OP      ops list, ops seq hash, canvas, op_json, max_ops (as append_op)
+--   PLAYER_POINTS  players hash, pid, delta (new total; nil if no such player)
+--   CONSUME_STROKE budget hash, team, cost (as consume_stroke)
+-- Returns {1, result1, result2, ...}, or {0, newest token} when the token is stale
+local newest = tonumber(redis.call("HGET", KEYS[1], ARGV[1]) or "0") or 0
+local token = tonumber(ARGV[2]) or 0
+if token < newest then
+  return {0, newest}
+end
+redis.call("HSET", KEYS[1], ARGV[1], token)
+
+local out = {1}
+local i = 3
+while i <= #ARGV do
+  local name = ARGV[i]
+  local argc = tonumber(ARGV[i + 1]) or 0
+  local a = {unpack(ARGV, i + 2, i + 1 + argc)}
+  local res
+  if name == "APPEND_OP" then
+    res = redis.call("HINCRBY", a[2], a[3], 1)
+    redis.call("RPUSH", a[1], '{"seq":' .. res .. ',' .. string.sub(a[4], 2))
+    redis.call("LTRIM", a[1], -(tonumber(a[5]) or 5000), -1)
+  elseif name == "PLAYER_POINTS" then
+    if redis.call("HEXISTS", a[1], a[2] .. ":pid") == 0 then
+      local blob = redis.call("HGET", a[1], a[2])
+      if blob then
+        for f, v in pairs(cjson.decode(blob)) do
+          redis.call("HSET", a[1], a[2] .. ":" .. f, cjson.encode(v))
+        end
+        redis.call("HDEL", a[1], a[2])
+      end
+    end
+    res = false
+    if redis.call("HEXISTS", a[1], a[2] .. ":pid") == 1 then
+      res = redis.call("HINCRBY", a[1], a[2] .. ":points", tonumber(a[3]) or 0)
+    end
+  elseif name == "CONSUME_STROKE" then
+    local cur = tonumber(redis.call("HGET", a[1], a[2]) or "0") or 0
+    local cost = tonumber(a[3]) or 1
+    if cur < cost then
+      res = {0, cur}
+    else
+      res = {1, redis.call("HINCRBY", a[1], a[2], -cost)}
+    end
+  else
+    res = redis.call(name, unpack(a))
+  end
+  out[#out + 1] = res
+  i = i + 2 + argc
+end
+return out
+
+-- @script expire_keys
+-- KEYS: every key that shares the room TTL
+-- ARGV: ttl seconds
+-- Returns number of keys that exist (and got the TTL)
+local ttl = tonumber(ARGV[1]) or 0
+local n = 0
+for i = 1, #KEYS do
+  n = n + redis.call("EXPIRE", KEYS[i], ttl)
+end
+return n
+
+-- @script rename_keys
+-- Move legacy keys to their new names without clobbering newer data.
+-- KEYS: src1, dst1, src2, dst2, ...
+-- Returns number of keys moved
+local moved = 0
+for i = 1, #KEYS, 2 do
+  local src = KEYS[i]
+  local dst = KEYS[i + 1]
+  if redis.call("EXISTS", src) == 1 and redis.call("EXISTS", dst) == 0 then
+    redis.call("RENAME", src, dst)
+    moved = moved + 1
+  end
+end
+return moved
+
+-- @script player_update
+-- Per-field player update in the packed players hash ("<pid>:<field>" -> JSON value).
+-- A legacy JSON blob stored under "<pid>" is unpacked first.
+-- KEYS: players hash, active set
+-- ARGV: pid, active_op ("add" | "rem" | ""), incr_field ("" = none), incr_by,
+--       field1, json1, field2, json2, ...
+-- Returns {0} if the player does not exist, else {1, incremented value or 0}
+local key = KEYS[1]
+local pid = ARGV[1]
+local active_op = ARGV[2]
+local incr_field = ARGV[3]
+
+if redis.call("HEXISTS", key, pid .. ":pid") == 0 then
+  local blob = redis.call("HGET", key, pid)
+  if not blob then
+    return {0}
+  end
+  local p = cjson.decode(blob)
+  for f, v in pairs(p) do
+    redis.call("HSET", key, pid .. ":" .. f, cjson.encode(v))
+  end
+  redis.call("HDEL", key, pid)
+end
+
+for i = 5, #ARGV, 2 do
+  redis.call("HSET", key, pid .. ":" .. ARGV[i], ARGV[i + 1])
+end
+
+local value = 0
+if incr_field ~= "" then
+  value = redis.call("HINCRBY", key, pid .. ":" .. incr_field, tonumber(ARGV[4]) or 0)
+end
+
+if active_op == "add" then
+  redis.call("SADD", KEYS[2], pid)
+elseif active_op == "rem" then
+  redis.call("SREM", KEYS[2], pid)
+end
+return {1, value}
+
+-- @script players_update_bulk
+-- player_update for many players in one call.
+-- KEYS: players hash, then sets every listed pid is removed from (e.g. team sets)
+-- ARGV: groups of pid, n_fields, points_delta, field1, json1, ... fieldN, jsonN
+-- Returns {pid1, points1, pid2, points2, ...} for players that exist
+-- (points is the new total when points_delta ~= 0, else 0)
+local key = KEYS[1]
+
+local function ensure_packed(pid)
+  if redis.call("HEXISTS", key, pid .. ":pid") == 1 then
+    return true
+  end
+  local blob = redis.call("HGET", key, pid)
+  if not blob then
+    return false
+  end
+  local p = cjson.decode(blob)
+  for f, v in pairs(p) do
+    redis.call("HSET", key, pid .. ":" .. f, cjson.encode(v))
+  end
+  redis.call("HDEL", key, pid)
+  return true
+end
+
+local out = {}
+local i = 1
+while i <= #ARGV do
+  local pid = ARGV[i]
+  local n = tonumber(ARGV[i + 1]) or 0
+  local delta = tonumber(ARGV[i + 2]) or 0
+  local base = i + 3
+  if ensure_packed(pid) then
+    for j = 0, n - 1 do
+      redis.call("HSET", key, pid .. ":" .. ARGV[base + 2 * j], ARGV[base + 2 * j + 1])
+    end
+    local points = 0
+    if delta ~= 0 then
+      points = redis.call("HINCRBY", key, pid .. ":points", delta)
+    end
+    table.insert(out, pid)
+    table.insert(out, points)
+  end
+  for k = 2, #KEYS do
+    redis.call("SREM", KEYS[k], pid)
+  end
+  i = base + 2 * n
+end
+return out
+
+-- @script append_op
+-- Append one op with the next per-canvas sequence number.
+-- KEYS: ops list, ops seq hash
+-- ARGV: canvas, op_json (without "seq"), max_ops
+-- Returns the op's seq
+local seq = redis.call("HINCRBY", KEYS[2], ARGV[1], 1)
+redis.call("RPUSH", KEYS[1], '{"seq":' .. seq .. ',' .. string.sub(ARGV[2], 2))
+redis.call("LTRIM", KEYS[1], -(tonumber(ARGV[3]) or 5000), -1)
+return seq
+
+-- @script ops_tail
+-- Ops after a client's cursor, or the whole canvas when the cursor cannot be served.
+-- Stored seqs are contiguous (appends +1, trims/checkpoints drop the head, clears
+-- drop all), so the list holds seqs (last - LLEN + 1) .. last.
+-- The whole canvas is the checkpoint followed by the list.
+-- KEYS: ops list, ops seq hash, checkpoint list
+-- ARGV: canvas, since_seq (-1 = full)
+-- Returns {"full" | "delta", last_seq, op1, op2, ...}
+local last = tonumber(redis.call("HGET", KEYS[2], ARGV[1]) or "0") or 0
+local since = tonumber(ARGV[2]) or -1
+local n = redis.call("LLEN", KEYS[1])
+
+local out
+if since < 0 or since > last or last < n or (last - since) > n then
+  out = {"full", last}
+  for _, op in ipairs(redis.call("LRANGE", KEYS[3], 0, -1)) do
+    table.insert(out, op)
+  end
+  for _, op in ipairs(redis.call("LRANGE", KEYS[1], 0, -1)) do
+    table.insert(out, op)
+  end
+  return out
+end
+
+out = {"delta", last}
+if since < last then
+  for _, op in ipairs(redis.call("LRANGE", KEYS[1], -(last - since), -1)) do
+    table.insert(out, op)
+  end
+end
+return out
+
+-- @script ops_checkpoint
+-- Fold the head of an ops list into the canvas checkpoint, keeping the newest ops.
+-- The checkpoint holds only ops that still show: a "clear" drops everything
+-- before it (itself included), an "undo" drops the latest remaining op of the
+-- same author ("by") and itself. Only the folded head is read: plain ops are
+-- appended, an undo searches back from the tail (chunk by chunk) and removes
+-- its target in place, and only a clear deletes the checkpoint. Kept ops are
+-- moved as stored, not re-encoded. Past max_len the oldest ops are trimmed.
+-- KEYS: ops list, checkpoint list
+-- ARGV: keep (ops left in the list), max_len (0 = unbounded)
+-- Returns {folded, checkpoint length}
+local keep = tonumber(ARGV[1]) or 0
+local max_len = tonumber(ARGV[2]) or 0
+local n = redis.call("LLEN", KEYS[1])
+if n <= keep then
+  return {0, redis.call("LLEN", KEYS[2])}
+end
+local fold = n - keep
+local CHUNK = 256
+local GONE = "\0undone"
+
+local function author(raw)
+  local ok, op = pcall(cjson.decode, raw)
+  if not ok or type(op) ~= "table" then
+    return "", nil
+  end
+  return type(op.by) == "string" and op.by or "", op.t
+end
+
+-- ops of this fold not yet pushed (an undo may hit them before they land)
+local pending, authors = {}, {}
+
+local function undo_in_checkpoint(by)
+  local len = redis.call("LLEN", KEYS[2])
+  local stop = len - 1
+  while stop >= 0 do
+    local start = math.max(0, stop - CHUNK + 1)
+    local chunk = redis.call("LRANGE", KEYS[2], start, stop)
+    for i = #chunk, 1, -1 do
+      if author(chunk[i]) == by then
+        redis.call("LSET", KEYS[2], start + i - 1, GONE)
+        redis.call("LREM", KEYS[2], -1, GONE)
+        return
+      end
+    end
+    stop = start - 1
+  end
+end
+
+for _, raw in ipairs(redis.call("LRANGE", KEYS[1], 0, fold - 1)) do
+  local by, t = author(raw)
+  if t == "clear" then
+    pending, authors = {}, {}
+    redis.call("DEL", KEYS[2])
+  elseif t == "undo" then
+    local hit = false
+    for i = #pending, 1, -1 do
+      if authors[i] == by then
+        table.remove(pending, i)
+        table.remove(authors, i)
+        hit = true
+        break
+      end
+    end
+    if not hit then
+      undo_in_checkpoint(by)
+    end
+  else
+    table.insert(pending, raw)
+    table.insert(authors, by)
+  end
+end
+
+for i = 1, #pending, 1000 do
+  redis.call("RPUSH", KEYS[2], unpack(pending, i, math.min(i + 999, #pending)))
+end
+if max_len > 0 then
+  redis.call("LTRIM", KEYS[2], -max_len, -1)
+end
+local len = redis.call("LLEN", KEYS[2])
+local ttl = redis.call("PTTL", KEYS[1])
+if ttl > 0 and len > 0 then
+  redis.call("PEXPIRE", KEYS[2], ttl)
+end
+redis.call("LTRIM", KEYS[1], fold, -1)
+return {fold, len}
+
+-- @script lease_acquire
+-- Take a free room ownership lease or renew our own; a held lease only
+-- changes hands once it expires.
+-- KEYS: lease key
+-- ARGV: node_id, ttl_ms
+-- Returns the holder after the call
+local holder = redis.call("GET", KEYS[1])
+if (not holder) or holder == ARGV[1] then
+  redis.call("SET", KEYS[1], ARGV[1], "PX", tonumber(ARGV[2]))
+  return ARGV[1]
+end
+return holder
+
+-- @script worker_heartbeat
+-- Register a worker as alive and list every live worker.
+-- KEYS: workers zset (member node_id, score = lease expiry ms)
+-- ARGV: node_id, now_ms, ttl_ms
+-- Returns live node ids
+local now = tonumber(ARGV[2])
+redis.call("ZADD", KEYS[1], now + tonumber(ARGV[3]), ARGV[1])
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", now)
+return redis.call("ZRANGE", KEYS[1], 0, -1)
+
+-- @script lock_acquire
+-- Take a room lock (SET NX PX) stamped with a new fencing token.
+-- KEYS: lock key, token counter
+-- ARGV: ttl_ms
+-- Returns the token, or 0 when someone else holds the lock
+if not redis.call("SET", KEYS[1], "0", "NX", "PX", tonumber(ARGV[1])) then
+  return 0
+end
+local token = redis.call("INCR", KEYS[2])
+redis.call("SET", KEYS[1], token, "PX", tonumber(ARGV[1]))
+return token
+
+-- @script lock_renew
+-- Extend a room lock's lease only if it still carries our token.
+-- KEYS: lock key
+-- ARGV: token, ttl_ms
+-- Returns 1 when renewed
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+  return redis.call("PEXPIRE", KEYS[1], tonumber(ARGV[2]))
+end
+return 0
+
+-- @script lock_release
+-- Release a room lock only if it still carries our token (lease may have expired).
+-- KEYS: lock key
+-- ARGV: token
+-- Returns 1 when released
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+  return redis.call("DEL", KEYS[1])
+end
+return 0
@@ -0,0 +1,109 @@
+# app/store/scripts.py
+from __future__ import annotations
+
+import hashlib
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from redis.asyncio import Redis
+from redis.exceptions import NoScriptError
+
+SCRIPTS_PATH = Path(__file__).with_name("scripts.lua")
+
+_SCRIPT_HEADER = re.compile(r"^--\s*@script\s+(\w+)\s*$", re.MULTILINE)
+
+
+def load_script_sources(path: Path = SCRIPTS_PATH) -> dict[str, str]:
+    """Split scripts.lua into {name: source} on "-- @script <name>" lines."""
+    text = path.read_text(encoding="utf-8")
+    matches = list(_SCRIPT_HEADER.finditer(text))
+    sources: dict[str, str] = {}
+    for i, m in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        sources[m.group(1)] = text[m.end():end].strip() + "\n"
+    return sources
+
+
+@dataclass
+class ScriptStats:
+    calls: int = 0
+    errors: int = 0
+    reloads: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        avg = self.total_ms / self.calls if self.calls else 0.0
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "reloads": self.reloads,
+            "avg_ms": round(avg, 3),
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
+class ScriptRegistry:
+    """
+    Named Lua scripts, called by SHA.
+    - load_all() runs SCRIPT LOAD for every script (app startup)
+    - call() uses EVALSHA; on NOSCRIPT (restart/failover) it re-loads once and retries
+    - per-script call/latency counters for /admin/scripts
+    New atomic operations: add a "-- @script <name>" section to scripts.lua.
+    """
+
+    def __init__(self, r: Redis, sources: Optional[dict[str, str]] = None) -> None:
+        self.r = r
+        self.sources = dict(sources if sources is not None else load_script_sources())
+        # SHA1 is deterministic, so calls work even before load_all()
+        self._sha = {name: hashlib.sha1(src.encode("utf-8")).hexdigest() for name, src in self.sources.items()}
+        self.stats = {name: ScriptStats() for name in self.sources}
+
+    def names(self) -> list[str]:
+        return sorted(self.sources)
+
+    def sha(self, name: str) -> str:
+        return self._sha[name]
+
+    async def load_all(self) -> None:
+        for name, src in self.sources.items():
+            sha = await self.r.script_load(src)
+            self._sha[name] = sha.decode("utf-8") if isinstance(sha, bytes) else str(sha)
+
+    async def call(self, name: str, keys: Iterable[Any] = (), args: Iterable[Any] = ()) -> Any:
+        if name not in self.sources:
+            raise KeyError(f"Unknown script: {name}")
+        keys = list(keys)
+        args = list(args)
+        stats = self.stats[name]
+        started = time.perf_counter()
+        try:
+            try:
+                return await self.r.evalsha(self._sha[name], len(keys), *keys, *args)
+            except NoScriptError:
+                stats.reloads += 1
+                sha = await self.r.script_load(self.sources[name])
+                self._sha[name] = sha.decode("utf-8") if isinstance(sha, bytes) else str(sha)
+                return await self.r.evalsha(self._sha[name], len(keys), *keys, *args)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000.0
+            stats.calls += 1
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+
+    def queue(self, pipe: Any, name: str, keys: Iterable[Any] = (), args: Iterable[Any] = ()) -> None:
+        """
+        Add a script call to a pipeline. Sent as EVAL (full body): a NOSCRIPT
+        in the middle of a non-transactional batch could not be retried safely.
+        """
+        keys = list(keys)
+        pipe.eval(self.sources[name], len(keys), *keys, *args)
+
+    def metrics(self) -> dict[str, dict[str, Any]]:
+        return {name: self.stats[name].as_dict() for name in self.names()}
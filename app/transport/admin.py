@@ -2,7 +2,8 @@ from __future__ import annotations
 
 from fastapi import APIRouter, HTTPException, Request
 
-from app.store.redis_keys import RK
+from app.store.redis_keys import RK, room_code_from_header_key
+from app.transport.dispatcher import dispatch_stats
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -15,18 +16,14 @@ async def list_rooms(request: Request):
     repo = request.app.state.repo
     r = request.app.state.redis
 
-    # Scan for room header keys: room:<code>
-    cursor = 0
+    # Scan for room header keys: room:{<code>} (or legacy room:<code>)
+    # scan_iter walks every node when r is a RedisCluster
     room_codes = []
-    while True:
-        cursor, keys = await r.scan(cursor=cursor, match="room:*", count=200)
-        for k in keys:
-            key = k.decode("utf-8") if isinstance(k, (bytes, bytearray)) else str(k)
-            # keep only room header keys: room:<code>
-            if key.count(":") == 1:
-                room_codes.append(key.split(":")[1])
-        if cursor == 0:
-            break
+    async for k in r.scan_iter(match="room:*", count=200):
+        key = k.decode("utf-8") if isinstance(k, (bytes, bytearray)) else str(k)
+        code = room_code_from_header_key(key)
+        if code:
+            room_codes.append(code)
 
     rooms = []
     for code in sorted(set(room_codes)):
@@ -52,6 +49,66 @@ async def list_rooms(request: Request):
     return {"rooms": rooms}
 
 
+@router.get("/scripts")
+async def script_stats(request: Request):
+    """
+    Lua script call counts and latency (debug/admin).
+    """
+    repo = request.app.state.repo
+    return {"scripts": repo.scripts.metrics()}
+
+
+@router.get("/locks")
+async def lock_stats(request: Request):
+    """
+    Live per-room lock count and lock timeouts (debug/admin).
+    """
+    repo = request.app.state.repo
+    return {"locks": repo.locks.metrics()}
+
+
+@router.get("/header-cache")
+async def header_cache_stats(request: Request):
+    """
+    Room header cache size and hit/miss counters (debug/admin).
+    """
+    repo = request.app.state.repo
+    return {"header_cache": repo.header_cache.metrics()}
+
+
+@router.get("/dispatch")
+async def dispatch_timings(request: Request):
+    """
+    Per message type count and handling time (debug/admin).
+    """
+    return {"types": dispatch_stats.metrics()}
+
+
+@router.get("/strokes")
+async def stroke_stats(request: Request):
+    """
+    Stroke simplification: points in/out and reduction ratio; open streamed
+    strokes; canvas rasterizer (debug/admin).
+    """
+    simplifier = getattr(request.app.state, "stroke_simplifier", None)
+    streams = getattr(request.app.state, "stroke_streams", None)
+    rasterizer = getattr(request.app.state, "rasterizer", None)
+    return {
+        "simplify": simplifier.metrics() if simplifier is not None else None,
+        "open_streams": len(streams) if streams is not None else None,
+        "raster": rasterizer.metrics() if rasterizer is not None else None,
+    }
+
+
+@router.get("/connections")
+async def connection_stats(request: Request):
+    """
+    Per-connection send queue depth and backpressure counters (debug/admin).
+    """
+    wsman = request.app.state.wsman
+    return {"rooms": wsman.metrics()}
+
+
 @router.post("/rooms/{room_code}/close")
 async def close_room(room_code: str, request: Request):
     """
@@ -59,7 +116,7 @@ async def close_room(room_code: str, request: Request):
     """
     repo = request.app.state.repo
     r = request.app.state.redis
-    wsman = request.app.state.wsman
+    fanout = request.app.state.fanout
 
     header = await repo.get_room_header(room_code)
     if header is None:
@@ -68,14 +125,12 @@ async def close_room(room_code: str, request: Request):
     rk = RK(room_code)
     keys = rk.all_room_keys(mode=header.mode)
     await r.delete(*keys)
+    repo.header_cache.invalidate(room_code)
+    rasterizer = getattr(request.app.state, "rasterizer", None)
+    if rasterizer is not None:
+        rasterizer.invalidate(room_code)
 
-    # Close all websockets in room if any
-    # wsman has no room close; use internal map
-    room = getattr(wsman, "_rooms", {}).get(room_code, {})
-    for pid in list(room.keys()):
-        try:
-            await wsman.close_pid(room_code, pid, code=4000, reason="admin_close")
-        except Exception:
-            pass
+    # Close all websockets in room, on every node
+    await fanout.close_pid(room_code, None, code=4000, reason="admin_close")
 
     return {"ok": True, "room_code": room_code}
@@ -0,0 +1,325 @@
+# app/transport/affinity.py
+from __future__ import annotations
+
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+from redis.asyncio import Redis
+
+from app.domain.lifecycle.handlers import handle_disconnect
+from app.store.redis_keys import worker_channel
+from app.transport.dispatcher import DispatchResult, _dump, dispatch_message
+from app.transport.protocols import OutError
+from app.util import jsonx
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent-hash ring of worker node ids (vnodes points per node).
+    Adding/removing a worker only moves the rooms that hashed to it.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 64) -> None:
+        self.vnodes = vnodes
+        self.nodes = sorted(set(nodes))
+        points = sorted((_hash(f"{n}#{i}"), n) for n in self.nodes for i in range(vnodes))
+        self._keys = [h for h, _ in points]
+        self._owners = [n for _, n in points]
+
+    def node_for(self, room_code: str) -> Optional[str]:
+        if not self._keys:
+            return None
+        i = bisect.bisect(self._keys, _hash(room_code)) % len(self._keys)
+        return self._owners[i]
+
+
+class RoomRouter:
+    """
+    Where a room's messages execute. This base class runs everything in
+    this process (single worker, the default).
+    - dispatch(): one client message -> (to_sender, to_room), dumped dicts
+    - disconnect(): socket closed for pid
+    - owns(): whether this worker should run the room's timers
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def start(self) -> None:
+        return None
+
+    async def stop(self) -> None:
+        return None
+
+    async def owns(self, room_code: str) -> bool:
+        return True
+
+    def owns_locally(self, room_code: str) -> bool:
+        """Known owner without asking Redis (fast path for RoomLocks); never true here."""
+        return False
+
+    async def dispatch(self, room_code: str, pid: Optional[str], raw: Dict[str, Any]) -> DispatchResult:
+        return await dispatch_message(app=self.app, room_code=room_code, pid=pid, raw=raw)
+
+    async def disconnect(self, room_code: str, pid: str) -> DispatchResult:
+        to_sender, to_room = await handle_disconnect(app=self.app, room_code=room_code, pid=pid)
+        return _dump(to_sender), _dump(to_room)
+
+
+class AffinityRouter(RoomRouter):
+    """
+    Room ownership across workers, so every mutation of a room runs in one
+    process (the in-process room locks then hold cluster-wide).
+    - workers heartbeat into a Redis zset; live ones form a HashRing
+    - the owner holds a PX lease on RK.owner(); while it is fresh, messages
+      route locally without touching Redis and the heartbeat renews leases
+      of rooms used since the last beat (idle ones lapse); the ring only
+      decides who claims a room nobody holds
+    - other workers forward the call over the owner's pub/sub channel and
+      wait for the reply; to_room still goes out through the fan-out
+    - a dead worker's heartbeat and leases expire, the ring drops it and the
+      next message lets the new ring owner take over (handoff); a held lease
+      is never taken over early: this worker's view of who is alive may lag
+      (a worker that just started), and two owners would both skip Redis
+      locks and trust their header caches
+    """
+
+    def __init__(
+        self,
+        app,
+        r: Redis,
+        *,
+        node_id: Optional[str] = None,
+        lease_ms: int = 10_000,
+        rpc_timeout_sec: float = 5.0,
+    ) -> None:
+        super().__init__(app)
+        self.r = r
+        self.node_id = node_id or uuid.uuid4().hex[:12]
+        self.lease_ms = lease_ms
+        self.rpc_timeout_sec = rpc_timeout_sec
+        self.ring = HashRing([self.node_id])
+        self._live: set[str] = {self.node_id}
+        self._pending: Dict[str, asyncio.Future] = {}
+        # room -> monotonic time our lease is safe until (lease minus a margin)
+        self._leased: Dict[str, float] = {}
+        # rooms routed here since the last heartbeat (their leases get renewed)
+        self._used: set[str] = set()
+        self._pubsub = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def repo(self):
+        return self.app.state.repo
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        await self.refresh_ring()
+        self._pubsub = self.r.pubsub()
+        await self._pubsub.subscribe(worker_channel(self.node_id))
+        self._tasks = [asyncio.create_task(self._heartbeat()), asyncio.create_task(self._listen())]
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for t in tasks:
+            t.cancel()
+        for t in tasks:
+            try:
+                await t
+            except (asyncio.CancelledError, Exception):
+                pass
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.aclose()
+            except Exception:
+                pass
+            self._pubsub = None
+        for fut in self._pending.values():
+            if not fut.done():
+                fut.cancel()
+        self._pending.clear()
+
+    async def refresh_ring(self) -> None:
+        live = await self.repo.heartbeat_worker(self.node_id, self.lease_ms)
+        self._live = set(live) | {self.node_id}
+        self.ring = HashRing(self._live)
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_ms / 3000.0)
+            try:
+                await self.refresh_ring()
+                await self.renew_leases()
+            except Exception:
+                logger.exception("[AFFINITY] heartbeat failed node=%s", self.node_id)
+
+    async def renew_leases(self) -> None:
+        """Renew the leases of rooms used since the last beat; drop idle ones."""
+        used, self._used = self._used, set()
+        for room_code in list(self._leased):
+            if room_code not in used:
+                self._leased.pop(room_code, None)
+                continue
+            await self._claim(room_code)
+
+    # ---- ownership ----
+
+    async def owner_of(self, room_code: str) -> str:
+        """Resolve (and, when it is us, claim) the room's owner."""
+        if self.owns_locally(room_code):
+            self._used.add(room_code)
+            return self.node_id
+        holder = await self.repo.get_room_owner(room_code)
+        if holder and holder != self.node_id:
+            # even if our ring misses it: a dead holder's lease expires on its own
+            self._leased.pop(room_code, None)
+            return holder
+        preferred = self.ring.node_for(room_code) or self.node_id
+        if holder == self.node_id or preferred == self.node_id:
+            # holder is us, or nobody holds it and the ring picks us
+            owner = await self._claim(room_code)
+            if owner == self.node_id:
+                self._used.add(room_code)
+            return owner
+        self._leased.pop(room_code, None)
+        return preferred
+
+    async def _claim(self, room_code: str) -> str:
+        started = time.monotonic()
+        owner = await self.repo.acquire_room_lease(room_code, self.node_id, self.lease_ms)
+        if owner == self.node_id:
+            self._leased[room_code] = started + self.lease_ms / 2000.0
+        else:
+            self._leased.pop(room_code, None)
+        return owner
+
+    async def owns(self, room_code: str) -> bool:
+        return await self.owner_of(room_code) == self.node_id
+
+    def owns_locally(self, room_code: str) -> bool:
+        until = self._leased.get(room_code)
+        if until is None:
+            return False
+        if time.monotonic() >= until:
+            self._leased.pop(room_code, None)
+            return False
+        return True
+
+    # ---- calls ----
+
+    async def dispatch(self, room_code: str, pid: Optional[str], raw: Dict[str, Any]) -> DispatchResult:
+        return await self._route("message", room_code, pid, raw)
+
+    async def disconnect(self, room_code: str, pid: str) -> DispatchResult:
+        return await self._route("disconnect", room_code, pid, None)
+
+    async def _route(self, kind: str, room_code: str, pid: Optional[str], raw: Any) -> DispatchResult:
+        owner = await self.owner_of(room_code)
+        if owner == self.node_id:
+            return await self._run_local(kind, room_code, pid, raw)
+        return await self._forward(owner, kind, room_code, pid, raw)
+
+    async def _run_local(self, kind: str, room_code: str, pid: Optional[str], raw: Any) -> DispatchResult:
+        if kind == "disconnect":
+            to_sender, to_room = await RoomRouter.disconnect(self, room_code, pid or "")
+        else:
+            to_sender, to_room = await RoomRouter.dispatch(self, room_code, pid, raw)
+        # timers of this room now run here
+        scheduler = getattr(self.app.state, "scheduler", None)
+        if to_room and scheduler is not None:
+            scheduler.touch(room_code)
+        return to_sender, to_room
+
+    async def _forward(self, owner: str, kind: str, room_code: str, pid: Optional[str], raw: Any) -> DispatchResult:
+        call_id = uuid.uuid4().hex
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._pending[call_id] = fut
+        request = {
+            "op": "call",
+            "id": call_id,
+            "from": self.node_id,
+            "kind": kind,
+            "room": room_code,
+            "pid": pid,
+            "raw": raw,
+        }
+        try:
+            receivers = await self.r.publish(worker_channel(owner), jsonx.dumps(request))
+            if not receivers:
+                raise asyncio.TimeoutError
+            reply = await asyncio.wait_for(fut, timeout=self.rpc_timeout_sec)
+        except asyncio.TimeoutError:
+            logger.warning("[AFFINITY] forward to %s timed out room=%s kind=%s", owner, room_code, kind)
+            self._live.discard(owner)
+            err = OutError(code="ROOM_UNAVAILABLE", message="Room owner not reachable, retry").model_dump()
+            return [err], []
+        finally:
+            self._pending.pop(call_id, None)
+        return reply.get("to_sender") or [], reply.get("to_room") or []
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                msg = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("[AFFINITY] pubsub read failed node=%s", self.node_id)
+                await asyncio.sleep(1.0)
+                continue
+            if not msg or msg.get("type") != "message":
+                continue
+            data = msg.get("data")
+            try:
+                text = data.decode("utf-8") if isinstance(data, (bytes, bytearray)) else str(data)
+                envelope = json.loads(text)
+            except (ValueError, UnicodeDecodeError):
+                logger.warning("[AFFINITY] dropped malformed message")
+                continue
+            if envelope.get("op") == "reply":
+                fut = self._pending.get(envelope.get("id"))
+                if fut is not None and not fut.done():
+                    fut.set_result(envelope)
+            elif envelope.get("op") == "call":
+                # run concurrently: a slow room must not hold up replies or other rooms
+                asyncio.create_task(self._serve(envelope))
+
+    async def _serve(self, call: Dict[str, Any]) -> None:
+        room_code = call.get("room") or ""
+        reply: Dict[str, Any] = {"op": "reply", "id": call.get("id")}
+        try:
+            if await self.owns(room_code):
+                to_sender, to_room = await self._run_local(call.get("kind"), room_code, call.get("pid"), call.get("raw"))
+            else:
+                to_sender = [OutError(code="ROOM_UNAVAILABLE", message="Room moved, retry").model_dump()]
+                to_room = []
+            reply["to_sender"], reply["to_room"] = to_sender, to_room
+        except Exception:
+            logger.exception("[AFFINITY] forwarded call failed room=%s", room_code)
+            reply["to_sender"] = [OutError(code="INTERNAL", message="Forwarded call failed").model_dump()]
+            reply["to_room"] = []
+        try:
+            await self.r.publish(worker_channel(str(call.get("from"))), jsonx.dumps(reply))
+        except Exception:
+            logger.exception("[AFFINITY] reply failed room=%s", room_code)
+
+
+def make_router(app, enabled: bool, r: Optional[Redis] = None, **kwargs: Any) -> RoomRouter:
+    if enabled:
+        if r is None:
+            raise ValueError("room affinity needs a Redis client")
+        return AffinityRouter(app, r, **kwargs)
+    return RoomRouter(app)
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request, Response
+
+from app.store.models import SINGLE_CANVAS
+
+router = APIRouter(prefix="/rooms", tags=["canvas"])
+
+
+@router.get("/{room_code}/canvas/{canvas}")
+async def canvas_image(room_code: str, canvas: str, request: Request, seq: Optional[int] = None):
+    """
+    Server-rendered canvas ("main" for SINGLE, "A"/"B" for VS).
+    seq: the raster seq from a snapshot; X-Ops-Seq tells which ops the image includes.
+    """
+    rasterizer = getattr(request.app.state, "rasterizer", None)
+    if rasterizer is None:
+        raise HTTPException(status_code=404, detail="Canvas rendering is disabled")
+
+    repo = request.app.state.repo
+    header = await repo.get_room_header(room_code)
+    if header is None:
+        raise HTTPException(status_code=404, detail="Room not found")
+    if canvas not in (("A", "B") if header.mode == "VS" else (SINGLE_CANVAS,)):
+        raise HTTPException(status_code=404, detail="Canvas not found")
+
+    image = rasterizer.cached(room_code, canvas, seq) if seq is not None else None
+    if image is None:
+        seq, image = await rasterizer.render(room_code, canvas)
+    return Response(
+        content=image,
+        media_type=rasterizer.media_type,
+        headers={"X-Ops-Seq": str(seq), "Cache-Control": "no-cache"},
+    )
@@ -1,36 +1,14 @@
 # app/transport/dispatcher.py
 from __future__ import annotations
 
-from typing import Any, Dict, List, Tuple, Optional
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Tuple, Optional
 
 from pydantic import ValidationError
 
-from app.transport.protocols import (
-    parse_incoming,
-    OutError,
-    OutgoingEvent,
-    InCreateRoom,
-    InJoin,
-    InLeave,
-    InHeartbeat,
-    InSnapshot,
-    InReconnect,
-    InSetTeam,
-    InStartRolePick,
-    InAssignRoles,
-    InSetVsConfig,
-    InSetRoundConfig,
-    InStartGame,
-    InDrawOp,
-    InGuess,
-    InPhaseTick,
-    InSabotage,
-    InSabotageArm,
-    InSabotageCancel,
-    InVoteNext,
-    InModeration,
-    InEndGame,
-)
+from app.transport.protocols import parse_incoming, OutError, OutgoingEvent
 from app.domain.lifecycle.handlers import (
     handle_create_room,
     handle_join,
@@ -63,12 +41,150 @@ from app.domain.single.handlers import (
     handle_single_vote_next,
 )
 from app.domain.common.end_game import handle_end_game
+from app.domain.common.stroke_stream import handle_stroke_begin, handle_stroke_end, handle_stroke_points
 from app.domain.common.validation import is_muted
+from app.store.locks import RoomLockTimeout, StaleLockError
+from app.store.room_context import RoomContext
 from app.util.timeutil import now_ts
 
 DispatchResult = Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]
 # (to_sender_events, to_room_events), each event is JSON dict
 
+# handle_x(*, app, room_code, pid, msg) -> (to_sender, to_room)
+Handler = Callable[..., Awaitable[Tuple[List[Any], List[Any]]]]
+# guard(*, app, ctx, pid, msg) -> error event dict to reject the message, None to pass
+Guard = Callable[..., Awaitable[Optional[Dict[str, Any]]]]
+# hook(msg_type, mode, elapsed_sec); mode is None unless routing needed it
+TimingHook = Callable[[str, Optional[str], float], None]
+
+logger = logging.getLogger(__name__)
+
+
+# ---- guards ----
+
+async def require_pid(*, app, ctx: RoomContext, pid: Optional[str], msg: Any) -> Optional[Dict[str, Any]]:
+    if not pid:
+        return OutError(code="NO_PID", message="Missing pid").model_dump()
+    return None
+
+
+async def not_kicked(*, app, ctx: RoomContext, pid: Optional[str], msg: Any) -> Optional[Dict[str, Any]]:
+    """Kicked players may only join/reconnect."""
+    player = await ctx.player() if pid else None
+    if player is not None and getattr(player, "kicked", False):
+        return OutError(code="KICKED", message="You have been kicked from this room").model_dump()
+    return None
+
+
+async def not_muted(*, app, ctx: RoomContext, pid: Optional[str], msg: Any) -> Optional[Dict[str, Any]]:
+    """Muted players may still heartbeat/snapshot/leave."""
+    player = await ctx.player() if pid else None
+    if player is not None and is_muted(player, now_ts()):
+        return OutError(code="MUTED", message="You are muted").model_dump()
+    return None
+
+
+PRESENCE_GUARDS: Tuple[Guard, ...] = (require_pid, not_kicked)
+PLAYER_GUARDS: Tuple[Guard, ...] = (require_pid, not_kicked, not_muted)
+
+
+# ---- routing table ----
+
+@dataclass(frozen=True)
+class Route:
+    handlers: Dict[Optional[str], Handler]  # room mode -> handler; None = any mode
+    guards: Tuple[Guard, ...] = ()
+    unsupported: str = ""  # NOT_IMPLEMENTED message when the room's mode has no handler
+
+
+_ROUTES: Dict[str, Route] = {}
+
+
+def register(
+    msg_type: str,
+    handler: Handler,
+    *,
+    mode: Optional[str] = None,
+    guards: Tuple[Guard, ...] = PLAYER_GUARDS,
+    unsupported: str = "",
+) -> None:
+    """
+    Route msg_type (for rooms of `mode`, or any mode) to handler, behind guards.
+    Guards run in order and are per type: the last registration's guards win.
+    """
+    existing = _ROUTES.get(msg_type)
+    handlers = dict(existing.handlers) if existing else {}
+    if mode in handlers:
+        raise ValueError(f"route already registered: {msg_type}/{mode}")
+    handlers[mode] = handler
+    if not unsupported:
+        unsupported = existing.unsupported if existing else ""
+    _ROUTES[msg_type] = Route(handlers=handlers, guards=tuple(guards), unsupported=unsupported)
+
+
+class DispatchStats:
+    """Timing hook: per message type count, average and max handling time."""
+
+    def __init__(self) -> None:
+        self._by_type: Dict[str, List[float]] = {}  # type -> [count, total_sec, max_sec]
+
+    def __call__(self, msg_type: str, mode: Optional[str], elapsed: float) -> None:
+        s = self._by_type.setdefault(msg_type, [0, 0.0, 0.0])
+        s[0] += 1
+        s[1] += elapsed
+        s[2] = max(s[2], elapsed)
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            t: {"count": int(n), "avg_ms": round(total / n * 1000, 3), "max_ms": round(peak * 1000, 3)}
+            for t, (n, total, peak) in sorted(self._by_type.items())
+        }
+
+
+dispatch_stats = DispatchStats()
+_TIMING_HOOKS: List[TimingHook] = [dispatch_stats]
+
+
+def add_timing_hook(hook: TimingHook) -> None:
+    _TIMING_HOOKS.append(hook)
+
+
+# Lifecycle
+register("create_room", handle_create_room, guards=())
+register("join", handle_join, guards=())
+register("reconnect", handle_reconnect, guards=())
+register("leave", handle_leave, guards=PRESENCE_GUARDS)
+register("heartbeat", handle_heartbeat, guards=PRESENCE_GUARDS)
+register("snapshot", handle_snapshot, guards=(not_kicked,))
+# Lobby
+register("set_team", handle_set_team)
+register("start_role_pick", handle_start_role_pick)
+register("moderation", handle_moderation)
+register("end_game", handle_end_game)
+# Config (the handlers check the mode themselves)
+register("set_round_config", handle_single_set_round_config)
+register("set_vs_config", handle_vs_set_round_config)
+register("assign_roles", handle_vs_role_pick)
+# Mode-dependent
+_BOTH = "only for VS/SINGLE rooms"
+register("start_game", handle_vs_start_game, mode="VS", unsupported=f"start_game {_BOTH}")
+register("start_game", handle_single_start_game, mode="SINGLE")
+register("draw_op", handle_vs_draw_op, mode="VS", unsupported=f"draw_op {_BOTH}")
+register("draw_op", handle_single_draw_op, mode="SINGLE")
+register("guess", handle_vs_guess, mode="VS", unsupported=f"guess {_BOTH}")
+register("guess", handle_single_guess, mode="SINGLE")
+register("phase_tick", handle_vs_phase_tick, mode="VS", unsupported=f"phase_tick {_BOTH}")
+register("phase_tick", handle_single_phase_tick, mode="SINGLE")
+register("vote_next", handle_vs_vote_next, mode="VS", unsupported=f"vote_next {_BOTH}")
+register("vote_next", handle_single_vote_next, mode="SINGLE")
+# Streamed strokes (the handlers check the mode themselves)
+register("stroke_begin", handle_stroke_begin)
+register("stroke_points", handle_stroke_points)
+register("stroke_end", handle_stroke_end)
+register("sabotage", handle_vs_sabotage, mode="VS", unsupported="Sabotage only for VS mode")
+register("sabotage_arm", handle_vs_sabotage_arm, mode="VS", unsupported="sabotage_arm only for VS mode")
+register("sabotage_cancel", handle_vs_sabotage_cancel, mode="VS", unsupported="sabotage_cancel only for VS mode")
+
 
 async def dispatch_message(
     *,
@@ -80,7 +196,7 @@ async def dispatch_message(
     """
     Transport layer calls this.
     - Parses + validates raw JSON
-    - Routes to the correct domain handler
+    - Looks up the route for (type, room mode) and runs its guards
     - Returns (to_sender, to_room) events as JSON dicts
 
     NOTE: This file contains NO Redis key usage and NO game rules.
@@ -91,172 +207,48 @@ async def dispatch_message(
         err = OutError(code="BAD_MESSAGE", message=str(e)).model_dump()
         return [err], []
 
-    # If player is kicked, block all non-join messages
-    if pid and not isinstance(msg, (InCreateRoom, InJoin, InReconnect)):
-        repo = app.state.repo
-        player = await repo.get_player(room_code, pid)
-        if player is not None and getattr(player, "kicked", False):
-            err = OutError(code="KICKED", message="You have been kicked from this room").model_dump()
-            return [err], []
-
-    # If player is muted, block all actions except heartbeat/snapshot/leave
-    if pid and not isinstance(msg, (InCreateRoom, InJoin, InReconnect, InHeartbeat, InSnapshot, InLeave)):
-        repo = app.state.repo
-        player = await repo.get_player(room_code, pid)
-        if player is not None and is_muted(player, now_ts()):
-            err = OutError(code="MUTED", message="You are muted").model_dump()
-            return [err], []
-
-    # ---- Lifecycle routing only (Slice 1) ----
-    if isinstance(msg, InCreateRoom):
-        to_sender, to_room = await handle_create_room(app=app, room_code=room_code, pid=pid, msg=msg)
-        return _dump(to_sender), _dump(to_room)
-
-    if isinstance(msg, InJoin):
-        to_sender, to_room = await handle_join(app=app, room_code=room_code, pid=pid, msg=msg)
-        return _dump(to_sender), _dump(to_room)
-
-    if isinstance(msg, InLeave):
-        to_sender, to_room = await handle_leave(app=app, room_code=room_code, pid=pid, msg=msg)
-        return _dump(to_sender), _dump(to_room)
-
-    if isinstance(msg, InHeartbeat):
-        to_sender, to_room = await handle_heartbeat(app=app, room_code=room_code, pid=pid, msg=msg)
-        return _dump(to_sender), _dump(to_room)
-
-    if isinstance(msg, InSnapshot):
-        to_sender, to_room = await handle_snapshot(app=app, room_code=room_code, pid=pid, msg=msg)
-        return _dump(to_sender), _dump(to_room)
-
-    if isinstance(msg, InReconnect):
-        to_sender, to_room = await handle_reconnect(app=app, room_code=room_code, pid=pid, msg=msg)
-        return _dump(to_sender), _dump(to_room)
-    #Lobby
-    if isinstance(msg, InSetTeam):
-        to_sender, to_room = await handle_set_team(app=app, room_code=room_code, pid=pid, msg=msg)
-        return _dump(to_sender), _dump(to_room)
-
-    if isinstance(msg, InStartRolePick):
-        to_sender, to_room = await handle_start_role_pick(app=app, room_code=room_code, pid=pid, msg=msg)
-        return _dump(to_sender), _dump(to_room)
-
-    if isinstance(msg, InModeration):
-        to_sender, to_room = await handle_moderation(app=app, room_code=room_code, pid=pid, msg=msg)
-        return _dump(to_sender), _dump(to_room)
-
-    if isinstance(msg, InEndGame):
-        to_sender, to_room = await handle_end_game(app=app, room_code=room_code, pid=pid, msg=msg)
-        return _dump(to_sender), _dump(to_room)
-
-    # ---- SINGLE: GM config / start ----
-    if isinstance(msg, InSetRoundConfig):
-        to_sender, to_room = await handle_single_set_round_config(app=app, room_code=room_code, pid=pid, msg=msg)
-        return _dump(to_sender), _dump(to_room)
-
-    # ---- VS: GM config (pre-round) ----
-    if isinstance(msg, InSetVsConfig):
-        to_sender, to_room = await handle_vs_set_round_config(app=app, room_code=room_code, pid=pid, msg=msg)
-        return _dump(to_sender), _dump(to_room)
-
-    if isinstance(msg, InStartGame):
-        repo = app.state.repo
-        header = await repo.get_room_header(room_code)
-        if header and header.mode == "VS":
-            to_sender, to_room = await handle_vs_start_game(app=app, room_code=room_code, pid=pid, msg=msg)
-            return _dump(to_sender), _dump(to_room)
-        if header and header.mode == "SINGLE":
-            to_sender, to_room = await handle_single_start_game(app=app, room_code=room_code, pid=pid, msg=msg)
-            return _dump(to_sender), _dump(to_room)
-        err = OutError(code="NOT_IMPLEMENTED", message="start_game only for VS/SINGLE rooms").model_dump()
-        return [err], []
-
-    # ---- VS Mode routing ----
-    if isinstance(msg, InAssignRoles):
-        to_sender, to_room = await handle_vs_role_pick(app=app, room_code=room_code, pid=pid, msg=msg)
-        return _dump(to_sender), _dump(to_room)
-
-
-    # Route draw_op, guess, phase_tick, sabotage based on room mode
-    # For now, route to VS handlers if mode is VS (could be improved with mode check)
-    if isinstance(msg, InDrawOp):
-        # Check room mode to route appropriately
-        repo = app.state.repo
-        header = await repo.get_room_header(room_code)
-        if header and header.mode == "VS":
-            to_sender, to_room = await handle_vs_draw_op(app=app, room_code=room_code, pid=pid, msg=msg)
-            return _dump(to_sender), _dump(to_room)
-        if header and header.mode == "SINGLE":
-            to_sender, to_room = await handle_single_draw_op(app=app, room_code=room_code, pid=pid, msg=msg)
-            return _dump(to_sender), _dump(to_room)
-        err = OutError(code="NOT_IMPLEMENTED", message="draw_op only for VS/SINGLE rooms").model_dump()
-        return [err], []
-
-    if isinstance(msg, InGuess):
-        repo = app.state.repo
-        header = await repo.get_room_header(room_code)
-        if header and header.mode == "VS":
-            to_sender, to_room = await handle_vs_guess(app=app, room_code=room_code, pid=pid, msg=msg)
-            return _dump(to_sender), _dump(to_room)
-        if header and header.mode == "SINGLE":
-            to_sender, to_room = await handle_single_guess(app=app, room_code=room_code, pid=pid, msg=msg)
-            return _dump(to_sender), _dump(to_room)
-        err = OutError(code="NOT_IMPLEMENTED", message="guess only for VS/SINGLE rooms").model_dump()
-        return [err], []
-
-    if isinstance(msg, InPhaseTick):
-        repo = app.state.repo
-        header = await repo.get_room_header(room_code)
-        if header and header.mode == "VS":
-            to_sender, to_room = await handle_vs_phase_tick(app=app, room_code=room_code, pid=pid, msg=msg)
-            return _dump(to_sender), _dump(to_room)
-        if header and header.mode == "SINGLE":
-            to_sender, to_room = await handle_single_phase_tick(app=app, room_code=room_code, pid=pid, msg=msg)
-            return _dump(to_sender), _dump(to_room)
-        err = OutError(code="NOT_IMPLEMENTED", message="phase_tick only for VS/SINGLE rooms").model_dump()
-        return [err], []
-
-    if isinstance(msg, InSabotage):
-        repo = app.state.repo
-        header = await repo.get_room_header(room_code)
-        if header and header.mode == "VS":
-            to_sender, to_room = await handle_vs_sabotage(app=app, room_code=room_code, pid=pid, msg=msg)
-            return _dump(to_sender), _dump(to_room)
-        err = OutError(code="NOT_IMPLEMENTED", message="Sabotage only for VS mode").model_dump()
-        return [err], []
-
-    if isinstance(msg, InSabotageArm):
-        repo = app.state.repo
-        header = await repo.get_room_header(room_code)
-        if header and header.mode == "VS":
-            to_sender, to_room = await handle_vs_sabotage_arm(app=app, room_code=room_code, pid=pid, msg=msg)
-            return _dump(to_sender), _dump(to_room)
-        err = OutError(code="NOT_IMPLEMENTED", message="sabotage_arm only for VS mode").model_dump()
-        return [err], []
-
-    if isinstance(msg, InSabotageCancel):
-        repo = app.state.repo
-        header = await repo.get_room_header(room_code)
-        if header and header.mode == "VS":
-            to_sender, to_room = await handle_vs_sabotage_cancel(app=app, room_code=room_code, pid=pid, msg=msg)
-            return _dump(to_sender), _dump(to_room)
-        err = OutError(code="NOT_IMPLEMENTED", message="sabotage_cancel only for VS mode").model_dump()
+    route = _ROUTES.get(msg.type)
+    if route is None:
+        err = OutError(code="NOT_IMPLEMENTED", message=f"Handler not implemented for type={msg.type}").model_dump()
         return [err], []
 
-    if isinstance(msg, InVoteNext):
-        repo = app.state.repo
-        header = await repo.get_room_header(room_code)
-        if header and header.mode == "VS":
-            to_sender, to_room = await handle_vs_vote_next(app=app, room_code=room_code, pid=pid, msg=msg)
+    repo = app.state.repo
+    mode: Optional[str] = None
+    started = time.perf_counter()
+    # One RoomContext per message: guards and the handler share
+    # header/player/game/... reads (repo getters memoize through it).
+    with repo.room_context(room_code, pid) as ctx:
+        try:
+            for guard in route.guards:
+                err = await guard(app=app, ctx=ctx, pid=pid, msg=msg)
+                if err is not None:
+                    return [err], []
+
+            handler = route.handlers.get(None)
+            if handler is None:
+                mode = await repo.get_room_mode(room_code)
+                handler = route.handlers.get(mode)
+            if handler is None:
+                err = OutError(code="NOT_IMPLEMENTED", message=route.unsupported).model_dump()
+                return [err], []
+
+            to_sender, to_room = await handler(app=app, room_code=room_code, pid=pid, msg=msg)
             return _dump(to_sender), _dump(to_room)
-        if header and header.mode == "SINGLE":
-            to_sender, to_room = await handle_single_vote_next(app=app, room_code=room_code, pid=pid, msg=msg)
-            return _dump(to_sender), _dump(to_room)
-        err = OutError(code="NOT_IMPLEMENTED", message="vote_next only for VS/SINGLE rooms").model_dump()
-        return [err], []
-
-    # If protocol exists but we didn't route it yet:
-    err = OutError(code="NOT_IMPLEMENTED", message=f"Handler not implemented for type={msg.type}").model_dump()
-    return [err], []
+        except RoomLockTimeout:
+            err = OutError(code="ROOM_BUSY", message="Room is busy, try again").model_dump()
+            return [err], []
+        except StaleLockError as e:
+            # our room lock lapsed mid-handler and the next holder already wrote
+            logger.warning("[DISPATCH] fenced off type=%s room=%s: %s", msg.type, room_code, e)
+            err = OutError(code="ROOM_BUSY", message="Room is busy, try again").model_dump()
+            return [err], []
+        finally:
+            elapsed = time.perf_counter() - started
+            for hook in _TIMING_HOOKS:
+                try:
+                    hook(msg.type, mode, elapsed)
+                except Exception:
+                    logger.exception("[DISPATCH] timing hook failed")
 
 
 def _dump(events: List[OutgoingEvent]) -> List[Dict[str, Any]]:
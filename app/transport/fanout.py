@@ -0,0 +1,186 @@
+# app/transport/fanout.py
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from redis.asyncio import Redis
+
+from app.store.redis_keys import RK
+from app.transport.ws_manager import WSManager
+from app.util import jsonx
+
+logger = logging.getLogger(__name__)
+
+
+class LocalFanout:
+    """
+    Room event fan-out for a single process: straight to this node's WSManager.
+    Backends share one interface:
+    - publish(room_code, events, exclude_pid): deliver dumped room events everywhere
+    - close_pid(room_code, pid, code, reason): close a player's socket wherever it
+      is connected (pid None: every socket of the room)
+    - join(room_code) / leave(room_code): a local connection opened / closed
+    - start() / stop()
+    """
+
+    def __init__(self, wsman: WSManager) -> None:
+        self.wsman = wsman
+
+    async def start(self) -> None:
+        return None
+
+    async def stop(self) -> None:
+        return None
+
+    async def join(self, room_code: str) -> None:
+        return None
+
+    async def leave(self, room_code: str) -> None:
+        return None
+
+    async def publish(self, room_code: str, events: Iterable[dict], exclude_pid: Optional[str] = None) -> None:
+        await self.wsman.deliver(room_code, events, exclude_pid=exclude_pid)
+
+    async def close_pid(self, room_code: str, pid: Optional[str], code: int = 4000, reason: str = "kicked") -> None:
+        await self._close_local(room_code, pid, code, reason)
+
+    async def _close_local(self, room_code: str, pid: Optional[str], code: int, reason: str) -> None:
+        for target in [pid] if pid is not None else self.wsman.pids(room_code):
+            try:
+                await self.wsman.close_pid(room_code, target, code=code, reason=reason)
+            except Exception:
+                logger.exception("[FANOUT] close failed room=%s pid=%s", room_code, target)
+
+
+class RedisFanout(LocalFanout):
+    """
+    Cross-node fan-out over Redis pub/sub (one channel per room: RK.fanout()).
+    - local connections are served directly, without the Redis round-trip
+    - every node also PUBLISHes; nodes skip their own messages (node_id)
+    - a node subscribes only to rooms it currently has connections for
+    Pub/sub is fire-and-forget: a node that is briefly disconnected misses
+    events, and clients recover through snapshot(since_seq).
+    """
+
+    def __init__(self, wsman: WSManager, r: Redis, node_id: Optional[str] = None) -> None:
+        super().__init__(wsman)
+        self.r = r
+        self.node_id = node_id or uuid.uuid4().hex[:12]
+        self._pubsub = None
+        self._channels: Set[str] = set()
+        self._has_channels = asyncio.Event()
+        self._sub_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._pubsub = self.r.pubsub()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.aclose()
+            except Exception:
+                pass
+            self._pubsub = None
+
+    async def join(self, room_code: str) -> None:
+        channel = RK(room_code).fanout()
+        async with self._sub_lock:
+            if channel in self._channels or self._pubsub is None:
+                return
+            await self._pubsub.subscribe(channel)
+            self._channels.add(channel)
+            self._has_channels.set()
+
+    async def leave(self, room_code: str) -> None:
+        channel = RK(room_code).fanout()
+        async with self._sub_lock:
+            if channel not in self._channels or self._pubsub is None:
+                return
+            if await self.wsman.room_size(room_code) > 0:
+                return
+            await self._pubsub.unsubscribe(channel)
+            self._channels.discard(channel)
+            if not self._channels:
+                self._has_channels.clear()
+
+    async def publish(self, room_code: str, events: Iterable[dict], exclude_pid: Optional[str] = None) -> None:
+        events = list(events)
+        if not events:
+            return
+        await self.wsman.deliver(room_code, events, exclude_pid=exclude_pid)
+        payload = jsonx.dumps({"node": self.node_id, "room": room_code, "exclude": exclude_pid, "events": events})
+        try:
+            await self.r.publish(RK(room_code).fanout(), payload)
+        except Exception:
+            logger.exception("[FANOUT] publish failed room=%s", room_code)
+
+    async def close_pid(self, room_code: str, pid: Optional[str], code: int = 4000, reason: str = "kicked") -> None:
+        await self._close_local(room_code, pid, code, reason)
+        payload = jsonx.dumps(
+            {"node": self.node_id, "room": room_code, "close": {"pid": pid, "code": code, "reason": reason}}
+        )
+        try:
+            await self.r.publish(RK(room_code).fanout(), payload)
+        except Exception:
+            logger.exception("[FANOUT] close publish failed room=%s", room_code)
+
+    async def _run(self) -> None:
+        while True:
+            # get_message() needs an active subscription
+            await self._has_channels.wait()
+            try:
+                msg = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("[FANOUT] pubsub read failed")
+                await asyncio.sleep(1.0)
+                continue
+            if not msg or msg.get("type") != "message":
+                continue
+            await self._handle(msg.get("data"))
+
+    async def _handle(self, data: Any) -> None:
+        try:
+            text = data.decode("utf-8") if isinstance(data, (bytes, bytearray)) else str(data)
+            envelope: Dict[str, Any] = json.loads(text)
+        except (ValueError, UnicodeDecodeError):
+            logger.warning("[FANOUT] dropped malformed message")
+            return
+        if envelope.get("node") == self.node_id:
+            return  # already delivered locally
+        room_code = envelope.get("room")
+        if not isinstance(room_code, str):
+            return
+        close = envelope.get("close")
+        if isinstance(close, dict):
+            await self._close_local(
+                room_code, close.get("pid"), int(close.get("code") or 4000), str(close.get("reason") or "")
+            )
+            return
+        events: List[dict] = envelope.get("events") or []
+        if not events:
+            return
+        await self.wsman.deliver(room_code, events, exclude_pid=envelope.get("exclude"))
+
+
+def make_fanout(backend: str, wsman: WSManager, r: Optional[Redis] = None, node_id: Optional[str] = None) -> LocalFanout:
+    if backend == "redis":
+        if r is None:
+            raise ValueError("redis fan-out needs a Redis client")
+        return RedisFanout(wsman, r, node_id=node_id)
+    return LocalFanout(wsman)
@@ -1,7 +1,7 @@
 # app/transport/protocols.py
 from __future__ import annotations
 
-from typing import Any, Dict, List, Literal, Optional, Union
+from typing import Any, Dict, List, Literal, Optional, Tuple, Union
 from pydantic import BaseModel, Field, ValidationError
 
 
@@ -48,10 +48,16 @@ class InHeartbeat(InBase):
 
 class InSnapshot(InBase):
     type: Literal["snapshot"] = "snapshot"
+    # last op seq the client holds per canvas ("main" | "A" | "B"); omit for a full replay
+    since_seq: Optional[Dict[str, int]] = None
+    # canvases without a cursor may come as a server-rendered image + the ops after it
+    raster: bool = False
 
 class InReconnect(InBase):
     type: Literal["reconnect"] = "reconnect"
     pid: str
+    since_seq: Optional[Dict[str, int]] = None
+    raster: bool = False
 
 
 # ---- Shared gameplay inputs ----
@@ -71,6 +77,35 @@ class InDrawOp(InBase):
     canvas: Optional[Team] = None
 
 
+# ---- Streamed strokes: stroke_begin, stroke_points*, stroke_end ----
+
+Point = Tuple[Union[int, float], Union[int, float]]
+
+
+class InStrokeBegin(InBase):
+    """
+    Open a streamed line (charged here, stored at stroke_end).
+    op: style fields (color, width, ..., "q" for packed chunks); VS: canvas like draw_op.
+    """
+    type: Literal["stroke_begin"] = "stroke_begin"
+    sid: str = Field(min_length=1, max_length=32)
+    op: Dict[str, Any] = Field(default_factory=dict)
+    canvas: Optional[Team] = None
+
+
+class InStrokePoints(InBase):
+    """Next points of the open stroke, as pts or packed pz (see stroke_codec)."""
+    type: Literal["stroke_points"] = "stroke_points"
+    sid: str = Field(min_length=1, max_length=32)
+    pts: Optional[List[Point]] = None
+    pz: Optional[str] = None
+
+
+class InStrokeEnd(InBase):
+    type: Literal["stroke_end"] = "stroke_end"
+    sid: str = Field(min_length=1, max_length=32)
+
+
 class InVoteNext(InBase):
     type: Literal["vote_next"] = "vote_next"
     vote: Literal["yes", "no"] = "yes"
@@ -154,6 +189,9 @@ IncomingMessage = Union[
     InReconnect,
     InGuess,
     InDrawOp,
+    InStrokeBegin,
+    InStrokePoints,
+    InStrokeEnd,
     InVoteNext,
     InPhaseTick,
     InSabotage,
@@ -191,7 +229,13 @@ class OutRoomSnapshot(OutBase):
     roles: Dict[str, Any] = Field(default_factory=dict)
     round_config: Dict[str, Any] = Field(default_factory=dict)
     game: Dict[str, Any] = Field(default_factory=dict)
-    ops: List[Dict[str, Any]] = Field(default_factory=list)
+    # list of op dicts, or RawJSON (stored ops spliced in by app.util.jsonx.dumps)
+    ops: Any = Field(default_factory=list)
+    # per canvas: last op seq, and "full" (reset canvas, replay ops), "delta" (append ops)
+    # or "raster" (reset canvas, draw raster[canvas]["url"], then append ops)
+    ops_seq: Dict[str, int] = Field(default_factory=dict)
+    ops_mode: Dict[str, str] = Field(default_factory=dict)
+    raster: Dict[str, Dict[str, Any]] = Field(default_factory=dict)
     modlog: List[Dict[str, Any]] = Field(default_factory=list)
     server_ts: int = 0
 
@@ -225,6 +269,33 @@ class OutOpBroadcast(OutBase):
     by: str
 
 
+class OutStrokeStart(OutBase):
+    type: Literal["stroke_start"] = "stroke_start"
+    sid: str
+    by: str
+    canvas: Optional[Team] = None
+    op: Dict[str, Any] = Field(default_factory=dict)
+
+
+class OutStrokeDelta(OutBase):
+    """Points of a live stroke since the previous delta (pts or pz, as the drawer sent them)."""
+    type: Literal["stroke_delta"] = "stroke_delta"
+    sid: str
+    by: str
+    canvas: Optional[Team] = None
+    pts: Optional[List[List[Union[int, float]]]] = None
+    pz: Optional[str] = None
+
+
+class OutStrokeEnd(OutBase):
+    """Live stroke finished: seq of the stored op (sent as op_broadcast), 0 if it was dropped."""
+    type: Literal["stroke_end"] = "stroke_end"
+    sid: str
+    by: str
+    canvas: Optional[Team] = None
+    seq: int = 0
+
+
 # Moved to end of file
 
 
@@ -242,6 +313,9 @@ _INCOMING_BY_TYPE = {
     "reconnect": InReconnect,
     "guess": InGuess,
     "draw_op": InDrawOp,
+    "stroke_begin": InStrokeBegin,
+    "stroke_points": InStrokePoints,
+    "stroke_end": InStrokeEnd,
     "vote_next": InVoteNext,
     "phase_tick": InPhaseTick,
     "sabotage": InSabotage,
@@ -386,6 +460,9 @@ OutgoingEvent = Union[
     OutPlayerJoined,
     OutPlayerLeft,
     OutOpBroadcast,
+    OutStrokeStart,
+    OutStrokeDelta,
+    OutStrokeEnd,
     OutPlayerUpdated,
     OutModLogEntry,
     OutPlayerKicked,
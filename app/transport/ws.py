@@ -8,9 +8,9 @@ from urllib.parse import urlparse
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
 from app.settings import get_settings
-from app.domain.lifecycle.handlers import handle_disconnect
 from app.transport.dispatcher import dispatch_message
 from app.transport.protocols import OutError, OutHello
+from app.util import jsonx
 
 router = APIRouter()
 
@@ -24,6 +24,11 @@ def _is_private_ip(host: str) -> bool:
         return False
 
 
+def _wants_batch(websocket: WebSocket) -> bool:
+    """Client opts in to batched frames with ?batch=1."""
+    return websocket.query_params.get("batch", "").lower() in ("1", "true", "yes", "y", "on")
+
+
 async def _check_origin_or_close(websocket: WebSocket) -> bool:
     settings = get_settings()
     allowed = {o.strip() for o in settings.WS_ALLOWED_ORIGINS.split(",") if o.strip()}
@@ -67,7 +72,7 @@ async def ws_create(websocket: WebSocket):
             raw=raw,
         )
         for e in to_sender:
-            await websocket.send_json(e)
+            await websocket.send_text(jsonx.dumps(e))
     except WebSocketDisconnect:
         return
     finally:
@@ -82,9 +87,14 @@ async def ws_room(websocket: WebSocket, room_code: str):
     await websocket.accept()
 
     pid = uuid.uuid4().hex[:10]
+    batch = _wants_batch(websocket)
     wsman = websocket.app.state.wsman
-    await wsman.add(room_code, pid, websocket)
-    await websocket.send_json(OutHello(pid=pid, room_code=room_code).model_dump())
+    fanout = websocket.app.state.fanout
+    rooms = websocket.app.state.rooms
+    scheduler = getattr(websocket.app.state, "scheduler", None)
+    await wsman.add(room_code, pid, websocket, batch=batch)
+    await fanout.join(room_code)
+    await wsman.send_to_pid(room_code, pid, OutHello(pid=pid, room_code=room_code).model_dump())
 
     try:
         while True:
@@ -96,44 +106,26 @@ async def ws_room(websocket: WebSocket, room_code: str):
                 if new_pid and new_pid != pid:
                     await wsman.replace_pid(room_code, pid, new_pid, websocket)
                     pid = new_pid
-                    await websocket.send_json(OutHello(pid=pid, room_code=room_code).model_dump())
-
-            to_sender, to_room = await dispatch_message(
-                app=websocket.app,
-                room_code=room_code,
-                pid=pid,
-                raw=raw,
-            )
-
-            # unicast
-            for e in to_sender:
-                await websocket.send_json(e)
-
-            # broadcast (exclude sender by default to avoid duplicates)
-            for e in to_room:
-                if isinstance(e, dict) and "targets" in e:
-                    targets = e.get("targets") or []
-                    payload = {k: v for k, v in e.items() if k != "targets"}
-                    for t in targets:
-                        await wsman.send_to_pid(room_code, t, payload)
-                    continue
-                await wsman.broadcast(room_code, e, exclude_pid=pid)
+                    await wsman.send_to_pid(room_code, pid, OutHello(pid=pid, room_code=room_code).model_dump())
+
+            # runs here, or on the room's owner worker when affinity is on
+            to_sender, to_room = await rooms.dispatch(room_code, pid, raw)
+
+            # unicast (queued like broadcasts, so this loop never waits on a slow socket)
+            await wsman.send_events(room_code, pid, to_sender)
+
+            # broadcast (exclude sender by default to avoid duplicates); reaches other nodes too
+            await fanout.publish(room_code, to_room, exclude_pid=pid)
+
+            # room state moved: let the scheduler re-read this room's next deadline
+            if to_room and scheduler is not None:
+                scheduler.touch(room_code)
 
     except WebSocketDisconnect:
-        to_sender, to_room = await handle_disconnect(
-            app=websocket.app,
-            room_code=room_code,
-            pid=pid,
-        )
+        to_sender, to_room = await rooms.disconnect(room_code, pid)
 
-        for e in to_room:
-            if isinstance(e, dict) and "targets" in e:
-                targets = e.get("targets") or []
-                payload = {k: v for k, v in e.items() if k != "targets"}
-                for t in targets:
-                    await wsman.send_to_pid(room_code, t, payload)
-                continue
-            await wsman.broadcast(room_code, e, exclude_pid=pid)
+        await fanout.publish(room_code, to_room, exclude_pid=pid)
 
     finally:
         await wsman.remove(room_code, pid)
+        await fanout.leave(room_code)
@@ -2,78 +2,316 @@
 from __future__ import annotations
 
 import asyncio
+import time
+from collections import deque
 from dataclasses import dataclass
-from typing import Dict, Optional, Any
+from types import MappingProxyType
+from typing import Deque, Dict, List, Literal, Mapping, Optional, Any, Iterable, Tuple
 
 from fastapi import WebSocket
 
+from app.util import jsonx
+
+
+# Frames the overflow policy may drop: a client that misses strokes sees a gap in
+# op seq and re-syncs with snapshot(since_seq); a missed live-stroke delta is
+# superseded by the stroke's op_broadcast.
+STROKE_EVENTS = frozenset({"op_broadcast", "stroke_delta"})
+# Frames carrying absolute state: a newer one replaces an unsent older one.
+COALESCE_EVENTS = frozenset({"budget_update"})
+
+OverflowPolicy = Literal["drop", "disconnect"]
+
+_NO_CONNS: Mapping[str, "Conn"] = MappingProxyType({})
+
 
 @dataclass
+class ConnStats:
+    enqueued: int = 0
+    sent: int = 0
+    dropped: int = 0
+    coalesced: int = 0
+    max_depth: int = 0
+    max_send_ms: float = 0.0
+    slow_consumer: bool = False
+
+    def as_dict(self, depth: int) -> Dict[str, Any]:
+        return {
+            "depth": depth,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "max_depth": self.max_depth,
+            "max_send_ms": round(self.max_send_ms, 3),
+            "slow_consumer": self.slow_consumer,
+        }
+
+
 class Conn:
-    pid: str
-    ws: WebSocket
+    """
+    One websocket plus its bounded outbound queue, drained by a writer task.
+    enqueue() never awaits, so a slow socket only backs up its own queue.
+    Overflow (queue at max_queue):
+    - "drop": drop the oldest queued stroke frame (or the incoming stroke);
+      when nothing is droppable, fall back to disconnect
+    - "disconnect": close the socket (4002 slow_consumer)
+    budget_update frames are always coalesced: only the newest unsent one is kept.
+    """
+
+    def __init__(
+        self,
+        pid: str,
+        ws: WebSocket,
+        *,
+        batch: bool = False,
+        max_queue: int = 256,
+        overflow: OverflowPolicy = "drop",
+    ) -> None:
+        self.pid = pid
+        self.ws = ws
+        # client opted in (?batch=1): several events for one message go out as one frame
+        self.batch = batch
+        self.max_queue = max(1, max_queue)
+        self.overflow = overflow
+        self.stats = ConnStats()
+        # items are [kind, frame]; lists so a coalesced frame can be swapped in place
+        self._queue: Deque[List[Optional[str]]] = deque()
+        self._pending_budget: Optional[List[Optional[str]]] = None
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._writer: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def start(self) -> None:
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._writer = self._writer, None
+        if task is None or task is asyncio.current_task():
+            return
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+
+    def enqueue(self, frame: str, kind: Optional[str] = None) -> None:
+        if self._closing:
+            return
+        stats = self.stats
+        stats.enqueued += 1
+
+        if kind in COALESCE_EVENTS and self._pending_budget is not None:
+            self._pending_budget[1] = frame
+            stats.coalesced += 1
+            return
+
+        if len(self._queue) >= self.max_queue and not self._make_room(kind):
+            return
+
+        item: List[Optional[str]] = [kind, frame]
+        self._queue.append(item)
+        if kind in COALESCE_EVENTS:
+            self._pending_budget = item
+        stats.max_depth = max(stats.max_depth, len(self._queue))
+        self._wakeup.set()
+
+    def _make_room(self, kind: Optional[str]) -> bool:
+        """Apply the overflow policy. True -> the incoming frame may be queued."""
+        if self.overflow == "drop":
+            for i, item in enumerate(self._queue):
+                if item[0] in STROKE_EVENTS:
+                    del self._queue[i]
+                    self.stats.dropped += 1
+                    return True
+            if kind in STROKE_EVENTS:
+                self.stats.dropped += 1
+                return False
+        # nothing safe to drop: cut the slow consumer loose
+        self.stats.slow_consumer = True
+        self._closing = True
+        self._queue.clear()
+        self._pending_budget = None
+        self._wakeup.set()
+        return False
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            if not self._queue:
+                self._wakeup.clear()
+                if self._closing:
+                    try:
+                        await self.ws.close(code=4002)
+                    except Exception:
+                        pass
+                    return
+                continue
+            item = self._queue.popleft()
+            if item is self._pending_budget:
+                self._pending_budget = None
+            started = time.perf_counter()
+            try:
+                await self.ws.send_text(item[1])
+            except Exception:
+                # dead socket; ws.py will cleanup on disconnect
+                self._closing = True
+                self._queue.clear()
+                return
+            self.stats.sent += 1
+            self.stats.max_send_ms = max(self.stats.max_send_ms, (time.perf_counter() - started) * 1000.0)
+
+
+def pack_frames(frames: List[str], batch: bool) -> List[str]:
+    """
+    Encoded events -> frames to send.
+    Batching clients get {"type":"batch","events":[...]} when there is more than one.
+    """
+    if batch and len(frames) > 1:
+        return ['{"type":"batch","events":' + jsonx.join_array(frames) + "}"]
+    return frames
+
+
+def _event_kind(event: Any) -> Optional[str]:
+    return event.get("type") if isinstance(event, dict) else None
 
 
 class WSManager:
     """
     In-memory connection registry.
-    - room_code -> pid -> websocket
+    - room_code -> pid -> Conn (websocket + outbound queue)
     Transport-only: no Redis, no domain rules.
+    Events are encoded once per fan-out, not once per recipient; sending only
+    enqueues, each Conn's writer task does the socket I/O.
+    Copy-on-write: each room maps to an immutable snapshot that writers
+    (add/replace/remove, under _lock) swap out, so sends never take the lock.
     """
-    def __init__(self) -> None:
-        self._rooms: Dict[str, Dict[str, Conn]] = {}
+    def __init__(self, max_queue: int = 256, overflow: OverflowPolicy = "drop") -> None:
+        self._rooms: Dict[str, Mapping[str, Conn]] = {}
         self._lock = asyncio.Lock()
+        self.max_queue = max_queue
+        self.overflow = overflow
+
+    def _new_conn(self, pid: str, ws: WebSocket, batch: bool) -> Conn:
+        conn = Conn(pid, ws, batch=batch, max_queue=self.max_queue, overflow=self.overflow)
+        conn.start()
+        return conn
+
+    def _conns(self, room_code: str) -> Mapping[str, Conn]:
+        return self._rooms.get(room_code, _NO_CONNS)
+
+    def _publish(self, room_code: str, room: Dict[str, Conn]) -> None:
+        # caller holds _lock
+        if room:
+            self._rooms[room_code] = MappingProxyType(room)
+        else:
+            self._rooms.pop(room_code, None)
 
-    async def add(self, room_code: str, pid: str, ws: WebSocket) -> None:
+    async def add(self, room_code: str, pid: str, ws: WebSocket, batch: bool = False) -> None:
         async with self._lock:
-            self._rooms.setdefault(room_code, {})[pid] = Conn(pid=pid, ws=ws)
+            room = dict(self._conns(room_code))
+            displaced = room.get(pid)
+            room[pid] = self._new_conn(pid, ws, batch)
+            self._publish(room_code, room)
+        if displaced is not None:
+            await displaced.stop()
 
     async def replace_pid(self, room_code: str, old_pid: str, new_pid: str, ws: WebSocket) -> None:
         async with self._lock:
-            room = self._rooms.setdefault(room_code, {})
-            if old_pid in room:
-                room.pop(old_pid, None)
-            room[new_pid] = Conn(pid=new_pid, ws=ws)
+            room = dict(self._conns(room_code))
+            conn = room.pop(old_pid, None)
+            stale = None
+            if conn is None or conn.ws is not ws:
+                stale, conn = conn, self._new_conn(new_pid, ws, conn.batch if conn else False)
+            conn.pid = new_pid
+            displaced = room.get(new_pid)
+            room[new_pid] = conn
+            self._publish(room_code, room)
+        for c in (stale, displaced):
+            if c is not None and c is not conn:
+                await c.stop()
 
     async def remove(self, room_code: str, pid: str) -> None:
         async with self._lock:
-            room = self._rooms.get(room_code)
-            if not room:
+            room = dict(self._conns(room_code))
+            conn = room.pop(pid, None)
+            if conn is None:
                 return
-            room.pop(pid, None)
-            if not room:
-                self._rooms.pop(room_code, None)
+            self._publish(room_code, room)
+        await conn.stop()
+
+    def _enqueue(self, conn: Conn, items: List[Tuple[Optional[str], str]]) -> None:
+        if conn.batch and len(items) > 1:
+            kinds = {kind for kind, _ in items}
+            kind = kinds.pop() if len(kinds) == 1 else None
+            for frame in pack_frames([frame for _, frame in items], True):
+                conn.enqueue(frame, kind)
+            return
+        for kind, frame in items:
+            conn.enqueue(frame, kind)
 
     async def send_to_pid(self, room_code: str, pid: str, event: dict) -> None:
-        async with self._lock:
-            room = self._rooms.get(room_code, {})
-            conn = room.get(pid)
+        await self.send_events(room_code, pid, [event])
+
+    async def send_to_pids(self, room_code: str, pids: Iterable[str], event: dict) -> None:
+        """One event to several connections, encoded once."""
+        conns = self._conns(room_code)
+        frame = jsonx.dumps(event)
+        kind = _event_kind(event)
+        for pid in pids:
+            conn = conns.get(pid)
+            if conn is not None:
+                conn.enqueue(frame, kind)
+
+    async def send_events(self, room_code: str, pid: str, events: Iterable[dict]) -> None:
+        """Unicast events to one connection, in order (one batch frame if it opted in)."""
+        conn = self._conns(room_code).get(pid)
         if conn is None:
             return
-        await conn.ws.send_json(event)
+        self._enqueue(conn, [(_event_kind(e), jsonx.dumps(e)) for e in events])
 
     async def broadcast(self, room_code: str, event: dict, exclude_pid: Optional[str] = None) -> None:
-        # copy conns under lock, send outside lock
-        async with self._lock:
-            room = self._rooms.get(room_code, {})
-            conns = list(room.values())
+        await self.deliver(room_code, [event], exclude_pid=exclude_pid)
+
+    async def deliver(self, room_code: str, events: Iterable[dict], exclude_pid: Optional[str] = None) -> None:
+        """
+        Fan out dumped room events.
+        Events carrying "targets" go only to those pids (without the key);
+        everything else is broadcast (excluding exclude_pid).
+        Each event is encoded once and enqueued per recipient; never waits on a socket.
+        """
+        conns = self._conns(room_code)
+        if not conns:
+            return
 
-        for c in conns:
-            if exclude_pid and c.pid == exclude_pid:
+        per_pid: Dict[str, List[Tuple[Optional[str], str]]] = {}
+        for e in events:
+            kind = _event_kind(e)
+            if isinstance(e, dict) and "targets" in e:
+                frame = jsonx.dumps({k: v for k, v in e.items() if k != "targets"})
+                for t in e.get("targets") or []:
+                    if t in conns:
+                        per_pid.setdefault(t, []).append((kind, frame))
                 continue
-            try:
-                await c.ws.send_json(event)
-            except Exception:
-                # if a socket is dead, ignore; ws.py will cleanup on disconnect
-                pass
+            frame = jsonx.dumps(e)
+            for pid in conns:
+                if exclude_pid and pid == exclude_pid:
+                    continue
+                per_pid.setdefault(pid, []).append((kind, frame))
+
+        for pid, items in per_pid.items():
+            self._enqueue(conns[pid], items)
 
     async def close_pid(self, room_code: str, pid: str, code: int = 4000, reason: str = "kicked") -> None:
         """
         Close a specific player's websocket and remove from registry.
         """
-        async with self._lock:
-            room = self._rooms.get(room_code, {})
-            conn = room.get(pid)
+        conn = self._conns(room_code).get(pid)
         if conn is None:
             return
         try:
@@ -82,6 +320,15 @@ class WSManager:
             pass
         await self.remove(room_code, pid)
 
+    def pids(self, room_code: str) -> List[str]:
+        return list(self._conns(room_code))
+
     async def room_size(self, room_code: str) -> int:
-        async with self._lock:
-            return len(self._rooms.get(room_code, {}))
+        return len(self._conns(room_code))
+
+    def metrics(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Per-connection queue depth and backpressure counters (admin/debug)."""
+        return {
+            room_code: {pid: c.stats.as_dict(c.depth) for pid, c in room.items()}
+            for room_code, room in list(self._rooms.items())
+        }
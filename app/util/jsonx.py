@@ -0,0 +1,72 @@
+# app/util/jsonx.py
+from __future__ import annotations
+
+import json
+import re
+import secrets
+from typing import Any, Callable, Iterable
+
+try:  # optional fast encoder
+    import orjson
+except ImportError:  # pragma: no cover - depends on environment
+    orjson = None
+
+
+class RawJSON:
+    """
+    Already-encoded JSON text, written into the output of dumps() verbatim.
+    Used for stored ops: Redis holds them as JSON, so they never need parsing on read.
+    """
+    __slots__ = ("text",)
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+    @classmethod
+    def array(cls, items: Iterable[str]) -> "RawJSON":
+        return cls(join_array(items))
+
+    def loads(self) -> Any:
+        return json.loads(self.text)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, RawJSON) and other.text == self.text
+
+    def __repr__(self) -> str:
+        return f"RawJSON({self.text!r})"
+
+
+def _encode(obj: Any, default: Callable[[Any], Any]) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(obj, default=default, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+
+
+def dumps(obj: Any) -> str:
+    """
+    Compact JSON (same format as starlette's send_json), with RawJSON values
+    spliced in as-is. Uses orjson when installed.
+    """
+    raws: list[str] = []
+    nonce = ""
+
+    def _default(o: Any) -> Any:
+        nonlocal nonce
+        if isinstance(o, RawJSON):
+            if not nonce:
+                # per-call marker so user strings can never collide with it
+                nonce = "\x00raw" + secrets.token_hex(8)
+            raws.append(o.text)
+            return f"{nonce}:{len(raws) - 1}"
+        raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+    text = _encode(obj, _default)
+    if not raws:
+        return text
+    marker = _encode(nonce, _default)[1:-1]
+    return re.sub('"' + re.escape(marker) + r':(\d+)"', lambda m: raws[int(m.group(1))], text)
+
+
+def join_array(frames: Iterable[str]) -> str:
+    """JSON array text from already-encoded items."""
+    return "[" + ",".join(frames) + "]"
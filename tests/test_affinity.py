@@ -0,0 +1,173 @@
+import asyncio
+
+import pytest
+
+from app.transport import affinity
+from app.transport.affinity import AffinityRouter, HashRing
+
+
+def test_hash_ring_moves_only_rooms_of_changed_node():
+    rooms = [f"R{i}" for i in range(300)]
+    before = HashRing(["w1", "w2", "w3"])
+    after = HashRing(["w1", "w2", "w3", "w4"])
+
+    moved = [r for r in rooms if before.node_for(r) != after.node_for(r)]
+
+    assert all(after.node_for(r) == "w4" for r in moved)
+    assert 0 < len(moved) < len(rooms) / 2
+    assert HashRing([]).node_for("R1") is None
+
+
+class FakePubSub:
+    def __init__(self, broker):
+        self.broker = broker
+        self.inbox = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.broker.subs.setdefault(channel, set()).add(self)
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=0.0):
+        try:
+            return await asyncio.wait_for(self.inbox.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self):
+        for subs in self.broker.subs.values():
+            subs.discard(self)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.subs = {}
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+    async def publish(self, channel, payload):
+        subs = list(self.subs.get(channel, ()))
+        for ps in subs:
+            ps.inbox.put_nowait({"type": "message", "data": payload.encode("utf-8")})
+        return len(subs)
+
+
+class FakeRepo:
+    """Shared by every worker, like Redis."""
+
+    def __init__(self):
+        self.workers = set()
+        self.owners = {}
+        self.calls = []
+
+    async def heartbeat_worker(self, node_id, ttl_ms):
+        self.workers.add(node_id)
+        return sorted(self.workers)
+
+    async def get_room_owner(self, room_code):
+        self.calls.append(("get_owner", room_code))
+        return self.owners.get(room_code)
+
+    async def acquire_room_lease(self, room_code, node_id, ttl_ms):
+        self.calls.append(("acquire", room_code))
+        holder = self.owners.get(room_code)
+        if holder is None or holder == node_id:
+            self.owners[room_code] = node_id
+            return node_id
+        return holder
+
+
+class FakeApp:
+    def __init__(self, repo):
+        self.state = type("State", (), {"repo": repo})()
+
+
+@pytest.mark.asyncio
+async def test_non_owner_forwards_to_owner_and_gets_its_result(monkeypatch):
+    ran_on = []
+
+    async def fake_dispatch(*, app, room_code, pid, raw):
+        ran_on.append(app.name)
+        return [{"type": "ack", "node": app.name}], [{"type": "guess_chat", "pid": pid}]
+
+    monkeypatch.setattr(affinity, "dispatch_message", fake_dispatch)
+
+    r, repo = FakeRedis(), FakeRepo()
+    routers = {}
+    for name in ("w1", "w2"):
+        app = FakeApp(repo)
+        app.name = name
+        routers[name] = AffinityRouter(app, r, node_id=name, rpc_timeout_sec=1.0)
+    for router in routers.values():
+        await router.start()
+    for router in routers.values():
+        await router.refresh_ring()
+
+    try:
+        owner = routers["w1"].ring.node_for("ROOM1")
+        other = "w2" if owner == "w1" else "w1"
+
+        to_sender, to_room = await routers[other].dispatch("ROOM1", "p1", {"type": "guess"})
+
+        assert ran_on == [owner]
+        assert to_sender == [{"type": "ack", "node": owner}]
+        assert to_room == [{"type": "guess_chat", "pid": "p1"}]
+        assert repo.owners["ROOM1"] == owner
+        assert await routers[owner].owns("ROOM1")
+        assert not await routers[other].owns("ROOM1")
+
+        # owner dies: its lease is only taken over once it has expired
+        await routers[owner].stop()
+        repo.workers.discard(owner)
+        await routers[other].refresh_ring()
+        to_sender, _ = await routers[other].dispatch("ROOM1", "p1", {"type": "guess"})
+        assert to_sender[0]["code"] == "ROOM_UNAVAILABLE"
+        assert repo.owners["ROOM1"] == owner
+        del repo.owners["ROOM1"]  # PX lease expired
+        await routers[other].dispatch("ROOM1", "p1", {"type": "guess"})
+        assert ran_on[-1] == other
+        assert repo.owners["ROOM1"] == other
+    finally:
+        for router in routers.values():
+            await router.stop()
+
+
+@pytest.mark.asyncio
+async def test_owner_routes_from_its_lease_and_renews_it_on_heartbeat(monkeypatch):
+    async def fake_dispatch(*, app, room_code, pid, raw):
+        return [{"type": "ack"}], []
+
+    monkeypatch.setattr(affinity, "dispatch_message", fake_dispatch)
+
+    repo = FakeRepo()
+    router = AffinityRouter(FakeApp(repo), FakeRedis(), node_id="w1")
+    await router.refresh_ring()
+
+    await router.dispatch("ROOM1", "p1", {"type": "guess"})
+    await router.dispatch("ROOM2", "p1", {"type": "guess"})
+    assert repo.calls == [("get_owner", "ROOM1"), ("acquire", "ROOM1"), ("get_owner", "ROOM2"), ("acquire", "ROOM2")]
+
+    # fresh lease: no Redis round trip per message
+    repo.calls.clear()
+    for _ in range(3):
+        await router.dispatch("ROOM1", "p1", {"type": "guess"})
+    assert repo.calls == []
+    assert router.owns_locally("ROOM1")
+
+    # the beat renews rooms used since the last one (all of them, the first time)
+    await router.renew_leases()
+    assert sorted(repo.calls) == [("acquire", "ROOM1"), ("acquire", "ROOM2")]
+
+    # ROOM2 went idle: its lease is left to lapse, the next message reclaims it
+    repo.calls.clear()
+    await router.dispatch("ROOM1", "p1", {"type": "guess"})
+    await router.renew_leases()
+    assert repo.calls == [("acquire", "ROOM1")]
+    assert router.owns_locally("ROOM1")
+    assert not router.owns_locally("ROOM2")
+
+    # a lease someone else took over is dropped on renewal
+    repo.owners["ROOM1"] = "w2"
+    await router.dispatch("ROOM1", "p1", {"type": "guess"})
+    await router.renew_leases()
+    assert not router.owns_locally("ROOM1")
+    assert await router.owner_of("ROOM1") == "w2"
@@ -0,0 +1,106 @@
+import pytest
+
+from app.store.models import PlayerStore
+from app.store.room_context import RoomContext, activate
+from app.transport import dispatcher
+from app.transport.dispatcher import DispatchStats, dispatch_message, register
+
+
+class FakeRepo:
+    def __init__(self, mode="VS", players=None):
+        self.mode = mode
+        self.players = players or {}
+        self.mode_reads = 0
+
+    def room_context(self, room_code, pid=None):
+        return activate(RoomContext(self, room_code, pid))
+
+    async def get_room_mode(self, room_code):
+        self.mode_reads += 1
+        return self.mode
+
+    async def get_player(self, room_code, pid):
+        return self.players.get(pid)
+
+
+class FakeState:
+    def __init__(self, repo):
+        self.repo = repo
+
+
+class FakeApp:
+    def __init__(self, repo):
+        self.state = FakeState(repo)
+
+
+def _handler(name):
+    async def handle(*, app, room_code, pid, msg):
+        return [{"type": name}], []
+
+    return handle
+
+
+@pytest.fixture
+def routes(monkeypatch):
+    stats = DispatchStats()
+    monkeypatch.setattr(dispatcher, "_ROUTES", {})
+    monkeypatch.setattr(dispatcher, "_TIMING_HOOKS", [stats])
+    register("phase_tick", _handler("vs_tick"), mode="VS", unsupported="phase_tick only for VS/SINGLE rooms")
+    register("phase_tick", _handler("single_tick"), mode="SINGLE")
+    register("heartbeat", _handler("beat"), guards=dispatcher.PRESENCE_GUARDS)
+    return stats
+
+
+def _player(pid, **fields):
+    return PlayerStore(pid=pid, name=pid, joined_at=1, last_seen=1, **fields)
+
+
+@pytest.mark.asyncio
+async def test_routes_by_type_and_room_mode(routes):
+    repo = FakeRepo(mode="SINGLE", players={"p1": _player("p1")})
+    app = FakeApp(repo)
+
+    to_sender, _ = await dispatch_message(app=app, room_code="R1", pid="p1", raw={"type": "phase_tick"})
+    assert to_sender == [{"type": "single_tick"}]
+
+    to_sender, _ = await dispatch_message(app=app, room_code="R1", pid="p1", raw={"type": "heartbeat"})
+    assert to_sender == [{"type": "beat"}]
+    assert repo.mode_reads == 1  # mode-independent routes skip the lookup
+
+    repo.mode = None
+    to_sender, _ = await dispatch_message(app=app, room_code="R1", pid="p1", raw={"type": "phase_tick"})
+    assert to_sender[0]["code"] == "NOT_IMPLEMENTED"
+    assert to_sender[0]["message"] == "phase_tick only for VS/SINGLE rooms"
+
+    to_sender, _ = await dispatch_message(app=app, room_code="R1", pid="p1", raw={"type": "guess", "text": "x"})
+    assert to_sender[0]["code"] == "NOT_IMPLEMENTED"
+
+    assert routes.metrics()["phase_tick"]["count"] == 2
+    assert routes.metrics()["heartbeat"]["count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_guards_run_in_declared_order(routes):
+    repo = FakeRepo(players={
+        "kicked": _player("kicked", kicked=True),
+        "muted": _player("muted", muted_until=10**12),
+    })
+    app = FakeApp(repo)
+
+    to_sender, _ = await dispatch_message(app=app, room_code="R1", pid=None, raw={"type": "phase_tick"})
+    assert to_sender[0]["code"] == "NO_PID"
+    to_sender, _ = await dispatch_message(app=app, room_code="R1", pid="kicked", raw={"type": "heartbeat"})
+    assert to_sender[0]["code"] == "KICKED"
+    to_sender, _ = await dispatch_message(app=app, room_code="R1", pid="muted", raw={"type": "phase_tick"})
+    assert to_sender[0]["code"] == "MUTED"
+    to_sender, _ = await dispatch_message(app=app, room_code="R1", pid="muted", raw={"type": "heartbeat"})
+    assert to_sender == [{"type": "beat"}]
+    assert repo.mode_reads == 0
+
+
+def test_every_incoming_type_has_a_route():
+    from app.transport.protocols import _INCOMING_BY_TYPE
+
+    assert set(_INCOMING_BY_TYPE) == set(dispatcher._ROUTES)
+    with pytest.raises(ValueError):
+        register("draw_op", _handler("dup"), mode="VS")
@@ -0,0 +1,146 @@
+import asyncio
+import json
+
+import pytest
+
+from app.store.redis_keys import RK
+from app.transport.fanout import LocalFanout, RedisFanout
+from app.transport.ws_manager import WSManager
+
+
+class FakePubSub:
+    def __init__(self, broker):
+        self.broker = broker
+        self.channels = set()
+        self.inbox = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.channels.add(channel)
+        self.broker.subs.setdefault(channel, set()).add(self)
+
+    async def unsubscribe(self, channel):
+        self.channels.discard(channel)
+        self.broker.subs.get(channel, set()).discard(self)
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=0.0):
+        try:
+            return await asyncio.wait_for(self.inbox.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self):
+        return None
+
+
+class FakeRedis:
+    """Shared pub/sub broker; each node gets its own client view."""
+
+    def __init__(self):
+        self.subs = {}
+        self.published = []
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+    async def publish(self, channel, payload):
+        self.published.append(channel)
+        for ps in list(self.subs.get(channel, ())):
+            ps.inbox.put_nowait({"type": "message", "channel": channel, "data": payload.encode("utf-8")})
+        return len(self.subs.get(channel, ()))
+
+
+class FakeWS:
+    def __init__(self):
+        self.sent = []
+        self.closed = None
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.closed = code
+
+
+async def _drain():
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_local_fanout_delivers_in_process():
+    wsman = WSManager()
+    ws = FakeWS()
+    await wsman.add("R1", "p1", ws)
+    fanout = LocalFanout(wsman)
+
+    await fanout.publish("R1", [{"type": "phase_changed"}])
+    await _drain()
+
+    assert ws.sent == [{"type": "phase_changed"}]
+
+
+@pytest.mark.asyncio
+async def test_redis_fanout_reaches_other_node_once():
+    r = FakeRedis()
+    nodes = []
+    for name in ("n1", "n2"):
+        wsman = WSManager()
+        fanout = RedisFanout(wsman, r, node_id=name)
+        await fanout.start()
+        nodes.append((wsman, fanout))
+    (wsman1, fan1), (wsman2, fan2) = nodes
+
+    ws1, ws2 = FakeWS(), FakeWS()
+    await wsman1.add("R1", "p1", ws1)
+    await fan1.join("R1")
+    await wsman2.add("R1", "p2", ws2)
+    await fan2.join("R1")
+
+    await fan1.publish("R1", [{"type": "op_broadcast", "by": "p1"}], exclude_pid="p1")
+    await fan2.publish("R1", [{"type": "guess_chat", "pid": "p2"}])
+    await _drain()
+
+    assert ws1.sent == [{"type": "guess_chat", "pid": "p2"}]
+    # local delivery skips the round-trip, so order across nodes is not fixed
+    assert sorted(e["type"] for e in ws2.sent) == ["guess_chat", "op_broadcast"]
+
+    # last local connection gone -> node stops listening to the room
+    await wsman2.remove("R1", "p2")
+    await fan2.leave("R1")
+    assert r.subs[RK("R1").fanout()] == {fan1._pubsub}
+
+    await fan1.stop()
+    await fan2.stop()
+
+
+@pytest.mark.asyncio
+async def test_redis_fanout_closes_sockets_on_every_node():
+    r = FakeRedis()
+    nodes = []
+    for name in ("n1", "n2"):
+        wsman = WSManager()
+        fanout = RedisFanout(wsman, r, node_id=name)
+        await fanout.start()
+        nodes.append((wsman, fanout))
+    (wsman1, fan1), (wsman2, fan2) = nodes
+
+    ws1, ws2, ws3 = FakeWS(), FakeWS(), FakeWS()
+    await wsman1.add("R1", "p1", ws1)
+    await fan1.join("R1")
+    await wsman2.add("R1", "p2", ws2)
+    await wsman2.add("R1", "p3", ws3)
+    await fan2.join("R1")
+
+    # kick runs on n1 (room owner), the target is connected to n2
+    await fan1.close_pid("R1", "p2", code=4001, reason="kicked")
+    await _drain()
+    assert (ws1.closed, ws2.closed, ws3.closed) == (None, 4001, None)
+    assert wsman2.pids("R1") == ["p3"]
+
+    await fan1.close_pid("R1", None, code=4000, reason="admin_close")
+    await _drain()
+    assert (ws1.closed, ws3.closed) == (4000, 4000)
+    assert wsman1.pids("R1") == [] and wsman2.pids("R1") == []
+
+    await fan1.stop()
+    await fan2.stop()
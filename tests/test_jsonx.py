@@ -0,0 +1,21 @@
+import json
+
+from app.util.jsonx import RawJSON, dumps
+
+
+def test_dumps_matches_compact_json_without_raw():
+    event = {"type": "guess_chat", "text": "héllo", "n": [1, 2]}
+    assert dumps(event) == json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+
+
+def test_dumps_splices_raw_fragments_verbatim():
+    ops = RawJSON.array(['{"seq":1,"t":"line"}', '{"canvas":"A","seq":2,"t":"clear"}'])
+    text = dumps({"type": "room_snapshot", "ops": ops, "empty": RawJSON.array([])})
+
+    assert '"ops":[{"seq":1,"t":"line"},{"canvas":"A","seq":2,"t":"clear"}]' in text
+    assert json.loads(text)["empty"] == []
+
+
+def test_dumps_leaves_lookalike_strings_alone():
+    text = dumps({"a": "\x00raw:0", "ops": RawJSON("[]")})
+    assert json.loads(text) == {"a": "\x00raw:0", "ops": []}
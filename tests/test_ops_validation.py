@@ -38,3 +38,84 @@ def test_validate_draw_op_accepts_payload_in_p():
     ok, op_type, err_code, err_msg = validate_draw_op({"t": "line", "p": {"pts": [[0, 0], [1, 1]]}})
     assert ok is True
     assert op_type == "line"
+
+
+def test_packed_points_round_trip_and_size():
+    import json
+    import math
+
+    from app.domain.common.stroke_codec import decode_points, encode_points
+
+    pts = [[400 + round(200 * math.cos(i / 50), 1), 300 + round(150 * math.sin(i / 40), 1)] for i in range(1000)]
+    pz = encode_points(pts, q=10)
+
+    assert decode_points(pz, q=10) == [[round(x * 10) / 10, round(y * 10) / 10] for x, y in pts]
+    assert len(pz) * 4 < len(json.dumps(pts))
+    assert decode_points(encode_points([[-5, 3], [0, 0]])) == [[-5, 3], [0, 0]]
+
+
+def test_validate_draw_op_accepts_packed_line():
+    from app.domain.common.ops import line_points
+    from app.domain.common.stroke_codec import encode_points
+
+    op = {"t": "line", "p": {"pz": encode_points([[0, 0], [3, 4], [6, 8]]), "q": 1}}
+    ok, op_type, err_code, err_msg = validate_draw_op(op)
+    assert ok is True
+    assert line_points(op) == [[0, 0], [3, 4], [6, 8]]
+
+    ok, _, err_code, _ = validate_draw_op({"t": "line", "pz": "!!not-base64"})
+    assert ok is False
+    assert err_code == "INVALID_LINE"
+    ok, _, err_code, _ = validate_draw_op({"t": "line", "pz": encode_points([[1, 1]])})
+    assert err_code == "INVALID_LINE"
+    ok, _, err_code, _ = validate_draw_op({"t": "line", "pz": encode_points([[0, 0], [1, 1]])[:-1]})
+    assert err_code == "INVALID_LINE"
+
+
+def test_rdp_simplifies_lines_and_keeps_endpoints():
+    import math
+
+    from app.domain.common import simplify
+    from app.domain.common.simplify import StrokeSimplifier, rdp
+
+    straight = [[i, 0.1 * (i % 2)] for i in range(100)]
+    assert rdp(straight, 0.5) == [[0, 0.0], [99, 0.1]]
+    corner = [[i, 0] for i in range(10)] + [[9, j] for j in range(1, 10)]
+    assert rdp(corner, 0.5) == [[0, 0], [9, 0], [9, 9]]
+    assert simplify._rdp_keep_py(corner, 0.5) == [p in ([0, 0], [9, 0], [9, 9]) for p in corner]
+
+    arc = [[100 * math.cos(i / 100), 100 * math.sin(i / 100)] for i in range(300)]
+    simplifier = StrokeSimplifier(0.75)
+    out = simplifier.simplify_op({"t": "line", "p": {"pts": arc, "color": "#000"}})
+    assert out["p"]["color"] == "#000"
+    assert out["p"]["pts"][0] == arc[0] and out["p"]["pts"][-1] == arc[-1]
+    assert simplifier.metrics()["reduction"] > 0.7
+
+    short = {"t": "line", "pts": [[0, 0], [1, 1], [2, 0]]}
+    assert simplifier.simplify_op(short) is short
+    junk = {"t": "line", "pts": [[0, 0], ["a", 1]] * 10}
+    assert simplifier.simplify_op(junk) is junk
+
+
+def test_simplify_keeps_packed_form():
+    from app.domain.common.simplify import StrokeSimplifier
+    from app.domain.common.stroke_codec import decode_points, encode_points
+
+    op = {"t": "line", "pz": encode_points([[i, 2 * i] for i in range(50)], q=10), "q": 10}
+    out = StrokeSimplifier(0.5).simplify_op(op)
+    assert decode_points(out["pz"], 10) == [[0.0, 0.0], [49.0, 98.0]]
+    assert out["q"] == 10
+
+
+def test_rdp_numpy_matches_pure_python():
+    import random
+
+    import pytest
+
+    pytest.importorskip("numpy")
+    from app.domain.common import simplify
+
+    rng = random.Random(2)
+    pts = [[rng.uniform(0, 100), rng.uniform(0, 100)] for _ in range(500)]
+    for eps in (0.5, 2, 10):
+        assert simplify._rdp_keep_np(pts, eps) == simplify._rdp_keep_py(pts, eps)
@@ -0,0 +1,729 @@
+import asyncio
+import json
+
+import fakeredis
+import pytest
+
+from app.store.models import DrawOp, PlayerStore, RoomHeaderStore
+from app.store.redis_keys import RK, room_code_from_header_key
+from redis.crc import key_slot
+from app.store.redis_repo import RedisRepo
+from app.store.scripts import load_script_sources
+
+
+class FakeRedis:
+    """
+    In-memory Redis (fakeredis, scripts.lua runs on its Lua engine) that counts
+    round trips: one per awaited command, one per pipeline execute().
+    Every script is loaded before the first command, so EVALSHA never misses.
+    """
+
+    def __init__(self):
+        self.r = fakeredis.aioredis.FakeRedis()
+        self.round_trips = 0
+        self._loaded = False
+
+    async def _load_scripts(self):
+        if not self._loaded:
+            self._loaded = True
+            for src in load_script_sources().values():
+                await self.r.script_load(src)
+
+    def __getattr__(self, name):
+        impl = getattr(self.r, name)
+
+        async def call(*args, **kwargs):
+            await self._load_scripts()
+            self.round_trips += 1
+            return await impl(*args, **kwargs)
+
+        return call
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self, self.r.pipeline(transaction=transaction))
+
+
+class FakePipeline:
+    def __init__(self, r, pipe):
+        self.r = r
+        self.pipe = pipe
+
+    def __getattr__(self, name):
+        return getattr(self.pipe, name)
+
+    async def execute(self):
+        await self.r._load_scripts()
+        self.r.round_trips += 1
+        return await self.pipe.execute()
+
+
+async def _seed(repo, r):
+    header = RoomHeaderStore(mode="VS", state="IN_GAME", cap=8, created_at=1, last_activity=1, gm_pid="gm", round_no=2)
+    await r.hset(RK("R1").room(), mapping=header.model_dump(exclude_none=True))
+    await repo.add_player("R1", PlayerStore(pid="p1", name="P1", joined_at=1, last_seen=1, role="drawerA", team="A"))
+    await repo.set_game_fields("R1", phase="DRAW", draw_end_at=100, team_guessed={"A": False})
+    await repo.set_budget_fields("R1", A=3, B=2)
+    await repo.set_round_config("R1", {"secret_word": "apple", "max_rounds": 5})
+
+
+@pytest.mark.asyncio
+async def test_load_room_context_reads_all_parts_in_one_round_trip():
+    r = FakeRedis()
+    repo = RedisRepo(r)
+    await _seed(repo, r)
+
+    r.round_trips = 0
+    loaded = await repo.load_room_context("R1", "p1")
+
+    assert r.round_trips == 1
+    assert loaded.header.round_no == 2
+    assert loaded.game["phase"] == "DRAW"
+    assert loaded.game["team_guessed"] == {"A": False}
+    assert loaded.player.role == "drawerA"
+    assert loaded.budget == {"A": 3, "B": 2}
+    assert loaded.round_config["secret_word"] == "apple"
+
+
+@pytest.mark.asyncio
+async def test_load_room_context_only_requested_parts():
+    r = FakeRedis()
+    repo = RedisRepo(r)
+    await _seed(repo, r)
+
+    loaded = await repo.load_room_context("R1", None, parts=("header", "player", "budget"))
+
+    assert loaded.parts == frozenset({"header", "budget"})
+    assert loaded.game is None
+    assert loaded.player is None
+    assert loaded.budget == {"A": 3, "B": 2}
+
+
+@pytest.mark.asyncio
+async def test_write_batch_flushes_in_one_round_trip():
+    r = FakeRedis()
+    repo = RedisRepo(r, room_ttl_sec=60)
+    await _seed(repo, r)
+
+    r.round_trips = 0
+    op = DrawOp(t="line", p={"pts": [[0, 0], [1, 1]]}, ts=5, by="p1")
+    await (
+        repo.write_batch("R1")
+        .append_op_vs("A", op)
+        .set_game_fields(phase="GUESS")
+        .update_room_fields(last_activity=5)
+        .refresh_room_ttl(mode="VS")
+        .execute()
+    )
+
+    assert r.round_trips == 1
+    assert [o.by for o in await repo.get_ops_vs("R1", "A")] == ["p1"]
+    assert (await repo.get_game("R1"))["phase"] == "GUESS"
+    assert (await repo.get_room_header("R1")).last_activity == 5
+    assert await r.ttl(RK("R1").game()) == 60
+
+
+@pytest.mark.asyncio
+async def test_refresh_room_ttl_is_one_round_trip():
+    r = FakeRedis()
+    repo = RedisRepo(r, room_ttl_sec=60)
+    await _seed(repo, r)
+
+    r.round_trips = 0
+    await repo.refresh_room_ttl("R1", mode="VS")
+
+    assert r.round_trips == 1
+    for key in RK("R1").all_room_keys(mode="VS"):
+        assert await r.ttl(key) == (60 if await r.exists(key) else -2)
+
+
+@pytest.mark.asyncio
+async def test_refresh_room_ttl_skipped_within_window_until_new_key_written():
+    r = FakeRedis()
+    repo = RedisRepo(r, room_ttl_sec=100, ttl_refresh_fraction=0.5)
+    await _seed(repo, r)
+    await repo.refresh_room_ttl("R1", mode="VS")
+
+    r.round_trips = 0
+    await repo.refresh_room_ttl("R1", mode="VS")
+    assert r.round_trips == 0
+
+    # a write that may create a key forces the next refresh
+    await repo.vote_next_add("R1", "p1")
+    r.round_trips = 0
+    await repo.refresh_room_ttl("R1", mode="VS")
+    assert r.round_trips == 1
+
+    # mode change is never skipped
+    r.round_trips = 0
+    await repo.refresh_room_ttl("R1", mode="SINGLE")
+    assert r.round_trips == 1
+
+
+def test_room_keys_share_one_cluster_slot():
+    keys = set(RK("R1").all_room_keys(mode="VS")) | set(RK("R1").all_room_keys(mode="SINGLE"))
+    assert {key_slot(k.encode("utf-8")) for k in keys} == {key_slot(b"R1")}
+    assert room_code_from_header_key(RK("R1").room()) == "R1"
+    assert room_code_from_header_key(RK("R1", schema=1).room()) == "R1"
+    assert room_code_from_header_key(RK("R1").game()) is None
+
+
+@pytest.mark.asyncio
+async def test_legacy_room_keys_are_migrated_on_first_read():
+    r = FakeRedis()
+    repo = RedisRepo(r)
+    legacy = RK("R1", schema=1)
+    header = RoomHeaderStore(mode="VS", state="WAITING", cap=8, created_at=1, last_activity=1, gm_pid="gm")
+    await r.hset(legacy.room(), mapping=header.model_dump(exclude_none=True))
+    await r.hset(legacy.players(), "p1", PlayerStore(pid="p1", name="P1", joined_at=1, last_seen=1).model_dump_json())
+    await r.rpush(legacy.ops_team("A"), DrawOp(t="line", p={}, ts=1, by="p1").model_dump_json())
+
+    loaded = await repo.load_room_context("R1", "p1", parts=("header", "player"))
+
+    assert loaded.header.mode == "VS"
+    assert loaded.player.name == "P1"
+    assert len(await repo.get_ops_vs("R1", "A")) == 1
+    assert await r.keys("room:R1*") == []
+
+
+@pytest.mark.asyncio
+async def test_missing_room_is_not_migrated():
+    r = FakeRedis()
+    repo = RedisRepo(r)
+    assert await repo.get_room_header("NOPE") is None
+    assert await repo.room_exists("NOPE") is False
+
+
+@pytest.mark.asyncio
+async def test_player_fields_update_without_rewriting_the_record():
+    r = FakeRedis()
+    repo = RedisRepo(r)
+    await repo.add_player("R1", PlayerStore(pid="p1", name="P1", joined_at=1, last_seen=1))
+    await repo.add_player("R1", PlayerStore(pid="p:2", name="P2", joined_at=2, last_seen=2))
+
+    r.round_trips = 0
+    await repo.set_player_connected("R1", "p1", False, 9)
+    assert await repo.incr_player_points("R1", "p1", 2) == 2
+    await repo.update_player_fields("R1", "p:2", role="drawer", team="A")
+    assert r.round_trips == 3
+
+    players = {p.pid: p for p in await repo.list_players("R1")}
+    assert players["p1"].connected is False
+    assert players["p1"].last_seen == 9
+    assert players["p1"].points == 2
+    assert (players["p:2"].role, players["p:2"].team) == ("drawer", "A")
+    assert await repo.get_active_pids("R1") == {"p:2"}
+    assert await repo.incr_player_points("R1", "ghost") is None
+
+
+@pytest.mark.asyncio
+async def test_legacy_player_blob_is_readable_and_unpacked_on_write():
+    r = FakeRedis()
+    repo = RedisRepo(r)
+    legacy = PlayerStore(pid="p1", name="Old", joined_at=1, last_seen=1, points=4)
+    await r.hset(RK("R1").players(), "p1", legacy.model_dump_json())
+
+    assert (await repo.get_player("R1", "p1")).name == "Old"
+    assert [p.pid for p in await repo.list_players("R1")] == ["p1"]
+
+    assert await repo.incr_player_points("R1", "p1") == 5
+    assert not await r.hexists(RK("R1").players(), "p1")
+    player = await repo.get_player("R1", "p1")
+    assert (player.name, player.points) == ("Old", 5)
+
+
+@pytest.mark.asyncio
+async def test_bulk_player_updates_are_one_round_trip():
+    r = FakeRedis()
+    repo = RedisRepo(r)
+    for i in range(5):
+        await repo.add_player("R1", PlayerStore(pid=f"p{i}", name=f"P{i}", joined_at=i, last_seen=i, team="A"))
+        await r.sadd(RK("R1").team("A"), f"p{i}")
+
+    r.round_trips = 0
+    await repo.update_players_bulk("R1", {f"p{i}": {"role": "guesserA"} for i in range(5)})
+    totals = await repo.incr_players_points("R1", {"p0": 1, "p1": 2, "ghost": 1})
+    await repo.clear_team_bulk("R1", ["p0", "p1"])
+    assert r.round_trips == 3
+
+    assert totals == {"p0": 1, "p1": 2}
+    players = {p.pid: p for p in await repo.list_players("R1")}
+    assert {p.role for p in players.values()} == {"guesserA"}
+    assert (players["p0"].team, players["p2"].team) == (None, "A")
+    assert await repo.get_team_members("R1", "A") == {"p2", "p3", "p4"}
+
+
+@pytest.mark.asyncio
+async def test_ops_tail_returns_delta_or_full_resync():
+    r = FakeRedis()
+    repo = RedisRepo(r)
+    for i in range(5):
+        op = DrawOp(t="line", p={"i": i}, ts=i, by="p1")
+        assert await repo.append_op_vs("R1", "A", op, max_ops=3) == i + 1
+        assert op.seq == i + 1
+
+    tail = await repo.get_ops_tail("R1", "A", 3)
+    assert (tail.mode, tail.seq, [o.seq for o in tail.ops]) == ("delta", 5, [4, 5])
+
+    assert (await repo.get_ops_tail("R1", "A", 5)).ops == []
+    raw = await repo.get_ops_tail("R1", "A", 4, raw=True)
+    assert [json.loads(x)["seq"] for x in raw.ops] == [5]
+
+    # seq 2 was trimmed away -> full list
+    tail = await repo.get_ops_tail("R1", "A", 1)
+    assert (tail.mode, [o.seq for o in tail.ops]) == ("full", [3, 4, 5])
+    assert (await repo.get_ops_tail("R1", "A")).mode == "full"
+
+    # after a clear the counter keeps going; older cursors must reset
+    await repo.clear_ops("R1", mode="VS")
+    await repo.append_op_vs("R1", "A", DrawOp(t="clear", p={}, ts=9, by="system"))
+    tail = await repo.get_ops_tail("R1", "A", 5)
+    assert (tail.mode, [o.t for o in tail.ops], tail.seq) == ("full", ["clear"], 7)
+    assert (await repo.get_ops_tail("R1", "A", 7)).mode == "delta"
+    assert (await repo.get_ops_tail("R1", "B", 0)).mode == "full"
+
+
+@pytest.mark.asyncio
+async def test_ops_checkpoint_folds_history_and_serves_full_replays():
+    r = FakeRedis()
+    repo = RedisRepo(r, ops_checkpoint_every=4, ops_checkpoint_keep=1)
+
+    def op(t, by="p1", i=0):
+        return DrawOp(t=t, p={"i": i}, ts=i, by=by)
+
+    await repo.append_op_single("R1", op("line", i=1))
+    await repo.append_op_single("R1", op("clear", by="system"))
+    await repo.append_op_single("R1", op("line", i=3))
+    # seq 4: checkpoint keeps only the newest op in the list
+    await repo.append_op_single("R1", op("line", by="p2", i=4))
+    ckpt = await r.lrange(RK("R1").ops_checkpoint("main"), 0, -1)
+    assert [json.loads(x)["seq"] for x in ckpt] == [3]
+    assert await r.llen(RK("R1").ops()) == 1
+
+    await repo.append_op_single("R1", op("line", by="p2", i=5))
+    await repo.append_op_single("R1", op("undo", by="p1"))
+    await repo.append_op_single("R1", op("line", i=7))
+    await repo.append_op_single("R1", op("line", i=8))  # seq 8: folds 4..7, p1's undo removes seq 3
+    tail = await repo.get_ops_tail("R1", "main")
+    assert (tail.mode, tail.seq, [o.seq for o in tail.ops]) == ("full", 8, [4, 5, 7, 8])
+
+    # a cursor inside the list still gets a delta; an older one replays checkpoint + tail
+    assert [o.seq for o in (await repo.get_ops_tail("R1", "main", 7)).ops] == [8]
+    assert (await repo.get_ops_tail("R1", "main", 5)).mode == "full"
+
+    await repo.clear_ops("R1", mode="SINGLE")
+    assert not await r.exists(RK("R1").ops_checkpoint("main"))
+    assert (await repo.get_ops_tail("R1", "main")).ops == []
+
+
+@pytest.mark.asyncio
+async def test_ops_checkpoint_folds_with_per_author_undo():
+    r = FakeRedis()
+    repo = RedisRepo(r)
+
+    def op(seq, t="line", by="p1"):
+        return json.dumps({"seq": seq, "t": t, "p": {}, "ts": seq, "by": by}, separators=(",", ":"))
+
+    async def seqs(key):
+        return [json.loads(x)["seq"] for x in await r.lrange(key, 0, -1)]
+
+    ops_key, ckpt_key = RK("R1").ops(), RK("R1").ops_checkpoint("main")
+    await r.rpush(ckpt_key, op(1), op(2, by="p2"))
+    # undos drop their own author's latest op, not just the latest one
+    await r.rpush(ops_key, op(3), op(4, "undo", by="p2"), op(5, by="p2"), op(6, "undo"), op(7),
+                  op(8, "undo", by="p3"), op(9))
+    await r.pexpire(ops_key, 60_000)
+
+    assert await repo.checkpoint_ops("R1", "main", keep=2) == (5, 3)
+    assert await seqs(ckpt_key) == [1, 5, 7]
+    assert await seqs(ops_key) == [8, 9]
+    assert 0 < await r.pttl(ckpt_key) <= 60_000  # inherits the ops list's TTL
+    assert await repo.checkpoint_ops("R1", "main", keep=5) == (0, 3)  # nothing to fold
+
+    await r.delete(ckpt_key)
+    await r.rpush(ops_key, op(10, "clear", by="system"), op(11))
+    assert await repo.checkpoint_ops("R1", "main", keep=0) == (4, 1)
+    assert await seqs(ckpt_key) == [11]
+
+    # over 1000 kept ops: RPUSH goes in chunks
+    await r.rpush(ops_key, *(op(12 + i, by=f"p{i % 3}") for i in range(2500)))
+    assert await repo.checkpoint_ops("R1", "main", keep=1) == (2499, 2500)
+    assert await seqs(ckpt_key) == list(range(11, 2511))
+    assert await seqs(ops_key) == [2511]
+
+
+@pytest.mark.asyncio
+async def test_ops_checkpoint_undo_reaches_deep_and_length_is_capped():
+    r = FakeRedis()
+    repo = RedisRepo(r, ops_checkpoint_max=100)
+
+    def op(seq, t="line", by="p1"):
+        return json.dumps({"seq": seq, "t": t, "p": {}, "ts": seq, "by": by}, separators=(",", ":"))
+
+    async def seqs(key):
+        return [json.loads(x)["seq"] for x in await r.lrange(key, 0, -1)]
+
+    ops_key, ckpt_key = RK("R1").ops(), RK("R1").ops_checkpoint("main")
+    await r.rpush(ckpt_key, op(1, by="p2"), *(op(2 + i) for i in range(599)), "legacy")
+    # the undo's target lies several chunks back from the checkpoint tail;
+    # an undo with nothing left to remove changes nothing
+    await r.rpush(ops_key, op(601, "undo", by="p2"), op(602, "undo", by="p3"))
+    repo.ops_checkpoint_max = 0
+    assert await repo.checkpoint_ops("R1", "main", keep=0) == (2, 600)
+    assert (await r.lrange(ckpt_key, -1, -1))[0] == b"legacy"  # kept ops stay as stored
+    await r.rpop(ckpt_key)
+    assert await seqs(ckpt_key) == list(range(2, 601))
+
+    # past the cap the oldest ops drop out
+    repo.ops_checkpoint_max = 100
+    await r.rpush(ops_key, op(603), op(604))
+    assert await repo.checkpoint_ops("R1", "main", keep=1) == (1, 100)
+    assert await seqs(ckpt_key) == list(range(502, 601)) + [603]
+
+
+@pytest.mark.asyncio
+async def test_commit_stroke_vs_charges_team_budget_and_appends():
+    r = FakeRedis()
+    repo = RedisRepo(r, room_ttl_sec=60)
+    await _seed(repo, r)
+
+    def op(i):
+        return DrawOp(t="line", p={"i": i}, ts=i, by="p1")
+
+    r.round_trips = 0
+    res = await repo.commit_stroke("R1", "VS", pid="p1", ts=5, op=op(1), team="A")
+    assert r.round_trips == 1
+    assert (res.ok, res.remaining, res.budget, res.transition, res.seq) == (True, 2, {"A": 2, "B": 2}, False, 1)
+    assert [o.p["i"] for o in await repo.get_ops_vs("R1", "A")] == [1]
+    assert (await repo.get_room_header("R1")).last_activity == 5
+    for key in RK("R1").all_room_keys(mode="VS"):
+        assert await r.ttl(key) == (60 if await r.exists(key) else -2)
+
+    # charge only: nothing stored
+    res = await repo.commit_stroke("R1", "VS", pid="p1", ts=6, op=None, team="B", cost=2)
+    assert (res.ok, res.remaining, res.seq) == (True, 0, 0)
+    assert await repo.get_ops_vs("R1", "B") == []
+
+    res = await repo.commit_stroke("R1", "VS", pid="p1", ts=7, op=op(2), team="A", cost=3)
+    assert (res.ok, res.code, res.remaining) == (False, "NO_BUDGET", 2)
+
+    # the last stroke of the last team with budget ends the phase
+    res = await repo.commit_stroke("R1", "VS", pid="p1", ts=8, op=op(3), team="A", cost=2)
+    assert (res.ok, res.remaining, res.budget, res.transition, res.seq) == (True, 0, {"A": 0, "B": 0}, True, 2)
+    res = await repo.commit_stroke("R1", "VS", pid="p1", ts=9, op=op(4), team="A")
+    assert (res.ok, res.code, res.remaining) == (False, "NO_BUDGET", 0)
+
+    await repo.set_budget_fields("R1", A=3)
+    res = await repo.commit_stroke("R1", "VS", pid="p1", ts=100, op=op(5), team="A")
+    assert (res.ok, res.code) == (False, "EXPIRED")
+    await repo.set_game_fields("R1", phase="GUESS")
+    res = await repo.commit_stroke("R1", "VS", pid="p1", ts=10, op=op(6), team="A")
+    assert (res.ok, res.code) == (False, "BAD_PHASE")
+    await repo.update_room_fields("R1", state="WAITING")
+    res = await repo.commit_stroke("R1", "VS", pid="p1", ts=11, op=op(7), team="A")
+    assert (res.ok, res.code) == (False, "BAD_STATE")
+
+    assert await repo.get_budget("R1") == {"A": 3, "B": 0}  # rejected strokes charge nothing
+    assert [o.p["i"] for o in await repo.get_ops_vs("R1", "A")] == [1, 3]
+    with pytest.raises(ValueError):
+        await repo.commit_stroke("R1", "VS", pid="p1", ts=12, op=op(8))
+
+
+@pytest.mark.asyncio
+async def test_commit_stroke_single_checks_drawer_and_strokes_left():
+    r = FakeRedis()
+    repo = RedisRepo(r, room_ttl_sec=60)
+    header = RoomHeaderStore(mode="SINGLE", state="IN_GAME", cap=8, created_at=1, last_activity=1, gm_pid="gm")
+    await repo.create_room("R1", header)
+    await repo.set_game_fields("R1", phase="DRAW", game_end_at=100, drawer_pid="p1", strokes_left=2)
+
+    def op(i):
+        return DrawOp(t="line", p={"i": i}, ts=i, by="p1")
+
+    res = await repo.commit_stroke("R1", "SINGLE", pid="p1", ts=5, op=op(1))
+    assert (res.ok, res.remaining, res.budget, res.transition, res.seq) == (True, 1, {}, False, 1)
+    assert await r.ttl(RK("R1").ops()) == 60
+
+    res = await repo.commit_stroke("R1", "SINGLE", pid="p2", ts=6, op=op(2))
+    assert (res.ok, res.code) == (False, "NOT_DRAWER")
+    res = await repo.commit_stroke("R1", "SINGLE", pid="p1", ts=100, op=op(3))
+    assert (res.ok, res.code) == (False, "EXPIRED")
+
+    # GUESS still accepted for legacy rooms
+    await repo.set_game_fields("R1", phase="GUESS")
+    res = await repo.commit_stroke("R1", "SINGLE", pid="p1", ts=7, op=op(4))
+    assert (res.ok, res.remaining, res.seq) == (True, 0, 2)
+    res = await repo.commit_stroke("R1", "SINGLE", pid="p1", ts=8, op=op(5))
+    assert (res.ok, res.code, res.remaining) == (False, "NO_BUDGET", 0)
+
+    await repo.set_game_fields("R1", phase="VOTE", strokes_left=5)
+    res = await repo.commit_stroke("R1", "SINGLE", pid="p1", ts=9, op=op(6))
+    assert (res.ok, res.code) == (False, "BAD_PHASE")
+
+    assert (await repo.get_game("R1"))["strokes_left"] == 5
+    assert [o.p["i"] for o in await repo.get_ops_single("R1")] == [1, 4]
+
+
+@pytest.mark.asyncio
+async def test_room_lease_and_worker_membership():
+    r = FakeRedis()
+    repo = RedisRepo(r)
+
+    assert await repo.heartbeat_worker("w1", 10_000) == ["w1"]
+    assert await repo.heartbeat_worker("w2", 10_000) == ["w1", "w2"]
+    await r.zadd("workers", {"w1": 0})  # w1 stopped heartbeating long ago
+    assert await repo.heartbeat_worker("w2", 10_000) == ["w2"]
+
+    assert await repo.get_room_owner("R1") is None
+    assert await repo.acquire_room_lease("R1", "w1", 5000) == "w1"
+    assert await repo.acquire_room_lease("R1", "w2", 5000) == "w1"
+    assert 0 < await r.pttl(RK("R1").owner()) <= 5000
+    await r.delete(RK("R1").owner())  # w1's lease expired
+    assert await repo.acquire_room_lease("R1", "w2", 5000) == "w2"
+    assert await repo.get_room_owner("R1") == "w2"
+
+
+@pytest.mark.asyncio
+async def test_room_lock_serializes_workers_with_fencing_tokens():
+    r = FakeRedis()
+    w1, w2 = RedisRepo(r), RedisRepo(r)  # two workers, one Redis
+    order = []
+
+    async def critical(repo, name):
+        async with repo.room_lock("R1", "vs_end") as handle:
+            order.append((name, "in", handle.token))
+            await asyncio.sleep(0.01)
+            order.append((name, "out", handle.token))
+
+    await asyncio.gather(critical(w1, "w1"), critical(w2, "w2"))
+
+    assert [step for _, step, _ in order] == ["in", "out", "in", "out"]
+    assert order[0][2] < order[2][2]  # every acquisition gets a new token
+    assert not await r.exists(RK("R1").lock("vs_end"))  # released
+
+
+@pytest.mark.asyncio
+async def test_room_lock_lease_is_renewed_while_held():
+    r = FakeRedis()
+    repo = RedisRepo(r)
+    repo.locks.lease_ms = 300
+    key = RK("R1").lock("vs_end")
+
+    async with repo.room_lock("R1", "vs_end"):
+        await asyncio.sleep(0.5)  # outlives the lease
+        assert 0 < await r.pttl(key) <= 300
+    assert not await r.exists(key)
+
+
+@pytest.mark.asyncio
+async def test_room_lock_fences_writes_of_a_holder_whose_lease_lapsed():
+    from app.store.locks import StaleLockError
+
+    r = FakeRedis()
+    w1, w2 = RedisRepo(r), RedisRepo(r)  # two workers, one Redis
+    await _seed(w1, r)
+    lapsed, taken_over = asyncio.Event(), asyncio.Event()
+    tokens = {}
+
+    async def stalled():
+        async with w1.room_lock("R1", "vs_end") as handle:
+            tokens["w1"] = handle.token
+            r.round_trips = 0
+            await w1.set_game_fields("R1", phase="GUESS")
+            assert r.round_trips == 1  # fenced writes stay one round trip
+            await r.delete(RK("R1").lock("vs_end"))  # the lease ran out while stalled
+            lapsed.set()
+            await taken_over.wait()
+
+            with pytest.raises(StaleLockError):
+                await w1.set_game_fields("R1", phase="VOTING")
+            with pytest.raises(StaleLockError):
+                await w1.incr_player_points("R1", "p1", 5)
+            with pytest.raises(StaleLockError):
+                await w1.commit_stroke("R1", "VS", pid="p1", ts=5, op=None, team="A")
+
+            async def spawned():  # a task spawned under the lock is not its holder
+                await w1.set_budget_fields("R1", B=4)
+
+            await asyncio.create_task(spawned())
+            async with w1.room_lock("R1", "sabotage"):  # other scopes are fenced apart
+                await w1.set_game_fields("R1", sabotage_armed_by="")
+
+    async def next_holder():
+        await lapsed.wait()
+        async with w2.room_lock("R1", "vs_end") as handle:
+            tokens["w2"] = handle.token
+            await w2.update_room_fields("R1", state="GAME_END")
+            assert await w2.incr_players_points("R1", {"p1": 1, "ghost": 1}) == {"p1": 1}
+        taken_over.set()
+
+    await asyncio.gather(stalled(), next_holder())
+
+    assert tokens["w1"] < tokens["w2"]
+    assert int(await r.hget(RK("R1").lock_fence(), "vs_end")) == tokens["w2"]
+    assert (await w2.get_game("R1"))["phase"] == "GUESS"
+    assert (await w2.get_room_header("R1")).state == "GAME_END"
+    assert (await w2.get_player("R1", "p1")).points == 1
+    assert await w2.get_budget("R1") == {"A": 3, "B": 4}
+
+    # an explicit fence works the same outside the lock
+    from app.store.locks import RoomLockHandle
+
+    stale = RoomLockHandle(room_code="R1", scope="vs_end", token=tokens["w1"], distributed=True)
+    with pytest.raises(StaleLockError):
+        await w2.write_batch("R1", stale).update_room_fields(state="IN_GAME").execute()
+    assert (await w2.get_room_header("R1")).state == "GAME_END"
+
+
+@pytest.mark.asyncio
+async def test_room_lock_times_out_and_skips_redis_for_owned_rooms():
+    from app.store.locks import RoomLockTimeout
+
+    r = FakeRedis()
+    repo = RedisRepo(r)
+    repo.locks.acquire_timeout_sec = 0.02
+    await r.set(RK("R1").lock("vote"), "99")  # held by a worker that is still alive
+
+    with pytest.raises(RoomLockTimeout):
+        async with repo.room_lock("R1", "vote"):
+            pass
+
+    repo.locks.is_local_owner = lambda room_code: room_code == "R1"
+    async with repo.room_lock("R1", "vote") as handle:
+        assert (handle.distributed, handle.token) == (False, 0)
+
+
+
+@pytest.mark.asyncio
+async def test_room_lock_registry_evicts_idle_entries():
+    from app.store.locks import RoomLockRegistry
+
+    registry = RoomLockRegistry()
+    entered = asyncio.Event()
+    release = asyncio.Event()
+    order = []
+
+    async def hold(name):
+        async with registry.hold("R1", "vote"):
+            order.append(name)
+            entered.set()
+            await release.wait()
+
+    first = asyncio.create_task(hold("first"))
+    await entered.wait()
+    second = asyncio.create_task(hold("second"))
+    await asyncio.sleep(0)
+    assert len(registry) == 1  # holder and waiter share one entry
+
+    release.set()
+    await asyncio.gather(first, second)
+    assert order == ["first", "second"]
+
+    for i in range(100):
+        async with registry.hold(f"ROOM{i}", "vs_end"):
+            pass
+    assert len(registry) == 0
+
+
+@pytest.mark.asyncio
+async def test_header_cache_validates_version_across_workers():
+    r = FakeRedis()
+    repo = RedisRepo(r)
+    other = RedisRepo(r)  # second worker sharing the same Redis
+    header = RoomHeaderStore(mode="VS", state="WAITING", cap=8, created_at=1, last_activity=1)
+    await repo.create_room("R1", header)
+
+    assert (await repo.get_room_header("R1")).state == "WAITING"
+    r.round_trips = 0
+    cached = await repo.get_room_header("R1")
+    assert r.round_trips == 1  # HGET of the version only
+    cached.state = "IN_GAME"  # callers get a copy
+    assert (await repo.get_room_header("R1")).state == "WAITING"
+
+    await other.update_room_fields("R1", state="IN_GAME")
+    assert (await repo.get_room_header("R1")).state == "IN_GAME"
+    assert repo.header_cache.metrics()["misses"] == 2
+
+    await repo.write_batch("R1").update_room_fields(round_no=3).execute()
+    assert (await repo.get_room_header("R1")).round_no == 3
+    assert await repo.get_room_mode("R1") == "VS"
+
+
+@pytest.mark.asyncio
+async def test_header_cache_trust_and_off_modes():
+    r = FakeRedis()
+    trusting = RedisRepo(r, header_cache="trust")
+    uncached = RedisRepo(r, header_cache="off")
+    await trusting.create_room("R1", RoomHeaderStore(mode="SINGLE", state="WAITING", cap=8, created_at=1, last_activity=1))
+
+    await trusting.get_room_header("R1")
+    r.round_trips = 0
+    assert (await trusting.get_room_header("R1")).mode == "SINGLE"
+    assert r.round_trips == 0
+
+    await trusting.clear_room_field("R1", "gm_pid")
+    await uncached.get_room_header("R1")
+    await uncached.get_room_header("R1")
+    assert uncached.header_cache.metrics()["rooms"] == 0
+    assert uncached.header_cache.metrics()["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_header_cache_skips_reads_that_raced_a_local_write():
+    r = FakeRedis()
+    repo = RedisRepo(r, header_cache="trust")
+    await repo.create_room("R1", RoomHeaderStore(mode="SINGLE", state="WAITING", cap=8, created_at=1, last_activity=1))
+    real_hgetall = r.hgetall
+
+    async def racing_hgetall(key):
+        stale = await real_hgetall(key)
+        # start_game lands on this worker while the read is in flight
+        await repo.update_room_fields("R1", state="IN_GAME")
+        return stale
+
+    r.hgetall = racing_hgetall
+    assert (await repo.get_room_header("R1")).state == "WAITING"
+    r.hgetall = real_hgetall
+
+    assert (await repo.get_room_header("R1")).state == "IN_GAME"
+    assert repo.header_cache.metrics()["stale_puts"] == 1
+
+
+@pytest.mark.asyncio
+async def test_room_context_memoizes_reads_until_written():
+    r = FakeRedis()
+    repo = RedisRepo(r)
+    await _seed(repo, r)
+
+    with repo.room_context("R1", "p1") as ctx:
+        r.round_trips = 0
+        player = await ctx.player()
+        player.role = "guesser"  # callers get copies
+        assert (await repo.get_player("R1", "p1")).role == "drawerA"
+        await repo.get_game("R1")
+        await repo.get_game("R1")
+        assert r.round_trips == 2
+
+        loaded = await repo.load_room_context("R1", "p1", parts=("game", "player", "budget"))
+        assert r.round_trips == 3  # only the budget was fetched
+        assert loaded.game["phase"] == "DRAW" and loaded.budget == {"A": 3, "B": 2}
+
+        await repo.set_game_fields("R1", phase="GUESS")
+        await repo.update_player_fields("R1", "p1", points=4)
+        assert (await repo.get_game("R1"))["phase"] == "GUESS"
+        assert (await ctx.player()).points == 4
+
+        async with repo.room_lock("R1", "vote"):
+            r.round_trips = 0
+            await repo.get_budget("R1")
+            assert r.round_trips == 1  # re-read under the lock
+
+        async def spawned():
+            return await repo.get_budget("R1")
+
+        r.round_trips = 0
+        await asyncio.create_task(spawned())
+        assert r.round_trips == 1  # other tasks never read the memo
+
+    r.round_trips = 0
+    await repo.get_budget("R1")
+    assert r.round_trips == 1
@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import pytest
+
+from app.domain.lifecycle.scheduler import RoomTickScheduler, next_room_deadline
+from app.store.models import RoomHeaderStore
+
+
+def _header(mode="VS", state="IN_GAME", countdown_end_at=0):
+    return RoomHeaderStore(
+        mode=mode,
+        state=state,
+        cap=8,
+        created_at=0,
+        last_activity=0,
+        gm_pid="gm",
+        round_no=1,
+        countdown_end_at=countdown_end_at,
+    )
+
+
+def test_next_deadline_vs_draw_uses_draw_end_only():
+    game = {"phase": "DRAW", "draw_end_at": 120, "guess_end_at": 50, "transition_until": 40}
+    assert next_room_deadline(_header(), game) == 120
+
+
+def test_next_deadline_transition_and_clear_ops():
+    game = {"phase": "TRANSITION", "transition_until": 90, "clear_ops_at": 70}
+    assert next_room_deadline(_header(), game) == 70
+
+
+def test_next_deadline_single_live_round_uses_game_end():
+    game = {"phase": "DRAW", "game_end_at": 300, "draw_end_at": 0}
+    assert next_room_deadline(_header(mode="SINGLE"), game) == 300
+
+
+def test_next_deadline_voting_and_countdown():
+    game = {"phase": "VOTING", "vote_end_at": 30, "reset_to_waiting_at": 12}
+    assert next_room_deadline(_header(state="GAME_END"), game) == 12
+    assert next_room_deadline(_header(state="CONFIG", countdown_end_at=55), {}) == 55
+    assert next_room_deadline(_header(state="WAITING"), {"phase": ""}) == 0
+
+
+class FakeRepo:
+    def __init__(self, header, game):
+        self.header = header
+        self.game = game
+
+    async def get_room_header(self, room_code):
+        return self.header
+
+    async def get_game(self, room_code):
+        return dict(self.game)
+
+
+class FakeApp:
+    def __init__(self, repo):
+        self.state = type("State", (), {"repo": repo})()
+
+
+@pytest.mark.asyncio
+async def test_scheduler_fires_once_per_deadline_and_emits():
+    due = int(time.time())
+    repo = FakeRepo(_header(), {"phase": "DRAW", "draw_end_at": due})
+    app = FakeApp(repo)
+    ticks = []
+    emitted = []
+
+    async def tick(*, app, room_code):
+        ticks.append(room_code)
+        # advancing moves the room to a later timer
+        repo.game = {"phase": "TRANSITION", "transition_until": due + 3600}
+        return [{"type": "phase_changed"}]
+
+    async def emit(room_code, events):
+        emitted.append((room_code, events))
+
+    scheduler = RoomTickScheduler(app, emit=emit, tick=tick)
+    scheduler.start()
+    try:
+        scheduler.touch("R1")
+        scheduler.touch("R1")
+        for _ in range(50):
+            await asyncio.sleep(0.01)
+            if emitted and scheduler.deadline_for("R1"):
+                break
+    finally:
+        await scheduler.stop()
+
+    assert ticks == ["R1"]
+    assert emitted == [("R1", [{"type": "phase_changed"}])]
+    assert scheduler.deadline_for("R1") == due + 3600
+
+
+@pytest.mark.asyncio
+async def test_scheduler_does_not_spin_on_unchanged_deadline():
+    due = int(time.time()) - 1
+    repo = FakeRepo(_header(), {"phase": "DRAW", "draw_end_at": due})
+    app = FakeApp(repo)
+    ticks = []
+
+    async def tick(*, app, room_code):
+        ticks.append(room_code)
+        return []
+
+    async def emit(room_code, events):
+        return None
+
+    scheduler = RoomTickScheduler(app, emit=emit, tick=tick)
+    scheduler.start()
+    try:
+        scheduler.touch("R1")
+        await asyncio.sleep(0.05)
+    finally:
+        await scheduler.stop()
+
+    assert ticks == ["R1"]
+    assert scheduler.deadline_for("R1") == 0
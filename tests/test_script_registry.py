@@ -0,0 +1,69 @@
+import hashlib
+
+import pytest
+from redis.exceptions import NoScriptError
+
+from app.store.scripts import ScriptRegistry, load_script_sources
+
+
+class FakeRedis:
+    """Script cache only: evalsha succeeds once the SHA has been loaded."""
+
+    def __init__(self):
+        self.loaded = {}
+        self.calls = []
+
+    async def script_load(self, src):
+        sha = hashlib.sha1(src.encode("utf-8")).hexdigest()
+        self.loaded[sha] = src
+        return sha.encode("utf-8")
+
+    async def evalsha(self, sha, numkeys, *keys_and_args):
+        self.calls.append((sha, numkeys, keys_and_args))
+        if sha not in self.loaded:
+            raise NoScriptError("NOSCRIPT No matching script.")
+        return [1, 7]
+
+
+def test_repo_scripts_parse_from_lua_file():
+    sources = load_script_sources()
+    assert {"consume_stroke", "commit_stroke"} <= set(sources)
+    assert "@script" not in sources["consume_stroke"]
+    assert "HINCRBY" in sources["consume_stroke"]
+
+
+@pytest.mark.asyncio
+async def test_call_uses_evalsha_after_load_all():
+    r = FakeRedis()
+    scripts = ScriptRegistry(r, sources={"echo": "return 1"})
+    await scripts.load_all()
+
+    res = await scripts.call("echo", keys=["k1"], args=["a", "b"])
+
+    assert res == [1, 7]
+    assert r.calls == [(scripts.sha("echo"), 1, ("k1", "a", "b"))]
+    assert scripts.metrics()["echo"]["calls"] == 1
+    assert scripts.metrics()["echo"]["reloads"] == 0
+
+
+@pytest.mark.asyncio
+async def test_call_reloads_on_noscript_after_failover():
+    r = FakeRedis()
+    scripts = ScriptRegistry(r, sources={"echo": "return 1"})
+    await scripts.load_all()
+    r.loaded.clear()  # new primary has an empty script cache
+
+    res = await scripts.call("echo", keys=["k1"])
+
+    assert res == [1, 7]
+    assert len(r.calls) == 2
+    stats = scripts.metrics()["echo"]
+    assert stats["reloads"] == 1
+    assert stats["errors"] == 0
+
+
+@pytest.mark.asyncio
+async def test_unknown_script_is_rejected():
+    scripts = ScriptRegistry(FakeRedis(), sources={})
+    with pytest.raises(KeyError):
+        await scripts.call("missing")
@@ -2,7 +2,7 @@ import pytest
 
 from app.domain.single.handlers_config import handle_single_set_round_config
 from app.domain.single.handlers_start import handle_single_start_game
-from app.store.models import PlayerStore, RoomHeaderStore
+from app.store.models import OpsTail, PlayerStore, RoomHeaderStore
 
 
 class FakeRepo:
@@ -64,6 +64,9 @@ class FakeRepo:
     async def get_ops_vs(self, room_code, team):
         return []
 
+    async def get_ops_tail(self, room_code, canvas, since_seq=None, *, raw=False):
+        return OpsTail(canvas=canvas, mode="full", seq=0)
+
     async def get_modlog(self, room_code):
         return []
 
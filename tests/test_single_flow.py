@@ -1,10 +1,12 @@
+from contextlib import asynccontextmanager
+
 import pytest
 
 from app.domain.single.handlers_guess import handle_single_guess
 from app.domain.single.handlers_phase import handle_single_phase_tick
 from app.domain.single.handlers_vote import handle_single_vote_next
 from app.domain.single.handlers_draw import handle_single_draw_op
-from app.store.models import PlayerStore, RoomHeaderStore
+from app.store.models import LoadedRoom, OpsTail, PlayerStore, RoomHeaderStore, StrokeCommit
 
 
 class FakeRepo:
@@ -27,6 +29,11 @@ class FakeRepo:
         self.round_cfg = {"secret_word": "Apple", "stroke_limit": 10, "time_limit_sec": 240}
         self.game = {"phase": "DRAW", "votes_next": {}}
         self.active = {"gm", "d", "g"}
+        self.ops = []
+
+    @asynccontextmanager
+    async def room_lock(self, room_code, scope):
+        yield
 
     async def get_room_header(self, room_code):
         return self.header
@@ -77,6 +84,9 @@ class FakeRepo:
     async def get_ops_vs(self, room_code, team):
         return []
 
+    async def get_ops_tail(self, room_code, canvas, since_seq=None, *, raw=False):
+        return OpsTail(canvas=canvas, mode="full", seq=0)
+
     async def get_active_pids(self, room_code):
         return set(self.active)
 
@@ -91,6 +101,17 @@ class FakeRepo:
         for k, v in fields.items():
             setattr(p, k, v)
 
+    async def update_players_bulk(self, room_code, updates):
+        for pid, fields in updates.items():
+            await self.update_player_fields(room_code, pid, **fields)
+
+    async def incr_player_points(self, room_code, pid, delta=1):
+        p = self.players.get(pid)
+        if p is None:
+            return None
+        p.points += delta
+        return p.points
+
     async def clear_ops(self, room_code, mode):
         return None
 
@@ -100,6 +121,30 @@ class FakeRepo:
     async def vote_next_clear(self, room_code):
         return None
 
+    async def load_room_context(self, room_code, pid=None, parts=()):
+        return LoadedRoom(
+            room_code=room_code,
+            pid=pid,
+            parts=frozenset(parts),
+            header=self.header,
+            game=dict(self.game),
+            player=self.players.get(pid),
+        )
+
+    async def commit_stroke(self, room_code, mode, *, pid, ts, op, team=None, cost=1, max_ops=5000):
+        if self.game.get("phase") not in ("DRAW", "GUESS"):
+            return StrokeCommit(ok=False, code="BAD_PHASE")
+        if self.game.get("drawer_pid") != pid:
+            return StrokeCommit(ok=False, code="NOT_DRAWER")
+        cur = int(self.game.get("strokes_left") or 0)
+        if cur < cost:
+            return StrokeCommit(ok=False, code="NO_BUDGET", remaining=cur)
+        self.game["strokes_left"] = cur - cost
+        if op is not None:
+            self.ops.append(op)
+        self.header.last_activity = ts
+        return StrokeCommit(ok=True, remaining=cur - cost)
+
 
 class FakeApp:
     def __init__(self, repo):
@@ -198,3 +243,44 @@ async def test_single_draw_rejects_long_stroke():
 
     to_sender, to_room = await handle_single_draw_op(app=app, room_code="R1", pid="d", msg=Msg())
     assert any(getattr(e, "type", "") == "error" for e in to_sender)
+
+
+@pytest.mark.asyncio
+async def test_single_draw_commits_stroke_and_reports_remaining():
+    repo = FakeRepo()
+    app = FakeApp(repo)
+    repo.game["phase"] = "DRAW"
+    repo.game["strokes_left"] = 2
+    repo.game["drawer_pid"] = "d"
+
+    class Msg:
+        op = {"t": "line", "pts": [[0, 0], [5, 5]]}
+
+    to_sender, to_room = await handle_single_draw_op(app=app, room_code="R1", pid="d", msg=Msg())
+    assert [e.type for e in to_sender] == ["budget_update"]
+    assert to_sender[0].budget == {"stroke_remaining": 1}
+    assert repo.game["strokes_left"] == 1
+    assert len(repo.ops) == 1
+
+
+@pytest.mark.asyncio
+async def test_single_timeout_end_awards_gm_point():
+    from app.domain.lifecycle.handlers import _auto_expire_single_game
+
+    repo = FakeRepo()
+    repo.game.update(
+        {
+            "phase": "TRANSITION",
+            "transition_until": 10,
+            "transition_next": "GAME_END",
+            "transition_reason": "TIMEOUT",
+            "drawer_pid": "d",
+        }
+    )
+    repo.players["gm"].points = 3
+
+    events = await _auto_expire_single_game(repo=repo, room_code="R1", header=repo.header, ts=11)
+
+    assert events
+    assert repo.players["gm"].points == 4
+    assert repo.players["d"].points == 0
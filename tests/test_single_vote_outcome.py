@@ -1,8 +1,10 @@
+from contextlib import asynccontextmanager
+
 import pytest
 
 from app.domain.lifecycle.handlers import _auto_reset_single_to_waiting_after_vote_yes
 from app.domain.single.handlers_vote import handle_single_vote_next
-from app.store.models import PlayerStore, RoomHeaderStore
+from app.store.models import OpsTail, PlayerStore, RoomHeaderStore
 
 
 class FakeRepo:
@@ -25,6 +27,10 @@ class FakeRepo:
         self.game = {"phase": "VOTING", "votes_next": {}}
         self.active = {"gm", "g"}
 
+    @asynccontextmanager
+    async def room_lock(self, room_code, scope):
+        yield
+
     async def get_room_header(self, room_code):
         return self.header
 
@@ -55,6 +61,10 @@ class FakeRepo:
         for k, v in fields.items():
             setattr(p, k, v)
 
+    async def update_players_bulk(self, room_code, updates):
+        for pid, fields in updates.items():
+            await self.update_player_fields(room_code, pid, **fields)
+
     async def set_roles(self, room_code, roles):
         self.roles = roles
 
@@ -79,6 +89,9 @@ class FakeRepo:
     async def get_ops_vs(self, room_code, team):
         return []
 
+    async def get_ops_tail(self, room_code, canvas, since_seq=None, *, raw=False):
+        return OpsTail(canvas=canvas, mode="full", seq=0)
+
     async def get_modlog(self, room_code):
         return []
 
@@ -156,6 +169,10 @@ async def test_single_auto_reset_clears_gm_field_without_none_write():
             for k, v in fields.items():
                 setattr(p, k, v)
 
+        async def update_players_bulk(self, room_code, updates):
+            for pid, fields in updates.items():
+                await self.update_player_fields(room_code, pid, **fields)
+
         async def set_roles(self, room_code, roles):
             return None
 
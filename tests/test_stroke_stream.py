@@ -0,0 +1,240 @@
+import copy
+
+import pytest
+
+from app.domain.common.stroke_codec import MAX_Q, decode_points, encode_points
+from app.domain.common.stroke_stream import (
+    StrokeStreams,
+    handle_stroke_begin,
+    handle_stroke_end,
+    handle_stroke_points,
+)
+from app.domain.vs.rules import MAX_STROKE_DURATION_SEC, MAX_STROKE_POINTS
+from app.store.models import LoadedRoom, PlayerStore, RoomHeaderStore, StrokeCommit
+from app.transport.protocols import InStrokeBegin, InStrokeEnd, InStrokePoints
+from app.util.timeutil import now_ts
+
+
+class FakeRepo:
+    def __init__(self, *, budget_a: int = 3, budget_b: int = 3):
+        ts = now_ts()
+        self.header = RoomHeaderStore(
+            mode="VS",
+            state="IN_GAME",
+            cap=8,
+            created_at=ts,
+            last_activity=ts,
+            gm_pid="gm",
+            round_no=1,
+        )
+        self.players = {
+            "a_drawer": PlayerStore(
+                pid="a_drawer",
+                name="A Drawer",
+                joined_at=ts,
+                last_seen=ts,
+                role="drawerA",
+                team="A",
+                connected=True,
+            ),
+        }
+        self.game = {"phase": "DRAW", "draw_end_at": ts + 120}
+        self.budget = {"A": budget_a, "B": budget_b}
+        self.ops = []
+        self.commits = []
+
+    async def get_room_header(self, room_code):
+        return self.header
+
+    async def load_room_context(self, room_code, pid=None, parts=()):
+        return LoadedRoom(
+            room_code=room_code,
+            pid=pid,
+            parts=frozenset(parts),
+            header=self.header,
+            game=copy.deepcopy(self.game),
+            player=self.players.get(pid),
+            budget=dict(self.budget),
+        )
+
+    async def commit_stroke(self, room_code, mode, *, pid, ts, op, team=None, cost=1, max_ops=5000):
+        self.commits.append((op, cost))
+        if self.game.get("phase") != "DRAW":
+            return StrokeCommit(ok=False, code="BAD_PHASE")
+        cur = int(self.budget.get(team, 0))
+        if cur < cost:
+            return StrokeCommit(ok=False, code="NO_BUDGET", remaining=cur)
+        self.budget[team] = cur - cost
+        seq = 0
+        if op is not None:
+            self.ops.append((team, op))
+            seq = len(self.ops)
+        return StrokeCommit(ok=True, remaining=self.budget[team], budget=dict(self.budget), seq=seq)
+
+
+class FakeApp:
+    def __init__(self, repo, **streams_kwargs):
+        self.state = type("State", (), {"repo": repo})()
+        self.emitted = []
+
+        async def emit(room_code, events, exclude_pid):
+            self.emitted.append((room_code, [e.type for e in events], exclude_pid))
+
+        self.state.stroke_streams = StrokeStreams(self, emit=emit, **streams_kwargs)
+
+
+def _types(events):
+    return [getattr(e, "type", "") for e in events]
+
+
+def _error_codes(events):
+    return [getattr(e, "code", "") for e in events if getattr(e, "type", "") == "error"]
+
+
+async def _begin(app, sid="s1", op=None):
+    msg = InStrokeBegin(type="stroke_begin", sid=sid, canvas="A", op=op or {"color": "#000", "size": 2})
+    return await handle_stroke_begin(app=app, room_code="R1", pid="a_drawer", msg=msg)
+
+
+async def _points(app, sid="s1", **chunk):
+    msg = InStrokePoints(type="stroke_points", sid=sid, **chunk)
+    return await handle_stroke_points(app=app, room_code="R1", pid="a_drawer", msg=msg)
+
+
+@pytest.mark.asyncio
+async def test_stroke_is_charged_at_begin_and_stored_once_at_end():
+    repo = FakeRepo()
+    app = FakeApp(repo, flush_interval_sec=60)
+
+    to_sender, to_room = await _begin(app)
+    assert not _error_codes(to_sender)
+    assert _types(to_room) == ["stroke_start", "budget_update"]
+    assert repo.budget["A"] == 2
+
+    for i in range(3):
+        assert not _error_codes((await _points(app, pts=[[i, i], [i + 1, i]]))[0])
+
+    end = InStrokeEnd(type="stroke_end", sid="s1")
+    to_sender, to_room = await handle_stroke_end(app=app, room_code="R1", pid="a_drawer", msg=end)
+    assert not _error_codes(to_sender)
+    assert _types(to_room) == ["op_broadcast", "stroke_end"]
+    assert to_room[1].seq == 1
+
+    assert [cost for _, cost in repo.commits] == [1, 0]
+    assert repo.budget["A"] == 2
+    assert len(repo.ops) == 1
+    _, op = repo.ops[0]
+    assert op.p["pts"][0] == [0, 0] and op.p["pts"][-1] == [3, 2]
+    assert op.p["pid"] == "a_drawer" and op.p["color"] == "#000"
+    assert len(app.state.stroke_streams) == 0
+
+
+@pytest.mark.asyncio
+async def test_points_are_coalesced_into_rate_capped_deltas():
+    repo = FakeRepo()
+    app = FakeApp(repo, flush_interval_sec=0.05)
+    await _begin(app)
+    streams = app.state.stroke_streams
+
+    _, first = await _points(app, pts=[[0, 0], [1, 1]])
+    assert _types(first) == ["stroke_delta"]
+    # within the interval: buffered, nothing broadcast
+    _, second = await _points(app, pts=[[2, 2]])
+    _, third = await _points(app, pts=[[3, 3]])
+    assert second == [] and third == []
+
+    buf = streams.get("R1", "a_drawer")
+    await streams.flush_once(buf.last_flush + 1)
+    assert app.emitted == [("R1", ["stroke_delta"], "a_drawer")]
+    assert buf.flushed == 4
+
+
+@pytest.mark.asyncio
+async def test_packed_chunks_are_stored_packed():
+    repo = FakeRepo()
+    app = FakeApp(repo, flush_interval_sec=60)
+    await _begin(app, op={"color": "#000", "q": 10})
+
+    await _points(app, pz=encode_points([[0, 0], [0.5, 0.5]], 10))
+    await _points(app, pz=encode_points([[1.5, 1]], 10))
+    end = InStrokeEnd(type="stroke_end", sid="s1")
+    await handle_stroke_end(app=app, room_code="R1", pid="a_drawer", msg=end)
+
+    _, op = repo.ops[0]
+    assert "pts" not in op.p
+    assert decode_points(op.p["pz"], 10) == [[0, 0], [0.5, 0.5], [1.5, 1]]
+
+
+@pytest.mark.asyncio
+async def test_stroke_errors():
+    repo = FakeRepo()
+    app = FakeApp(repo, flush_interval_sec=60)
+
+    to_sender, _ = await _points(app, pts=[[0, 0]])
+    assert _error_codes(to_sender) == ["STROKE_NOT_FOUND"]
+
+    await _begin(app)
+    to_sender, _ = await _begin(app, sid="s2")
+    assert _error_codes(to_sender) == ["STROKE_OPEN"]
+    to_sender, _ = await _points(app, sid="s2", pts=[[0, 0]])
+    assert _error_codes(to_sender) == ["STROKE_NOT_FOUND"]
+    assert repo.budget["A"] == 2
+
+    # q is bounded like in stroke_codec; a rejected begin is not charged
+    app.state.stroke_streams.pop("R1", "a_drawer")
+    for q in (0, MAX_Q + 1, 2.5):
+        to_sender, _ = await _begin(app, sid="s3", op={"q": q})
+        assert _error_codes(to_sender) == ["INVALID_LINE"]
+    assert repo.budget["A"] == 2
+
+
+@pytest.mark.asyncio
+async def test_abandoned_stroke_is_finished_by_the_flusher():
+    repo = FakeRepo()
+    app = FakeApp(repo, flush_interval_sec=60, max_duration_sec=5)
+    await _begin(app)
+    await _points(app, pts=[[0, 0], [4, 4]])
+    streams = app.state.stroke_streams
+    buf = streams.get("R1", "a_drawer")
+
+    await streams.flush_once(buf.started_at + 10)
+    assert len(streams) == 0
+    assert len(repo.ops) == 1
+    assert app.emitted == [("R1", ["op_broadcast", "stroke_end"], None)]
+
+
+@pytest.mark.asyncio
+async def test_stored_stroke_gets_the_draw_op_limits():
+    repo = FakeRepo()
+    # stream limits looser than the draw_op ones: finish_stroke still applies those
+    app = FakeApp(repo, flush_interval_sec=60, max_points=5000)
+    await _begin(app)
+    await _points(app, pts=[[i % 100, i // 100] for i in range(MAX_STROKE_POINTS + 1)])
+    end = InStrokeEnd(type="stroke_end", sid="s1")
+    to_sender, to_room = await handle_stroke_end(app=app, room_code="R1", pid="a_drawer", msg=end)
+    assert _error_codes(to_sender) == ["STROKE_DROPPED"]
+    assert _types(to_room) == ["stroke_end"] and not to_room[0].seq
+    assert repo.ops == []
+
+    await _begin(app, sid="s2")
+    await _points(app, sid="s2", pts=[[0, 0], [1, 1]])
+    app.state.stroke_streams.get("R1", "a_drawer").started_ts -= MAX_STROKE_DURATION_SEC + 1
+    end = InStrokeEnd(type="stroke_end", sid="s2")
+    to_sender, _ = await handle_stroke_end(app=app, room_code="R1", pid="a_drawer", msg=end)
+    assert _error_codes(to_sender) == ["STROKE_DROPPED"]
+    assert repo.ops == []
+
+
+@pytest.mark.asyncio
+async def test_chunk_after_the_duration_limit_ends_the_stroke_without_it():
+    repo = FakeRepo()
+    app = FakeApp(repo, flush_interval_sec=60, max_duration_sec=5)
+    await _begin(app)
+    await _points(app, pts=[[0, 0], [4, 4]])
+    app.state.stroke_streams.get("R1", "a_drawer").started_at -= 6
+
+    to_sender, to_room = await _points(app, pts=[[8, 8]])
+    assert _error_codes(to_sender) == ["STROKE_TOO_LONG"]
+    assert _types(to_room) == ["op_broadcast", "stroke_end"]
+    _, op = repo.ops[0]
+    assert op.p["pts"] == [[0, 0], [4, 4]]
@@ -1,10 +1,11 @@
 import copy
+from contextlib import asynccontextmanager
 
 import pytest
 
 from app.domain.vs.handlers_draw import handle_vs_draw_op
 from app.domain.vs.handlers_sabotage import handle_vs_sabotage, handle_vs_sabotage_arm
-from app.store.models import PlayerStore, RoomHeaderStore
+from app.store.models import LoadedRoom, PlayerStore, RoomHeaderStore, StrokeCommit
 from app.util.timeutil import now_ts
 
 
@@ -57,6 +58,11 @@ class FakeRepo:
         self.round_cfg = {"guess_window_sec": 10, "strokes_per_phase": 4, "draw_window_sec": 20}
         self.budget = {"A": budget_a, "B": budget_b}
         self.ops = []
+        self.commits = 0
+
+    @asynccontextmanager
+    async def room_lock(self, room_code, scope):
+        yield
 
     async def get_room_header(self, room_code):
         return self.header
@@ -93,6 +99,41 @@ class FakeRepo:
     async def get_budget(self, room_code):
         return dict(self.budget)
 
+    async def load_room_context(self, room_code, pid=None, parts=()):
+        return LoadedRoom(
+            room_code=room_code,
+            pid=pid,
+            parts=frozenset(parts),
+            header=self.header,
+            game=copy.deepcopy(self.game),
+            player=self.players.get(pid),
+            budget=dict(self.budget),
+        )
+
+    async def commit_stroke(self, room_code, mode, *, pid, ts, op, team=None, cost=1, max_ops=5000):
+        self.commits += 1
+        if self.header.state != "IN_GAME":
+            return StrokeCommit(ok=False, code="BAD_STATE")
+        if self.game.get("phase") != "DRAW":
+            return StrokeCommit(ok=False, code="BAD_PHASE")
+        draw_end_at = int(self.game.get("draw_end_at") or 0)
+        if draw_end_at and ts >= draw_end_at:
+            return StrokeCommit(ok=False, code="EXPIRED")
+        cur = int(self.budget.get(team, 0))
+        if cur < cost:
+            return StrokeCommit(ok=False, code="NO_BUDGET", remaining=cur)
+        self.budget[team] = cur - cost
+        if op is not None:
+            self.ops.append((team, op))
+        self.header.last_activity = ts
+        budget = {k: self.budget[k] for k in ("A", "B") if k in self.budget}
+        return StrokeCommit(
+            ok=True,
+            remaining=self.budget[team],
+            budget=budget,
+            transition=len(budget) == 2 and all(v <= 0 for v in budget.values()),
+        )
+
 
 class FakeApp:
     def __init__(self, repo):
@@ -170,3 +211,51 @@ async def test_vs_sabotage_transitions_to_guess_when_both_budgets_hit_zero():
     assert repo.game["transition_next"] == "GUESS"
     assert repo.game["transition_front"] == "OUT OF STROKES!"
     assert any(getattr(e, "type", "") == "phase_changed" for e in to_room)
+
+
+@pytest.mark.asyncio
+async def test_vs_draw_commits_stroke_in_one_call():
+    repo = FakeRepo(budget_a=3, budget_b=2)
+    app = FakeApp(repo)
+
+    to_sender, to_room = await handle_vs_draw_op(app=app, room_code="R3", pid="a_drawer", msg=DrawMsg(canvas="A"))
+    assert not _error_codes(to_sender)
+    assert repo.commits == 1
+    assert [team for team, _ in repo.ops] == ["A"]
+    budget_ev = next(e for e in to_room if getattr(e, "type", "") == "budget_update")
+    assert budget_ev.budget == {"A": 2, "B": 2}
+    assert repo.game["phase"] == "DRAW"
+
+
+@pytest.mark.asyncio
+async def test_vs_draw_long_stroke_is_charged_but_not_stored():
+    repo = FakeRepo(budget_a=2, budget_b=2)
+    app = FakeApp(repo)
+    msg = DrawMsg(canvas="A")
+    msg.op["pts"] = [[0, 0]] * 1001
+
+    to_sender, to_room = await handle_vs_draw_op(app=app, room_code="R4", pid="a_drawer", msg=msg)
+    assert _error_codes(to_sender) == ["STROKE_TOO_LONG"]
+    assert repo.budget["A"] == 1
+    assert repo.ops == []
+    assert not any(getattr(e, "type", "") == "op_broadcast" for e in to_room)
+
+
+@pytest.mark.asyncio
+async def test_vs_draw_rejected_when_window_closes_before_commit():
+    repo = FakeRepo(budget_a=2, budget_b=2)
+    app = FakeApp(repo)
+    real_commit = repo.commit_stroke
+
+    async def racing_commit(*args, **kwargs):
+        # window closes between the read and the atomic commit
+        repo.game["draw_end_at"] = kwargs["ts"]
+        return await real_commit(*args, **kwargs)
+
+    repo.commit_stroke = racing_commit
+
+    to_sender, to_room = await handle_vs_draw_op(app=app, room_code="R5", pid="a_drawer", msg=DrawMsg(canvas="A"))
+    assert _error_codes(to_sender) == ["DRAW_EXPIRED"]
+    assert repo.budget["A"] == 2
+    assert repo.ops == []
+    assert repo.game["phase"] == "TRANSITION"
@@ -1,4 +1,5 @@
 import copy
+from contextlib import asynccontextmanager
 
 import pytest
 
@@ -52,6 +53,10 @@ class FakeRepo:
         self.budget = {"A": 3, "B": 3}
         self.ops = []
 
+    @asynccontextmanager
+    async def room_lock(self, room_code, scope):
+        yield
+
     async def get_room_header(self, room_code):
         return self.header
 
@@ -0,0 +1,174 @@
+import asyncio
+import json
+
+import pytest
+
+from app.transport import ws_manager
+from app.transport.ws_manager import WSManager
+
+
+class FakeWS:
+    def __init__(self, gate=None):
+        self.sent = []
+        self.closed = None
+        self.gate = gate  # asyncio.Event: sends block until set (slow client)
+
+    async def send_text(self, text):
+        if self.gate is not None:
+            await self.gate.wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.closed = code
+
+
+async def _drain():
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_deliver_encodes_each_event_once(monkeypatch):
+    calls = []
+    real_dumps = ws_manager.jsonx.dumps
+
+    def counting_dumps(obj):
+        calls.append(obj)
+        return real_dumps(obj)
+
+    monkeypatch.setattr(ws_manager.jsonx, "dumps", counting_dumps)
+    wsman = WSManager()
+    sockets = {f"p{i}": FakeWS() for i in range(12)}
+    for pid, ws in sockets.items():
+        await wsman.add("R1", pid, ws)
+
+    await wsman.deliver("R1", [{"type": "op_broadcast", "n": 1}], exclude_pid="p0")
+    await _drain()
+
+    assert len(calls) == 1
+    assert sockets["p0"].sent == []
+    assert all(ws.sent == [{"type": "op_broadcast", "n": 1}] for pid, ws in sockets.items() if pid != "p0")
+
+
+@pytest.mark.asyncio
+async def test_deliver_batches_for_opted_in_clients_and_keeps_targets():
+    wsman = WSManager()
+    plain, batched = FakeWS(), FakeWS()
+    await wsman.add("R1", "p1", plain)
+    await wsman.add("R1", "p2", batched, batch=True)
+
+    events = [
+        {"type": "phase_changed"},
+        {"type": "secret", "targets": ["p2"]},
+        {"type": "room_state_changed"},
+    ]
+    await wsman.deliver("R1", events)
+    await _drain()
+
+    assert plain.sent == [{"type": "phase_changed"}, {"type": "room_state_changed"}]
+    assert batched.sent == [
+        {"type": "batch", "events": [{"type": "phase_changed"}, {"type": "secret"}, {"type": "room_state_changed"}]}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_replace_pid_keeps_batch_preference():
+    wsman = WSManager()
+    ws = FakeWS()
+    await wsman.add("R1", "tmp", ws, batch=True)
+    await wsman.replace_pid("R1", "tmp", "p1", ws)
+
+    await wsman.deliver("R1", [{"type": "a"}, {"type": "b"}])
+    await _drain()
+
+    assert ws.sent == [{"type": "batch", "events": [{"type": "a"}, {"type": "b"}]}]
+
+
+@pytest.mark.asyncio
+async def test_slow_client_does_not_block_others():
+    wsman = WSManager()
+    gate = asyncio.Event()
+    slow, fast = FakeWS(gate=gate), FakeWS()
+    await wsman.add("R1", "slow", slow)
+    await wsman.add("R1", "fast", fast)
+
+    await asyncio.wait_for(wsman.deliver("R1", [{"type": "a"}]), timeout=0.5)
+    await _drain()
+    assert fast.sent == [{"type": "a"}]
+    assert slow.sent == []
+
+    gate.set()
+    await _drain()
+    assert slow.sent == [{"type": "a"}]
+    await wsman.remove("R1", "slow")
+    await wsman.remove("R1", "fast")
+
+
+@pytest.mark.asyncio
+async def test_overflow_drops_strokes_and_coalesces_budget():
+    wsman = WSManager(max_queue=3)
+    gate = asyncio.Event()
+    ws = FakeWS(gate=gate)
+    await wsman.add("R1", "p1", ws)
+
+    await wsman.deliver("R1", [{"type": "budget_update", "budget": {"A": 5}}])
+    for n in range(4):
+        await wsman.deliver("R1", [{"type": "op_broadcast", "n": n}])
+    await wsman.deliver("R1", [{"type": "budget_update", "budget": {"A": 1}}])
+    await wsman.deliver("R1", [{"type": "phase_changed"}])
+
+    stats = wsman.metrics()["R1"]["p1"]
+    assert stats["coalesced"] == 1
+    assert stats["dropped"] == 3
+    assert stats["depth"] == 3
+
+    gate.set()
+    await _drain()
+    # the newer budget took the older one's place in line
+    assert ws.sent == [
+        {"type": "budget_update", "budget": {"A": 1}},
+        {"type": "op_broadcast", "n": 3},
+        {"type": "phase_changed"},
+    ]
+    assert ws.closed is None
+
+
+@pytest.mark.asyncio
+async def test_overflow_disconnect_policy_closes_slow_consumer():
+    wsman = WSManager(max_queue=2, overflow="disconnect")
+    gate = asyncio.Event()
+    ws = FakeWS(gate=gate)
+    await wsman.add("R1", "p1", ws)
+
+    for n in range(4):
+        await wsman.deliver("R1", [{"type": "op_broadcast", "n": n}])
+    gate.set()
+    await _drain()
+
+    assert ws.closed == 4002
+    assert wsman.metrics()["R1"]["p1"]["slow_consumer"] is True
+
+
+@pytest.mark.asyncio
+async def test_send_to_pids_and_copy_on_write_registry():
+    wsman = WSManager()
+    sockets = {pid: FakeWS() for pid in ("p1", "p2", "p3")}
+    for pid, ws in sockets.items():
+        await wsman.add("R1", pid, ws)
+
+    before = wsman._conns("R1")
+    await wsman.remove("R1", "p3")
+    # readers holding the old snapshot are not affected by writers
+    assert set(before) == {"p1", "p2", "p3"}
+    assert await wsman.room_size("R1") == 2
+
+    await wsman.send_to_pids("R1", ["p1", "p3", "ghost"], {"type": "secret"})
+    await _drain()
+
+    assert sockets["p1"].sent == [{"type": "secret"}]
+    assert sockets["p2"].sent == []
+    assert sockets["p3"].sent == []
+
+    await wsman.remove("R1", "p1")
+    await wsman.remove("R1", "p2")
+    assert wsman.pids("R1") == []